@@ -0,0 +1,106 @@
+"""
+Concurrent console session benchmark for the NC Server.
+
+Opens many encrypted console sessions against an in-process agent, then
+measures how much CPU the agent burns while they sit idle and how quickly
+it still answers pings.
+
+Usage:
+    python -m benchmarks.bench_agent_sessions --mode async --sessions 500
+    python -m benchmarks.bench_agent_sessions --mode threaded --sessions 500
+"""
+
+import argparse
+import json
+import socket
+import threading
+import time
+
+from nc_server.connection.manager import ConnectionManager
+from nc_server.connection.async_manager import AsyncConnectionManager
+from nc_client.connection.encryption import EncryptionManager
+from nc_client.connection.framing import send_message, recv_message
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="NC Server concurrent session benchmark")
+    parser.add_argument("--mode", choices=["threaded", "async"], default="async")
+    parser.add_argument("--sessions", type=int, default=200,
+                        help="Number of console sessions to open (default: 200)")
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--idle", type=float, default=5.0,
+                        help="Seconds to measure idle CPU (default: 5)")
+    parser.add_argument("--workers", type=int, default=8)
+    return parser.parse_args()
+
+
+def open_session(port):
+    """Open one encrypted console session"""
+    sock = socket.create_connection(("127.0.0.1", port), timeout=60.0)
+    encryption_manager = EncryptionManager()
+    if not encryption_manager.perform_key_exchange(sock):
+        raise ConnectionError("Key exchange failed")
+    return sock, encryption_manager
+
+
+def ping(sock, encryption_manager):
+    """Send a ping and wait for the reply"""
+    send_message(sock, encryption_manager.encrypt_data(json.dumps({'type': 'ping', 'data': {}})))
+    return json.loads(encryption_manager.decrypt_data(recv_message(sock)))
+
+
+def main():
+    args = parse_arguments()
+
+    if args.mode == "async":
+        server = AsyncConnectionManager(host="127.0.0.1", port=args.port, max_workers=args.workers)
+    else:
+        server = ConnectionManager(host="127.0.0.1", port=args.port)
+
+    server_thread = threading.Thread(target=server.start, daemon=True)
+    server_thread.start()
+    time.sleep(1.0)
+
+    sessions = []
+    start = time.perf_counter()
+    try:
+        for _ in range(args.sessions):
+            sessions.append(open_session(args.port))
+    except Exception as e:
+        print(f"Stopped opening sessions after {len(sessions)}: {e}")
+    connect_time = time.perf_counter() - start
+
+    # Let every handler settle into its idle wait
+    time.sleep(1.0)
+
+    threads = threading.active_count()
+    cpu_before = time.process_time()
+    time.sleep(args.idle)
+    idle_cpu = time.process_time() - cpu_before
+
+    latencies = []
+    for sock, encryption_manager in sessions:
+        t0 = time.perf_counter()
+        response = ping(sock, encryption_manager)
+        latencies.append(time.perf_counter() - t0)
+        assert response.get('message') == 'pong'
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0
+
+    print(f"mode:               {args.mode}")
+    print(f"sessions held:      {len(sessions)}/{args.sessions}")
+    print(f"connect time:       {connect_time:.2f} s")
+    print(f"process threads:    {threads}")
+    print(f"idle CPU:           {idle_cpu / args.idle * 100:.2f}% of one core")
+    print(f"ping p50 / p99:     {p50:.2f} ms / {p99:.2f} ms")
+
+    for sock, _ in sessions:
+        sock.close()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+Central server database load benchmark.
+
+Creates a fresh database, then has many simulated clients register an account
+at once and log in a few times each, through UserManager as the central
+server's login and create_user handlers do. Runs once with a plain connection
+opened for every query in rollback-journal mode, the way the server used to
+work, and once with the WAL connection pool. Reports throughput, latency
+percentiles and failed operations for each phase.
+
+Usage:
+    python -m benchmarks.bench_central_db --clients 500
+    python -m benchmarks.bench_central_db --clients 500 --logins 10 --pool-size 4
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from central_server.auth.user_manager import UserManager
+from central_server.database.manager import DatabaseManager
+from central_server.database.pool import POOL_SIZE
+from central_server.database.schema import create_schema
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Central server database load benchmark")
+    parser.add_argument("--clients", type=int, default=500, help="Concurrent simulated clients (default: 500)")
+    parser.add_argument("--logins", type=int, default=5, help="Logins per client after registering (default: 5)")
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE,
+                        help=f"Connections in the pool (default: {POOL_SIZE})")
+    return parser.parse_args()
+
+
+def run_phase(clients, work):
+    """Start every client at once, returns the wall time, the latencies and the failure count"""
+    latencies = []
+    failures = []
+    start_together = threading.Barrier(len(clients) + 1)
+
+    def client(index):
+        start_together.wait()
+        for _ in range(work.repeat):
+            started = time.perf_counter()
+            ok = work(index)
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                failures.append(index)
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in clients]
+    for thread in threads:
+        thread.start()
+    start_together.wait()
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - wall_start, sorted(latencies), len(failures)
+
+
+def run_mode(args, pool_size, journal_mode):
+    """Register and log in every client against a fresh database, returns the results of both phases"""
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "central_server.db")
+        create_schema(db_path)
+        database = DatabaseManager(db_path, pool_size=pool_size, journal_mode=journal_mode)
+        users = UserManager(database)
+        clients = range(args.clients)
+
+        def register(index):
+            success, _ = users.create_user(f"user{index}", f"password{index}")
+            return success
+        register.repeat = 1
+
+        def login(index):
+            success, _ = users.authenticate_user(f"user{index}", f"password{index}")
+            return success
+        login.repeat = args.logins
+
+        results = {'registration': run_phase(clients, register), 'login': run_phase(clients, login)}
+        database.close()
+        return results
+
+
+def main():
+    args = parse_arguments()
+
+    # Failed queries are counted, not logged one by one
+    logging.disable(logging.CRITICAL)
+
+    print(f"clients:            {args.clients}, {args.logins} logins each, pool of {args.pool_size}")
+    modes = (("per-query", 0, 'delete'), ("pooled WAL", args.pool_size, 'wal'))
+    for label, pool_size, journal_mode in modes:
+        for phase, (wall, latencies, failures) in run_mode(args, pool_size, journal_mode).items():
+            print(f"{label + ' ' + phase + ':':<28}{len(latencies) / wall:>8.0f} ops/s, "
+                  f"p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+                  f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, "
+                  f"max {latencies[-1] * 1000:.0f} ms, {failures} failed")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
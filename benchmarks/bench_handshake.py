@@ -0,0 +1,78 @@
+"""
+Key exchange microbenchmark for the NC Server.
+
+Runs sequential RSA + AES handshakes against an in-process agent for each
+RSA key policy and reports handshake latency and handshakes per second.
+With the pool policy the pool is allowed to fill first, so the numbers
+show a reconnect burst of up to --pool-size connections.
+
+Usage:
+    python -m benchmarks.bench_handshake --count 8 --pool-size 8
+"""
+
+import argparse
+import threading
+import time
+
+from nc_server.connection.manager import ConnectionManager
+from nc_server.connection.key_pool import KEY_POLICIES, UNSAFE_KEY_POLICIES
+from benchmarks.bench_agent_sessions import open_session, ping
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="NC Server handshake benchmark")
+    parser.add_argument("--count", type=int, default=8,
+                        help="Handshakes per policy (default: 8)")
+    parser.add_argument("--pool-size", type=int, default=8,
+                        help="Key pool size for the pool policy (default: 8)")
+    parser.add_argument("--port", type=int, default=5060)
+    parser.add_argument("--policies", nargs="+", choices=KEY_POLICIES + UNSAFE_KEY_POLICIES,
+                        default=list(KEY_POLICIES + UNSAFE_KEY_POLICIES))
+    return parser.parse_args()
+
+
+def run_policy(policy, port, count, pool_size):
+    """Time count sequential handshakes against an agent using the given policy"""
+    server = ConnectionManager(host="127.0.0.1", port=port, key_policy=policy, key_pool_size=pool_size)
+    threading.Thread(target=server.start, daemon=True).start()
+
+    # Give the pool time to fill so the burst is served from pre-generated keys
+    deadline = time.time() + 60
+    while policy == 'pool' and server.key_pool.available() < pool_size and time.time() < deadline:
+        time.sleep(0.1)
+    time.sleep(0.5)
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(count):
+        t0 = time.perf_counter()
+        sock, encryption_manager = open_session(port)
+        # The first reply proves the session key is in place on both ends
+        ping(sock, encryption_manager)
+        latencies.append(time.perf_counter() - t0)
+        sock.close()
+    total = time.perf_counter() - start
+
+    server.stop()
+
+    latencies.sort()
+    return {
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p95_ms': latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000,
+        'per_second': count / total
+    }
+
+
+def main():
+    args = parse_arguments()
+
+    print(f"{'policy':<16}{'mean':>12}{'p95':>12}{'handshakes/s':>16}")
+    for offset, policy in enumerate(args.policies):
+        result = run_policy(policy, args.port + offset, args.count, args.pool_size)
+        print(f"{policy:<16}{result['mean_ms']:>10.2f}ms{result['p95_ms']:>10.2f}ms"
+              f"{result['per_second']:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
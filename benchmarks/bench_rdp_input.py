@@ -0,0 +1,177 @@
+"""
+RDP input lag benchmark for the NC Server.
+
+Runs an in-process RDPServer on the synthetic desktop and drags the pointer
+across it from a console-side channel, with a click every half second. Each
+injected event costs --inject-ms on the agent, like a synchronous mouse.move,
+and the link delivers input in bursts every --burst-ms, like a lossy link
+that stalls on retransmits. Compares sending every motion event and replaying
+each one against coalescing moves to one per tick on the console and dropping
+superseded moves on the agent. Reports how far the injected pointer trails the
+console and whether every click arrived.
+
+Usage:
+    python -m benchmarks.bench_rdp_input --seconds 10
+    python -m benchmarks.bench_rdp_input --event-hz 500 --inject-ms 4 --burst-ms 200
+"""
+
+import argparse
+import os
+import socket
+import threading
+import time
+
+from nc_server.rdp.server import RDPServer
+from nc_client.rdp.transport import RDPChannel, RDP_CIPHERS
+
+MOUSE_LEFT = 201
+MOUSE_MOVE = 204
+
+# Motion events carry their sequence number in the coordinates
+ROW = 4000
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="RDP input lag benchmark")
+    parser.add_argument("--seconds", type=float, default=8.0, help="Seconds per mode (default: 8)")
+    parser.add_argument("--event-hz", type=float, default=250.0,
+                        help="Motion events the console produces per second (default: 250)")
+    parser.add_argument("--tick-ms", type=float, default=20.0,
+                        help="Console tick moves are coalesced to (default: 20)")
+    parser.add_argument("--inject-ms", type=float, default=5.0,
+                        help="Agent time to inject one event (default: 5)")
+    parser.add_argument("--burst-ms", type=float, default=100.0,
+                        help="Link stall after which queued input arrives at once (default: 100)")
+    parser.add_argument("--cipher", choices=["none"] + list(RDP_CIPHERS), default="aes-256-gcm")
+    parser.add_argument("--port", type=int, default=5950)
+    return parser.parse_args()
+
+
+def drain(channel, stop):
+    """Read and discard the frame stream so the agent's sender never blocks"""
+    while not stop.is_set():
+        try:
+            channel.receive_frame()
+        except socket.timeout:
+            continue
+        except (ConnectionError, OSError):
+            return
+
+
+def run_mode(args, coalesce, port):
+    """Drag the pointer for the given time, returns the lag samples and event counts"""
+    cipher_name = None if args.cipher == "none" else args.cipher
+    session_key = os.urandom(32)
+    server = RDPServer(host="127.0.0.1", port=port, session_key=session_key, cipher_name=cipher_name,
+                       encodings=['tiles'], capture_backend="synthetic",
+                       capture_options={'width': 640, 'height': 360, 'scenario': 'idle'},
+                       coalesce_input=coalesce)
+
+    # Every injected event takes as long as a real one, the pointer lands where the event says
+    sent_times = {}
+    lags = []
+    counts = {'moves': 0, 'clicks': 0}
+
+    def inject(key, action, x, y):
+        time.sleep(args.inject_ms / 1000)
+        if key == MOUSE_MOVE:
+            counts['moves'] += 1
+            lags.append(time.perf_counter() - sent_times[y * ROW + x])
+        elif key == MOUSE_LEFT and action == 117:
+            counts['clicks'] += 1
+
+    server.process_input = inject
+    threading.Thread(target=server.start, daemon=True).start()
+    time.sleep(0.5)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(10.0)
+    sock.connect(("127.0.0.1", port))
+    channel = RDPChannel.connect(sock, session_key, cipher_name) if cipher_name else RDPChannel(sock)
+    channel.send_platform(b'x11')
+    channel.receive_resolution()
+    sock.settimeout(0.5)
+    stop = threading.Event()
+    threading.Thread(target=drain, args=(channel, stop), daemon=True).start()
+
+    # Input the link is holding back, delivered together at the end of each stall
+    held = []
+    writes = sent = clicks = 0
+    pending_move = None
+    start = time.perf_counter()
+    next_event = next_tick = next_burst = next_click = start
+    index = 0
+    while time.perf_counter() - start < args.seconds:
+        now = time.perf_counter()
+        if now >= next_event:
+            next_event += 1 / args.event_hz
+            sent_times[index] = now
+            move = (MOUSE_MOVE, 0, index % ROW, index // ROW)
+            index += 1
+            if coalesce:
+                pending_move = move
+            else:
+                held.append([move])
+
+        if now >= next_click:
+            next_click += 0.5
+            click = [(MOUSE_LEFT, 100, 0, 0), (MOUSE_LEFT, 117, 0, 0)]
+            clicks += 1
+            if coalesce:
+                held.append(([pending_move] if pending_move else []) + click)
+                pending_move = None
+            else:
+                held.append(click[:1])
+                held.append(click[1:])
+
+        if coalesce and now >= next_tick:
+            next_tick += args.tick_ms / 1000
+            if pending_move:
+                held.append([pending_move])
+                pending_move = None
+
+        if now >= next_burst:
+            next_burst += args.burst_ms / 1000
+            for events in held:
+                channel.send_inputs(events)
+                writes += 1
+                sent += len(events)
+            held = []
+
+        time.sleep(max(0.0, min(next_event, next_burst) - time.perf_counter()))
+
+    # Let the agent work off what it has before reading the counters
+    deadline = time.perf_counter() + 30
+    while counts['clicks'] < clicks and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    time.sleep(args.inject_ms / 1000 * 4)
+
+    stop.set()
+    stats = server.get_stats()
+    server.stop()
+    sock.close()
+    return {'lags': sorted(lags), 'generated': index, 'sent': sent, 'writes': writes, 'clicks': clicks,
+            'clicks_received': counts['clicks'], 'moves_injected': counts['moves'],
+            'moves_coalesced': stats['moves_coalesced']}
+
+
+def main():
+    args = parse_arguments()
+
+    print(f"drag:               {args.event_hz:.0f} motion events/s, injection {args.inject_ms} ms each, "
+          f"input held up to {args.burst_ms:.0f} ms by the link")
+    for offset, (label, coalesce) in enumerate((("every event", False), ("coalesced", True))):
+        result = run_mode(args, coalesce, args.port + offset)
+        lags = result['lags']
+        lag = (f"pointer lag median {lags[len(lags) // 2] * 1000:.0f} ms, "
+               f"p95 {lags[int(len(lags) * 0.95)] * 1000:.0f} ms, max {lags[-1] * 1000:.0f} ms"
+               if lags else "no moves injected")
+        print(f"{label + ':':<20}{lag}")
+        print(f"{'':<20}{result['generated']} moves generated, {result['sent']} events in "
+              f"{result['writes']} writes, {result['moves_injected']} moves injected "
+              f"({result['moves_coalesced']} dropped by the agent), "
+              f"clicks {result['clicks_received']}/{result['clicks']}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,225 @@
+"""
+End-to-end RDP pipeline benchmark for the NC Server.
+
+Runs an in-process RDPServer on a capture source (the synthetic desktop by
+default, so no display is needed) and one or more console-side channels that
+receive, decode and patch every frame. Reports the frame rate, bytes per frame
+and CPU per frame for a scripted scenario. With several viewers the last one
+can be slowed down to check that it drops frames without holding up the rest.
+Viewers acknowledge frames like the console does, so --link-mbps shows the
+rate controller trading quality, resolution and frame rate on a slow link.
+With --viewport the viewers report a canvas size and get frames scaled to it,
+with --lossless text and flat tiles are sent losslessly and only photos as JPEG,
+with --cursor the pointer goes out as position messages instead of in the frames.
+With --telemetry the viewers acknowledge each decoded frame with its sequence
+number and decode time, and the agent's per-frame histograms are printed.
+
+Usage:
+    python -m benchmarks.bench_rdp_pipeline --scenario typing --seconds 10
+    python -m benchmarks.bench_rdp_pipeline --scenario mixed --width 3840 --height 2160 --frame-rate 30
+    python -m benchmarks.bench_rdp_pipeline --viewers 4 --slow-ms 200
+    python -m benchmarks.bench_rdp_pipeline --scenario video --link-mbps 4
+    python -m benchmarks.bench_rdp_pipeline --width 3840 --height 2160 --viewport 800x600
+    python -m benchmarks.bench_rdp_pipeline --scenario typing --lossless
+    python -m benchmarks.bench_rdp_pipeline --scenario typing --cursor
+    python -m benchmarks.bench_rdp_pipeline --scenario video --telemetry
+"""
+
+import argparse
+import os
+import socket
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from nc_server.rdp.server import RDPServer
+from nc_server.rdp.capture import CAPTURE_BACKENDS, SYNTHETIC_SCENARIOS
+from nc_client.rdp.transport import (RDPChannel, RDP_CIPHERS, MSG_TILES, MSG_MIXED_TILES, MSG_CURSOR,
+                                     MSG_CURSOR_SHAPE, FRAME_INFO)
+from nc_client.rdp.tiles import apply_tiles, apply_mixed_tiles
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="RDP pipeline benchmark")
+    parser.add_argument("--backend", choices=["auto"] + list(CAPTURE_BACKENDS), default="synthetic")
+    parser.add_argument("--scenario", choices=list(SYNTHETIC_SCENARIOS), default="mixed",
+                        help="Scripted activity for the synthetic backend (default: mixed)")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--frame-rate", type=int, default=30,
+                        help="Agent frame rate cap (default: 30)")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--cipher", choices=["none"] + list(RDP_CIPHERS), default="aes-256-gcm")
+    parser.add_argument("--no-tiles", action="store_true", help="Send full frames only")
+    parser.add_argument("--lossless", action="store_true", help="Send text and flat tiles losslessly")
+    parser.add_argument("--cursor", action="store_true", help="Send the pointer on its own channel")
+    parser.add_argument("--telemetry", action="store_true", help="Number frames and acknowledge each one")
+    parser.add_argument("--viewers", type=int, default=1, help="Concurrent viewers (default: 1)")
+    parser.add_argument("--slow-ms", type=float, default=0.0,
+                        help="Extra time the last viewer spends on each frame (default: 0)")
+    parser.add_argument("--link-mbps", type=float, default=0.0,
+                        help="Throttle every viewer to this link speed (default: unlimited)")
+    parser.add_argument("--viewport", type=str, default=None,
+                        help="Canvas size WxH the viewers show the desktop at (default: full resolution)")
+    parser.add_argument("--port", type=int, default=5950)
+    return parser.parse_args()
+
+
+def decode_update(framebuffer, msg_type, body):
+    """Apply one update to the framebuffer like the console does, returns it and whether it was a keyframe"""
+    if msg_type == MSG_TILES:
+        apply_tiles(framebuffer, body)
+        return framebuffer, False
+    if msg_type == MSG_MIXED_TILES:
+        framebuffer, rectangles = apply_mixed_tiles(framebuffer, body)
+        return framebuffer, rectangles is None
+    return cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR), True
+
+
+def watch(port, session_key, cipher_name, seconds, delay, link_mbps, stats, viewport=None, telemetry=False):
+    """Connect one viewer and decode frames for the given time"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if link_mbps:
+        # Loopback buffers would soak up seconds of frames a real link can't
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 64 * 1024)
+    sock.settimeout(10.0)
+    sock.connect(("127.0.0.1", port))
+    if cipher_name:
+        channel = RDPChannel.connect(sock, session_key, cipher_name)
+    else:
+        channel = RDPChannel(sock)
+    channel.send_platform(b'x11')
+    if viewport:
+        channel.send_viewport(*viewport)
+
+    stats['resolution'] = channel.receive_resolution()
+    msg_type, body = channel.receive_frame()
+    while msg_type in (MSG_CURSOR, MSG_CURSOR_SHAPE):
+        msg_type, body = channel.receive_frame()
+    if telemetry:
+        body = memoryview(body)[FRAME_INFO.size:]
+    framebuffer, _ = decode_update(None, msg_type, body)
+    channel.send_ack(1)
+
+    # An idle screen may send nothing at all, keep checking the clock
+    sock.settimeout(0.5)
+
+    frames = full_frames = total_bytes = cursor_moves = cursor_bytes = 0
+    received = 1
+    decode_time = 0.0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        try:
+            msg_type, body = channel.receive_frame()
+        except socket.timeout:
+            continue
+        if msg_type in (MSG_CURSOR, MSG_CURSOR_SHAPE):
+            cursor_moves += msg_type == MSG_CURSOR
+            cursor_bytes += len(body)
+            continue
+        frames += 1
+        if telemetry:
+            sequence, captured_at = FRAME_INFO.unpack_from(body)
+            body = memoryview(body)[FRAME_INFO.size:]
+        received += 1
+        total_bytes += len(body)
+
+        # Hold the reader back as long as the frame would take on the link
+        if link_mbps:
+            time.sleep(len(body) * 8 / (link_mbps * 1e6))
+
+        decode_start = time.perf_counter()
+        framebuffer, keyframe = decode_update(framebuffer, msg_type, body)
+        full_frames += keyframe
+        decode_time += time.perf_counter() - decode_start
+        time.sleep(delay)
+        channel.send_ack(received)
+        if telemetry:
+            decoded = int((time.perf_counter() - decode_start) * 1e6)
+            channel.send_frame_ack(sequence, captured_at, decoded, decoded)
+
+    stats.update(frames=frames, full_frames=full_frames, bytes=total_bytes, decode_time=decode_time,
+                 cursor_moves=cursor_moves, cursor_bytes=cursor_bytes,
+                 frame_size=framebuffer.shape[1::-1], elapsed=time.perf_counter() - start)
+    sock.close()
+
+
+def main():
+    args = parse_arguments()
+
+    capture_options = {}
+    if args.backend == "synthetic":
+        capture_options = {'width': args.width, 'height': args.height, 'scenario': args.scenario}
+
+    cipher_name = None if args.cipher == "none" else args.cipher
+    session_key = os.urandom(32)
+    encodings = ['scaling'] if args.no_tiles else ['tiles', 'scaling']
+    if args.lossless:
+        encodings.append('lossless')
+    if args.cursor:
+        encodings.append('cursor')
+    if args.telemetry:
+        encodings.append('telemetry')
+    server = RDPServer(host="127.0.0.1", port=args.port, session_key=session_key, cipher_name=cipher_name,
+                       encodings=encodings,
+                       capture_backend=args.backend, capture_options=capture_options, frame_rate=args.frame_rate)
+    threading.Thread(target=server.start, daemon=True).start()
+    time.sleep(0.5)
+
+    viewport = tuple(int(size) for size in args.viewport.lower().split("x")) if args.viewport else None
+
+    stats = [{} for _ in range(args.viewers)]
+    viewers = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for index, viewer_stats in enumerate(stats):
+        delay = args.slow_ms / 1000 if index == args.viewers - 1 else 0.0
+        viewer = threading.Thread(target=watch, args=(args.port, session_key, cipher_name, args.seconds,
+                                                      delay, args.link_mbps, viewer_stats, viewport,
+                                                      args.telemetry))
+        viewer.start()
+        viewers.append(viewer)
+    for viewer in viewers:
+        viewer.join()
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    rate_stats = server.get_stats()
+    server.stop()
+
+    width, height = stats[0]['resolution']
+    print(f"backend:            {server.capture_source.name} ({args.scenario})" if args.backend == "synthetic"
+          else f"backend:            {server.capture_source.name}")
+    frame_width, frame_height = stats[0]['frame_size']
+    print(f"resolution:         {width}x{height}, frames sent at {frame_width}x{frame_height}")
+    print(f"stream:             {cipher_name or 'unencrypted'}, {'full frames' if args.no_tiles else 'tiles'}"
+          f"{', lossless text' if args.lossless else ''}{', cursor channel' if args.cursor else ''}")
+    for index, viewer_stats in enumerate(stats):
+        frames = viewer_stats['frames']
+        label = "slow viewer" if args.slow_ms and index == args.viewers - 1 else f"viewer {index}"
+        print(f"{label + ':':<20}{frames / viewer_stats['elapsed']:>6.1f} fps (cap {args.frame_rate}), "
+              f"{frames} frames ({viewer_stats['full_frames']} full), "
+              f"{viewer_stats['bytes'] / max(frames, 1) / 1024:.1f} KB/frame, "
+              f"decode {viewer_stats['decode_time'] / max(frames, 1) * 1000:.2f} ms/frame")
+
+    if args.cursor:
+        print(f"cursor:             {stats[0]['cursor_moves'] / stats[0]['elapsed']:.1f} moves/s, "
+              f"{stats[0]['cursor_bytes'] / stats[0]['elapsed'] / 1024:.2f} KB/s")
+
+    frames = max(viewer_stats['frames'] for viewer_stats in stats)
+    print(f"CPU:                {cpu / wall * 100:.1f}% of one core (agent and consoles, all threads)")
+    print(f"CPU per frame:      {cpu / max(frames, 1) * 1000:.2f} ms")
+    print(f"rate control:       quality {rate_stats['quality']}, scale {rate_stats['scale']:.3f}, "
+          f"{rate_stats['frame_rate']} fps, ack latency {rate_stats['latency_ms']} ms, "
+          f"{rate_stats['adjustments']} adjustments")
+
+    if args.telemetry:
+        for name, histogram in rate_stats['telemetry'].items():
+            print(f"{name + ':':<24}{histogram['count']} frames, mean {histogram['mean']}, "
+                  f"p50 {histogram['p50']}, p95 {histogram['p95']}, p99 {histogram['p99']}, max {histogram['max']}")
+        print(f"frames behind:      {rate_stats['frames_behind']}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,89 @@
+"""
+Pipelined versus serial RDP frame production benchmark for the NC Server.
+
+Runs the same synthetic scenario through an in-process RDPServer twice, once
+with capture, encode and send overlapping on their own threads and once with
+the serial loop that does them one after another. The frame rate cap is set
+high so the pipeline, not the pacing, limits the frame rate. Reports frames
+per second and the latency from capture until a frame is written to the viewer
+and until the viewer has decoded it.
+
+Usage:
+    python -m benchmarks.bench_rdp_stages --scenario video --seconds 10
+    python -m benchmarks.bench_rdp_stages --width 3840 --height 2160 --no-tiles
+"""
+
+import argparse
+import os
+import threading
+import time
+
+from nc_server.rdp.server import RDPServer
+from nc_server.rdp.capture import SYNTHETIC_SCENARIOS
+from nc_client.rdp.transport import RDP_CIPHERS
+from benchmarks.bench_rdp_pipeline import watch
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Pipelined vs serial RDP benchmark")
+    parser.add_argument("--scenario", choices=list(SYNTHETIC_SCENARIOS), default="video",
+                        help="Scripted activity for the synthetic desktop (default: video)")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--frame-rate", type=int, default=120,
+                        help="Agent frame rate cap, high enough not to be the limit (default: 120)")
+    parser.add_argument("--seconds", type=float, default=8.0, help="Seconds per mode (default: 8)")
+    parser.add_argument("--cipher", choices=["none"] + list(RDP_CIPHERS), default="aes-256-gcm")
+    parser.add_argument("--no-tiles", action="store_true", help="Send full frames only")
+    parser.add_argument("--port", type=int, default=5950)
+    return parser.parse_args()
+
+
+def run_mode(args, pipelined, port):
+    """Stream the scenario to one viewer and return the viewer and agent stats"""
+    cipher_name = None if args.cipher == "none" else args.cipher
+    session_key = os.urandom(32)
+    capture_options = {'width': args.width, 'height': args.height, 'scenario': args.scenario}
+
+    # Fixed quality and frame rate, the rate controller would otherwise blur the comparison
+    server = RDPServer(host="127.0.0.1", port=port, session_key=session_key, cipher_name=cipher_name,
+                       encodings=[] if args.no_tiles else ['tiles'], capture_backend="synthetic",
+                       capture_options=capture_options, frame_rate=args.frame_rate,
+                       rate_bounds={'frame_rate': (args.frame_rate, args.frame_rate)}, pipelined=pipelined)
+    threading.Thread(target=server.start, daemon=True).start()
+    time.sleep(0.5)
+
+    viewer_stats = {}
+    cpu_start = time.process_time()
+    watch(port, session_key, cipher_name, args.seconds, 0.0, 0.0, viewer_stats)
+    viewer_stats['cpu'] = time.process_time() - cpu_start
+
+    agent_stats = server.get_stats()
+    server.stop()
+    return viewer_stats, agent_stats
+
+
+def main():
+    args = parse_arguments()
+
+    print(f"scenario:           {args.scenario} at {args.width}x{args.height}, "
+          f"{args.cipher}, {'full frames' if args.no_tiles else 'tiles'}")
+    results = {}
+    for offset, (label, pipelined) in enumerate((("serial", False), ("pipelined", True))):
+        results[label] = run_mode(args, pipelined, args.port + offset)
+
+    for label, (viewer_stats, agent_stats) in results.items():
+        fps = viewer_stats['frames'] / viewer_stats['elapsed']
+        print(f"{label + ':':<20}{fps:>6.1f} fps, "
+              f"capture to send {agent_stats.get('frame_latency_ms', 0):.1f} ms "
+              f"(p95 {agent_stats.get('frame_latency_p95_ms', 0):.1f}), "
+              f"send to decoded {agent_stats['latency_ms']:.1f} ms, "
+              f"CPU {viewer_stats['cpu'] / viewer_stats['elapsed'] * 100:.0f}%")
+
+    serial_fps = results['serial'][0]['frames'] / results['serial'][0]['elapsed']
+    pipelined_fps = results['pipelined'][0]['frames'] / results['pipelined'][0]['elapsed']
+    print(f"speedup:            {pipelined_fps / max(serial_fps, 1e-9):.2f}x")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""
+RDP transport microbenchmark for the NC Server and NC Client.
+
+Encodes a synthetic desktop frame at 1080p and 4K, then streams it over a
+local socket pair through the original two-sendall path, the plaintext
+channel and each AEAD cipher. Reports the JPEG encode time for scale and
+the per-frame transport cost of each path, end to end through the receiver.
+
+Usage:
+    python -m benchmarks.bench_rdp_transport --frames 200
+"""
+
+import argparse
+import os
+import socket
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from nc_server.rdp.transport import RDPChannel as ServerChannel, RDP_CIPHERS
+from nc_client.rdp.transport import RDPChannel as ClientChannel
+
+RESOLUTIONS = {
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160)
+}
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="RDP transport benchmark")
+    parser.add_argument("--frames", type=int, default=200,
+                        help="Frames per path and resolution (default: 200)")
+    parser.add_argument("--quality", type=int, default=95,
+                        help="JPEG quality, matches RDPServer.IMAGE_QUALITY (default: 95)")
+    return parser.parse_args()
+
+
+def synthetic_desktop(width, height):
+    """Draw a desktop-like frame: gradient wallpaper, windows and text"""
+    gradient = np.linspace(40, 160, width, dtype=np.uint8)
+    screen = np.dstack([np.tile(gradient, (height, 1))] * 3)
+
+    for index in range(6):
+        x, y = width * index // 8, height * index // 9
+        cv2.rectangle(screen, (x, y), (x + width // 3, y + height // 3), (235, 235, 235), -1)
+        for line in range(12):
+            cv2.putText(screen, f"window {index} line {line} lorem ipsum dolor sit amet",
+                        (x + 10, y + 30 + line * 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (20, 20, 20), 1)
+    return screen
+
+
+def legacy_send(sock, frame_data):
+    """The original _send_frame: header and payload in separate sendall calls"""
+    sock.sendall(struct.pack(">BI", 1, len(frame_data)))
+    sock.sendall(frame_data)
+
+
+def run_path(frame_data, frames, cipher_name=None, legacy=False):
+    """Stream frames through one path and return the mean cost per frame in ms"""
+    server_sock, client_sock = socket.socketpair()
+    for sock in (server_sock, client_sock):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+
+    if cipher_name:
+        session_key = os.urandom(32)
+        result = {}
+        accept = threading.Thread(
+            target=lambda: result.update(channel=ServerChannel.accept(server_sock, [session_key], cipher_name))
+        )
+        accept.start()
+        receiver = ClientChannel.connect(client_sock, session_key, cipher_name)
+
+        # The agent picks the console's key from its first sealed message, as in a real session
+        receiver.send_platform(b'x11')
+        accept.join()
+        sender = result['channel']
+    else:
+        sender, receiver = ServerChannel(server_sock), ClientChannel(client_sock)
+
+    def receive_all():
+        for _ in range(frames):
+            receiver.receive_frame()
+
+    reader = threading.Thread(target=receive_all)
+    reader.start()
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        if legacy:
+            legacy_send(server_sock, frame_data)
+        else:
+            sender.send_frame(frame_data)
+    reader.join()
+    total = time.perf_counter() - start
+
+    server_sock.close()
+    client_sock.close()
+    return total / frames * 1000
+
+
+def main():
+    args = parse_arguments()
+
+    paths = [('two sendall', None, True), ('sendmsg', None, False)]
+    paths += [(cipher_name, cipher_name, False) for cipher_name in RDP_CIPHERS]
+
+    print(f"{'resolution':<12}{'path':<20}{'frame':>10}{'encode':>12}{'transport':>12}{'max fps':>10}")
+    for label, (width, height) in RESOLUTIONS.items():
+        screen = synthetic_desktop(width, height)
+
+        encode_start = time.perf_counter()
+        _, frame_data = cv2.imencode('.jpg', screen, [cv2.IMWRITE_JPEG_QUALITY, args.quality])
+        encode_ms = (time.perf_counter() - encode_start) * 1000
+
+        for name, cipher_name, legacy in paths:
+            transport_ms = run_path(frame_data, args.frames, cipher_name, legacy)
+            print(f"{label:<12}{name:<20}{len(frame_data) / 1024:>8.0f}KB{encode_ms:>10.2f}ms"
+                  f"{transport_ms:>10.3f}ms{1000 / transport_ms:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
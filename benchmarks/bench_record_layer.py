@@ -0,0 +1,90 @@
+"""
+Record layer microbenchmark for the NC Server and NC Client.
+
+Seals and opens messages of several sizes through a paired client and agent
+EncryptionManager, once over the Fernet fallback and once per AEAD record
+cipher, and reports the round trip cost and wire overhead of each.
+
+Usage:
+    python -m benchmarks.bench_record_layer --count 2000 --sizes 256 4096 65536
+"""
+
+import argparse
+import os
+import time
+
+from cryptography.fernet import Fernet
+
+from nc_server.connection.encryption import EncryptionManager as ServerEncryptionManager
+from nc_server.connection.key_pool import generate_rsa_key
+from nc_client.connection.encryption import EncryptionManager as ClientEncryptionManager
+from nc_client.connection.record_layer import RECORD_CIPHERS
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Record layer benchmark")
+    parser.add_argument("--count", type=int, default=2000,
+                        help="Round trips per cipher and size (default: 2000)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 4096, 65536],
+                        help="Message sizes in bytes (default: 256 4096 65536)")
+    return parser.parse_args()
+
+
+def session_pair(rsa_key, cipher_name):
+    """Build a client and agent encryption manager sharing a session key"""
+    session_key = Fernet.generate_key()
+
+    client = ClientEncryptionManager()
+    client.set_encryption_key(session_key)
+
+    # Skip the RSA exchange, only the message path is being measured
+    server = ServerEncryptionManager(rsa_private_key=rsa_key)
+    server.encryption_key = session_key
+    server.cipher_suite = Fernet(session_key)
+
+    if cipher_name != 'fernet':
+        negotiated, salt = server.enable_record_layer([cipher_name])
+        client.enable_record_layer(negotiated, salt)
+
+    return client, server
+
+
+def run_cipher(rsa_key, cipher_name, size, count):
+    """Time count request/reply round trips of size bytes through one cipher"""
+    client, server = session_pair(rsa_key, cipher_name)
+
+    # JSON messages are text, keep the payload printable
+    message = os.urandom(size // 2 + 1).hex()[:size]
+
+    wire_bytes = 0
+    start = time.perf_counter()
+    for _ in range(count):
+        request = client.encrypt_data(message)
+        server.decrypt_data(request)
+        reply = server.encrypt_data(message)
+        client.decrypt_data(reply)
+        wire_bytes = len(request)
+    total = time.perf_counter() - start
+
+    return {
+        'us_per_trip': total / count * 1e6,
+        'mb_per_second': 2 * size * count / total / 1e6,
+        'overhead': wire_bytes - size
+    }
+
+
+def main():
+    args = parse_arguments()
+    rsa_key = generate_rsa_key()
+
+    print(f"{'cipher':<20}{'size':>8}{'per trip':>14}{'throughput':>14}{'overhead':>12}")
+    for size in args.sizes:
+        for cipher_name in ['fernet'] + list(RECORD_CIPHERS):
+            result = run_cipher(rsa_key, cipher_name, size, args.count)
+            print(f"{cipher_name:<20}{size:>8}{result['us_per_trip']:>12.1f}us"
+                  f"{result['mb_per_second']:>10.1f}MB/s{result['overhead']:>10d} B")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -43,30 +43,26 @@ class UserManager:
             if len(new_password) < 6:
                 return False, "New password must be at least 6 characters long"
 
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-
-            # Verify old password
-            old_password_hash = hashlib.sha256(old_password.encode()).hexdigest()
-            cursor.execute(
-                "SELECT user_id FROM users WHERE user_id = ? AND password_hash = ?",
-                (user_id, old_password_hash)
-            )
-            result = cursor.fetchone()
-
-            if not result:
-                conn.close()
-                return False, "Current password is incorrect"
-
-            # Update password
-            new_password_hash = hashlib.sha256(new_password.encode()).hexdigest()
-            cursor.execute(
-                "UPDATE users SET password_hash = ? WHERE user_id = ?",
-                (new_password_hash, user_id)
-            )
-
-            conn.commit()
-            conn.close()
+            with self.db.connection(write=True) as conn:
+                cursor = conn.cursor()
+
+                # Verify old password
+                old_password_hash = hashlib.sha256(old_password.encode()).hexdigest()
+                cursor.execute(
+                    "SELECT user_id FROM users WHERE user_id = ? AND password_hash = ?",
+                    (user_id, old_password_hash)
+                )
+                result = cursor.fetchone()
+
+                if not result:
+                    return False, "Current password is incorrect"
+
+                # Update password
+                new_password_hash = hashlib.sha256(new_password.encode()).hexdigest()
+                cursor.execute(
+                    "UPDATE users SET password_hash = ? WHERE user_id = ?",
+                    (new_password_hash, user_id)
+                )
 
             return True, "Password changed successfully"
 
@@ -77,40 +73,36 @@ class UserManager:
     def delete_user(self, username):
         """Delete a user"""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
+            with self.db.connection(write=True) as conn:
+                cursor = conn.cursor()
 
-            # Check if user exists
-            cursor.execute("SELECT user_id FROM users WHERE username = ?", (username,))
-            user = cursor.fetchone()
+                # Check if user exists
+                cursor.execute("SELECT user_id FROM users WHERE username = ?", (username,))
+                user = cursor.fetchone()
 
-            if not user:
-                conn.close()
-                return False, "User not found"
+                if not user:
+                    return False, "User not found"
 
-            # Check if it's the admin user (cannot delete the original admin)
-            cursor.execute(
-                "SELECT user_id FROM users WHERE username = ? AND user_id = 1",
-                (username,)
-            )
-            if cursor.fetchone():
-                conn.close()
-                return False, "Cannot delete the main admin user"
+                # Check if it's the admin user (cannot delete the original admin)
+                cursor.execute(
+                    "SELECT user_id FROM users WHERE username = ? AND user_id = 1",
+                    (username,)
+                )
+                if cursor.fetchone():
+                    return False, "Cannot delete the main admin user"
 
-            # Delete the user
-            cursor.execute("DELETE FROM users WHERE username = ?", (username,))
+                # Delete the user, pooled connections count changes for their whole life so ask the cursor
+                cursor.execute("DELETE FROM users WHERE username = ?", (username,))
+                deleted = cursor.rowcount > 0
 
             # Clean up any active connections or sharing
-            if conn.total_changes > 0:
+            if deleted:
                 # Attempt to clean up user data
                 try:
                     self.db.clean_disconnected_user(username)
                 except Exception as cleanup_error:
                     logging.error(f"Error cleaning up after user deletion: {cleanup_error}")
 
-            conn.commit()
-            conn.close()
-
             return True, f"User '{username}' deleted successfully"
 
         except Exception as e:
@@ -120,30 +112,25 @@ class UserManager:
     def promote_to_admin(self, username):
         """Promote a user to admin status"""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-
-            # Check if user exists
-            cursor.execute("SELECT user_id, is_admin FROM users WHERE username = ?", (username,))
-            user = cursor.fetchone()
+            with self.db.connection(write=True) as conn:
+                cursor = conn.cursor()
 
-            if not user:
-                conn.close()
-                return False, "User not found"
+                # Check if user exists
+                cursor.execute("SELECT user_id, is_admin FROM users WHERE username = ?", (username,))
+                user = cursor.fetchone()
 
-            # Check if already an admin
-            if user['is_admin'] == 1:
-                conn.close()
-                return False, f"User '{username}' is already an admin"
+                if not user:
+                    return False, "User not found"
 
-            # Promote to admin
-            cursor.execute(
-                "UPDATE users SET is_admin = 1 WHERE username = ?",
-                (username,)
-            )
+                # Check if already an admin
+                if user['is_admin'] == 1:
+                    return False, f"User '{username}' is already an admin"
 
-            conn.commit()
-            conn.close()
+                # Promote to admin
+                cursor.execute(
+                    "UPDATE users SET is_admin = 1 WHERE username = ?",
+                    (username,)
+                )
 
             return True, f"User '{username}' promoted to admin successfully"
 
@@ -155,14 +142,7 @@ class UserManager:
         """Create a new user when requested by an admin"""
         # Verify the requesting user is an admin
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-
-            cursor.execute("SELECT is_admin FROM users WHERE user_id = ?", (admin_user_id,))
-            user = cursor.fetchone()
-
-            if not user or not user['is_admin']:
-                conn.close()
+            if not self.db.is_admin(admin_user_id):
                 return False, "Unauthorized: Admin privileges required"
 
             # Now create the new user
@@ -173,24 +153,11 @@ class UserManager:
             if len(new_password) < 6:
                 return False, "Password must be at least 6 characters long"
 
-            # Check if username already exists
-            cursor.execute("SELECT username FROM users WHERE username = ?", (new_username,))
-            if cursor.fetchone():
-                conn.close()
-                return False, "Username already exists"
-
-            # Create the user
-            password_hash = hashlib.sha256(new_password.encode()).hexdigest()
-
-            cursor.execute(
-                "INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, ?)",
-                (new_username, password_hash, 1 if is_new_admin else 0)
-            )
-
-            conn.commit()
-            conn.close()
-
-            return True, f"User '{new_username}' created successfully"
+            # Check if username already exists and create the user
+            success, message = self.db.create_user(new_username, new_password, 1 if is_new_admin else 0)
+            if success:
+                message = f"User '{new_username}' created successfully"
+            return success, message
 
         except Exception as e:
             logging.error(f"Error creating user as admin: {e}")
@@ -4,32 +4,49 @@ Implements AES encryption via the Fernet implementation for secure communication
 """
 
 import logging
+import os
+import struct
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.primitives import serialization, hashes
 
+from central_server.connection.tickets import RESUME_MAGIC, RESUME_NONCE_SIZE, derive_resumed_key
+from central_server.connection.record_layer import RecordLayer, RECORD_CIPHERS, derive_record_keys, is_record
+
 class EncryptionManager:
     """Encryption manager using AES via Fernet"""
 
-    def __init__(self):
-        """Initialize encryption manager with RSA + AES hybrid encryption"""
-        # Generate RSA key pair for secure key exchange
-        self.rsa_private_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=2048
-        )
-        self.rsa_public_key = self.rsa_private_key.public_key()
-
-        # Serialize public key for transmission
-        self.rsa_public_key_bytes = self.rsa_public_key.public_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PublicFormat.SubjectPublicKeyInfo
-        )
+    def __init__(self, rsa_private_key=None, key_exchange=True):
+        """Initialize encryption manager with RSA + AES hybrid encryption.
+        Pass key_exchange=False for a session resumed from a ticket, which needs no RSA key."""
+        self.rsa_private_key = self.rsa_public_key = self.rsa_public_key_bytes = None
+        if key_exchange:
+            # Use the provided RSA key pair, or generate one for secure key exchange
+            if rsa_private_key is None:
+                rsa_private_key = rsa.generate_private_key(
+                    public_exponent=65537,
+                    key_size=2048
+                )
+            self.rsa_private_key = rsa_private_key
+            self.rsa_public_key = self.rsa_private_key.public_key()
+
+            # Serialize public key for transmission
+            self.rsa_public_key_bytes = self.rsa_public_key.public_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PublicFormat.SubjectPublicKeyInfo
+            )
 
         # AES encryption key (will be received from client)
         self.encryption_key = None
         self.cipher_suite = None
 
+        # Nonce mixed into the key of a resumed session, sent back with the accept frame
+        self.resume_nonce = None
+
+        # Optional AEAD record layer negotiated after the key exchange
+        self.record_layer = None
+        self.record_layer_active = False
+
         logging.info("RSA + AES hybrid encryption initialized successfully")
 
     def get_public_key_bytes(self):
@@ -60,6 +77,48 @@ class EncryptionManager:
             self.cipher_suite = self
             return False
 
+    def resume_session(self, resume_frame, ticket_manager):
+        """Restore a session from a resumption frame, returning the ticket claims or None"""
+        try:
+            body = resume_frame[len(RESUME_MAGIC):]
+            ticket_size = struct.unpack('>H', body[:2])[0]
+            ticket = body[2:2 + ticket_size]
+            sealed_key = body[2 + ticket_size:]
+
+            claims = ticket_manager.redeem(ticket)
+            if not claims:
+                return None
+
+            # The new session key is sealed with the old one, proving the client still holds it
+            new_key = Fernet(claims['key']).decrypt(sealed_key, ttl=60)
+
+            # Our nonce makes the key differ even if a captured resume frame is replayed
+            self.resume_nonce = os.urandom(RESUME_NONCE_SIZE)
+            self.encryption_key = derive_resumed_key(new_key, self.resume_nonce)
+            self.cipher_suite = Fernet(self.encryption_key)
+            logging.info("Session resumed from ticket with a fresh AES key")
+            return claims
+
+        except Exception as e:
+            logging.warning(f"Error resuming session: {e}")
+            return None
+
+    def enable_record_layer(self, offered_ciphers):
+        """Pick a record cipher from the client's offer and derive its keys, returns (cipher, salt) or None"""
+        cipher_name = next((name for name in offered_ciphers if name in RECORD_CIPHERS), None)
+        if cipher_name is None or not self.encryption_key:
+            return None
+
+        salt = os.urandom(16)
+        client_key, server_key = derive_record_keys(self.encryption_key, salt)
+        self.record_layer = RecordLayer(cipher_name, send_key=server_key, receive_key=client_key)
+
+        # Keep sending Fernet until the client proves it has the keys with its first record
+        self.record_layer_active = False
+
+        logging.info(f"AEAD record layer negotiated with {cipher_name}")
+        return cipher_name, salt
+
     def create_encryption_key(self):
         """Generate a secure Fernet key"""
         return Fernet.generate_key()
@@ -72,6 +131,8 @@ class EncryptionManager:
         try:
             if self.cipher_suite == self:
                 return data
+            if self.record_layer_active:
+                return self.record_layer.seal(data)
             return self.cipher_suite.encrypt(data)
         except Exception as e:
             logging.error(f"Encryption error: {e}")
@@ -88,6 +149,16 @@ class EncryptionManager:
                     return str(encrypted_data)
             return str(encrypted_data)
 
+        # Records and Fernet tokens can both arrive while the record layer is switching over
+        if self.record_layer and is_record(encrypted_data):
+            try:
+                decrypted = self.record_layer.open(encrypted_data)
+                self.record_layer_active = True
+                return decrypted.decode()
+            except (ValueError, UnicodeDecodeError) as e:
+                logging.error(f"Record layer error: {e}")
+                return ''
+
         if isinstance(encrypted_data, bytes):
             try:
                 decrypted = self.cipher_suite.decrypt(encrypted_data)
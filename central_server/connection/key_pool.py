@@ -0,0 +1,109 @@
+"""
+RSA key provisioning for the Central Management Server key exchange.
+Keeps 2048-bit key generation off the connection path.
+"""
+
+import logging
+import queue
+import threading
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+# Key policies offered to operators
+KEY_POLICIES = ('per_connection', 'pool')
+
+# Policies kept for benchmarking only. The client alone picks the session key, so with a
+# long-lived RSA key a recorded handshake and its commands can be replayed on a new connection.
+UNSAFE_KEY_POLICIES = ('host_key',)
+
+
+def generate_rsa_key(key_size=2048):
+    """Generate a new RSA private key"""
+    return rsa.generate_private_key(
+        public_exponent=65537,
+        key_size=key_size
+    )
+
+
+class RSAKeyPool:
+    """Hands out RSA private keys for the key exchange according to a policy.
+
+    per_connection - generate a fresh key inside every handshake (original behaviour)
+    pool           - a background thread keeps a queue of unused keys, each key is used once
+    host_key       - one long-lived key for every handshake, unsafe: recorded sessions can be replayed
+    """
+
+    def __init__(self, policy='pool', pool_size=8, key_size=2048):
+        if policy not in KEY_POLICIES + UNSAFE_KEY_POLICIES:
+            raise ValueError(f"Unknown key policy: {policy}")
+        if policy in UNSAFE_KEY_POLICIES:
+            logging.warning(f"RSA key policy '{policy}' lets recorded sessions be replayed, use it for testing only")
+
+        self.policy = policy
+        self.pool_size = max(1, pool_size)
+        self.key_size = key_size
+
+        self.keys = queue.Queue(maxsize=self.pool_size)
+        self.host_key = None
+        self.lock = threading.Lock()
+
+        self.running = False
+        self.filler_thread = None
+
+    def start(self):
+        """Prepare keys for the configured policy"""
+        self.running = True
+
+        if self.policy == 'host_key':
+            self.get_host_key()
+        elif self.policy == 'pool':
+            self.filler_thread = threading.Thread(target=self.fill_pool, name="rsa-key-pool")
+            self.filler_thread.daemon = True
+            self.filler_thread.start()
+
+        logging.info(f"RSA key pool started with '{self.policy}' policy")
+
+    def stop(self):
+        """Stop the background filler"""
+        self.running = False
+
+        # Free a slot so a filler blocked on a full queue wakes up and exits
+        try:
+            self.keys.get_nowait()
+        except queue.Empty:
+            pass
+
+    def fill_pool(self):
+        """Keep the pool topped up with freshly generated keys"""
+        while self.running:
+            try:
+                key = generate_rsa_key(self.key_size)
+                self.keys.put(key)
+            except Exception as e:
+                logging.error(f"Error generating pooled RSA key: {e}")
+                return
+
+    def get_host_key(self):
+        """Get the long-lived host key, generating it on first use"""
+        with self.lock:
+            if self.host_key is None:
+                self.host_key = generate_rsa_key(self.key_size)
+            return self.host_key
+
+    def acquire(self):
+        """Get an RSA private key for a new handshake"""
+        if self.policy == 'host_key':
+            return self.get_host_key()
+
+        if self.policy == 'pool':
+            try:
+                return self.keys.get_nowait()
+            except queue.Empty:
+                # Reconnect storm drained the pool, fall back to generating inline
+                logging.debug("RSA key pool empty, generating key inline")
+
+        return generate_rsa_key(self.key_size)
+
+    def available(self):
+        """Number of pre-generated keys ready for use"""
+        return self.keys.qsize()
\ No newline at end of file
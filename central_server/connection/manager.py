@@ -3,6 +3,7 @@ Connection Manager for the Central Management Server.
 Handles client connections, command processing, and responses.
 """
 
+import base64
 import socket
 import threading
 import json
@@ -12,12 +13,15 @@ import struct
 
 from central_server.database.manager import DatabaseManager
 from central_server.connection.encryption import EncryptionManager
+from central_server.connection.key_pool import RSAKeyPool
+from central_server.connection.tickets import (TicketManager, KEY_EXCHANGE_HELLO, RESUME_MAGIC, RESUME_ACCEPTED,
+                                               RESUME_REJECTED)
 from central_server.auth.user_manager import UserManager
 from central_server.utils.logging import log_connection, log_server_action, log_error
 
 
 class ConnectionManager:
-    def __init__(self, host='0.0.0.0', port=5001):
+    def __init__(self, host='0.0.0.0', port=5001, key_policy='pool', key_pool_size=8, ticket_lifetime=300):
         """Initialize the central server connection manager with AES encryption"""
         logging.info("Initializing Central Server Connection Manager with AES encryption")
 
@@ -26,8 +30,15 @@ class ConnectionManager:
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.clients = {}  # Address -> client info
 
+        # RSA keys for the key exchange are prepared ahead of time
+        self.key_pool = RSAKeyPool(policy=key_policy, pool_size=key_pool_size)
+        self.key_pool.start()
+
+        # Resumption tickets let briefly disconnected clients skip the RSA exchange and login
+        self.ticket_manager = TicketManager(lifetime=ticket_lifetime)
+
         # Initialize the encryption manager with AES
-        self.encryption_manager = EncryptionManager()
+        self.encryption_manager = EncryptionManager(self.key_pool.acquire())
         self.encryption_key = self.encryption_manager.encryption_key
 
         # Initialize database manager
@@ -59,6 +70,8 @@ class ConnectionManager:
             'delete_user': self.handle_delete_user,
             'promote_to_admin': self.handle_promote_to_admin,
             # Utility
+            'session_ticket': self.handle_session_ticket,
+            'negotiate_record_layer': self.handle_negotiate_record_layer,
             'ping': self.handle_ping
         }
 
@@ -114,6 +127,12 @@ class ConnectionManager:
         except:
             pass
 
+        # Stop generating handshake keys
+        self.key_pool.stop()
+
+        # Close the pooled database connections
+        self.database.close()
+
         logging.info("Central server shutdown complete")
 
     def handle_client(self, client_socket, address):
@@ -127,51 +146,60 @@ class ConnectionManager:
             # Set a timeout for operations
             wrapped_socket.settimeout(10.0)
 
-            # Create individual encryption manager for this client
-            encryption_manager = EncryptionManager()
+            # Step 1: Receive the client's opening frame, a resumption request needs no RSA key
+            opening = self.receive_key_frame(wrapped_socket)
 
-            # Step 1: Send RSA public key to client
-            public_key_bytes = encryption_manager.get_public_key_bytes()
-            public_key_size = len(public_key_bytes)
+            resumed_claims = None
+            if opening.startswith(RESUME_MAGIC):
+                resuming = EncryptionManager(key_exchange=False)
+                resumed_claims = resuming.resume_session(opening, self.ticket_manager)
+                reply = RESUME_ACCEPTED + resuming.resume_nonce if resumed_claims else RESUME_REJECTED
+                wrapped_socket.sendall(struct.pack('>I', len(reply)) + reply)
 
-            # Send public key size first
-            wrapped_socket.send(struct.pack('>I', public_key_size))
-            # Send public key
-            wrapped_socket.send(public_key_bytes)
+                if resumed_claims:
+                    encryption_manager = resuming
+                    log_connection(address, resumed_claims.get('username'), "resumed session from ticket")
+                else:
+                    # Client falls back to the full key exchange on the same connection
+                    logging.info(f"Rejected session ticket from {address}, expecting full key exchange")
+            elif opening != KEY_EXCHANGE_HELLO:
+                raise Exception("Unexpected key exchange opening frame")
 
-            logging.info(f"Sent RSA public key ({public_key_size} bytes) to {address}")
+            if not resumed_claims:
+                # Create individual encryption manager for this client
+                encryption_manager = EncryptionManager(self.key_pool.acquire())
 
-            # Step 2: Receive encrypted AES key from client
-            encrypted_key_size_bytes = wrapped_socket.recv(4)
-            if len(encrypted_key_size_bytes) != 4:
-                raise ConnectionError("Failed to receive encrypted key size")
+                # Step 2: Send RSA public key to client
+                public_key_bytes = encryption_manager.get_public_key_bytes()
+                public_key_size = len(public_key_bytes)
 
-            encrypted_key_size = struct.unpack('>I', encrypted_key_size_bytes)[0]
+                # Send public key size first
+                wrapped_socket.send(struct.pack('>I', public_key_size))
+                # Send public key
+                wrapped_socket.send(public_key_bytes)
 
-            # Receive encrypted AES key
-            encrypted_key = b''
-            while len(encrypted_key) < encrypted_key_size:
-                chunk = wrapped_socket.recv(encrypted_key_size - len(encrypted_key))
-                if not chunk:
-                    raise ConnectionError("Connection closed while receiving encrypted key")
-                encrypted_key += chunk
+                logging.info(f"Sent RSA public key ({public_key_size} bytes) to {address}")
 
-            logging.info(f"Received encrypted AES key ({encrypted_key_size} bytes) from {address}")
+                # Step 3: Receive the encrypted AES key
+                encrypted_key = self.receive_key_frame(wrapped_socket)
+                encrypted_key_size = len(encrypted_key)
+                logging.info(f"Received encrypted AES key ({encrypted_key_size} bytes) from {address}")
 
-            # Step 3: Decrypt and set the AES key
-            if not encryption_manager.set_client_encryption_key(encrypted_key):
-                raise Exception("Failed to decrypt client AES key")
+                # Step 4: Decrypt and set the AES key
+                if not encryption_manager.set_client_encryption_key(encrypted_key):
+                    raise Exception("Failed to decrypt client AES key")
 
             # Shorter timeout for regular operations
             wrapped_socket.settimeout(30.0)
 
             # Store client information with individual encryption manager
+            # A resumed session keeps the user it was authenticated as
             self.clients[address] = {
                 'socket': wrapped_socket,
                 'encryption_manager': encryption_manager,
                 'last_seen': datetime.now(),
-                'user_id': None,
-                'username': None
+                'user_id': resumed_claims.get('user_id') if resumed_claims else None,
+                'username': resumed_claims.get('username') if resumed_claims else None
             }
 
             # Main communication loop
@@ -236,6 +264,23 @@ class ConnectionManager:
                 logging.error(f"Error closing socket: {close_error}")
             logging.info(f"Connection closed from {address}")
 
+    def receive_key_frame(self, wrapped_socket):
+        """Receive a length-prefixed key exchange frame"""
+        key_frame_size_bytes = wrapped_socket.recv(4)
+        if len(key_frame_size_bytes) != 4:
+            raise ConnectionError("Failed to receive encrypted key size")
+
+        key_frame_size = struct.unpack('>I', key_frame_size_bytes)[0]
+
+        key_frame = b''
+        while len(key_frame) < key_frame_size:
+            chunk = wrapped_socket.recv(key_frame_size - len(key_frame))
+            if not chunk:
+                raise ConnectionError("Connection closed while receiving encrypted key")
+            key_frame += chunk
+
+        return key_frame
+
     def process_command(self, command, address):
         """Process client command and return response"""
         try:
@@ -257,8 +302,8 @@ class ConnectionManager:
                 client_info = self.clients.get(address, {})
                 user_id = client_info.get('user_id')
 
-                # Login doesn't need authentication, but other commands do
-                if cmd_type != 'login' and cmd_type != 'ping' and not user_id:
+                # Login and transport setup don't need authentication, but other commands do
+                if cmd_type not in ('login', 'ping', 'negotiate_record_layer') and not user_id:
                     return {'status': 'error', 'message': 'Authentication required'}
 
                 # Call the handler with the command data
@@ -419,23 +464,20 @@ class ConnectionManager:
 
         # Get all servers from the database
         try:
-            conn = self.database.get_connection()
-            cursor = conn.cursor()
-
-            cursor.execute("""
-                SELECT 
-                    server_id, 
-                    ip_address, 
-                    port, 
-                    first_discovered, 
-                    last_seen,
-                    recent_connection
-                FROM servers 
-                ORDER BY last_seen DESC
-            """)
-
-            servers = [dict(row) for row in cursor.fetchall()]
-            conn.close()
+            with self.database.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT
+                        server_id,
+                        ip_address,
+                        port,
+                        first_discovered,
+                        last_seen,
+                        recent_connection
+                    FROM servers
+                    ORDER BY last_seen DESC
+                """)
+                servers = [dict(row) for row in cursor.fetchall()]
 
             log_connection(address, username, "retrieved all servers from database")
 
@@ -465,18 +507,17 @@ class ConnectionManager:
 
         # Get connection info from the servers table - READ-ONLY operation
         try:
-            conn = self.database.get_connection()
-            cursor = conn.cursor()
+            with self.database.connection() as conn:
+                cursor = conn.cursor()
 
-            # Find the server - just SELECT, no UPDATE
-            cursor.execute(
-                "SELECT server_id, last_seen, recent_connection FROM servers WHERE ip_address = ? AND port = ?",
-                (ip_address, port)
-            )
-            server_record = cursor.fetchone()
+                # Find the server - just SELECT, no UPDATE
+                cursor.execute(
+                    "SELECT server_id, last_seen, recent_connection FROM servers WHERE ip_address = ? AND port = ?",
+                    (ip_address, port)
+                )
+                server_record = cursor.fetchone()
 
             if not server_record:
-                conn.close()
                 return {
                     'status': 'error',
                     'message': 'Server not found'
@@ -504,8 +545,6 @@ class ConnectionManager:
                     'connected_at': last_seen
                 })
 
-            conn.close()
-
             log_connection(address, username, f"viewed connection info for server {ip_address}:{port}")
 
             return {
@@ -525,16 +564,7 @@ class ConnectionManager:
         username = self.clients[address]['username']
 
         # Only admins can see all connection details
-        is_admin = False
-        try:
-            conn = self.database.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT is_admin FROM users WHERE user_id = ?", (user_id,))
-            result = cursor.fetchone()
-            is_admin = result and result['is_admin'] == 1
-            conn.close()
-        except Exception as e:
-            logging.error(f"Error checking admin status: {e}")
+        is_admin = self.database.is_admin(user_id)
 
         if not is_admin:
             return {
@@ -567,18 +597,17 @@ class ConnectionManager:
 
         # Get connection history for the server from the servers table
         try:
-            conn = self.database.get_connection()
-            cursor = conn.cursor()
+            with self.database.connection() as conn:
+                cursor = conn.cursor()
 
-            # Find the server_id and connection info
-            cursor.execute(
-                "SELECT server_id, last_seen, recent_connection FROM servers WHERE ip_address = ? AND port = ?",
-                (ip_address, port)
-            )
-            server_record = cursor.fetchone()
+                # Find the server_id and connection info
+                cursor.execute(
+                    "SELECT server_id, last_seen, recent_connection FROM servers WHERE ip_address = ? AND port = ?",
+                    (ip_address, port)
+                )
+                server_record = cursor.fetchone()
 
             if not server_record:
-                conn.close()
                 return {
                     'status': 'error',
                     'message': 'Server not found'
@@ -596,8 +625,6 @@ class ConnectionManager:
                 'recent_connection': recent_connection if recent_connection else 'No recent connection'
             }]
 
-            conn.close()
-
             log_connection(address, username, f"viewed connection history for server {ip_address}:{port}")
 
             return {
@@ -644,16 +671,7 @@ class ConnectionManager:
         username = self.clients[address]['username']
 
         # Only admins can see all users
-        is_admin = False
-        try:
-            conn = self.database.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT is_admin FROM users WHERE user_id = ?", (user_id,))
-            result = cursor.fetchone()
-            is_admin = result and result['is_admin'] == 1
-            conn.close()
-        except Exception as e:
-            logging.error(f"Error checking admin status: {e}")
+        is_admin = self.database.is_admin(user_id)
 
         if not is_admin:
             return {
@@ -701,16 +719,7 @@ class ConnectionManager:
             return {'status': 'error', 'message': 'Username is required'}
 
         # Verify admin status
-        is_admin = False
-        try:
-            conn = self.database.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT is_admin FROM users WHERE user_id = ?", (admin_id,))
-            result = cursor.fetchone()
-            is_admin = result and result['is_admin'] == 1
-            conn.close()
-        except Exception as e:
-            logging.error(f"Error checking admin status: {e}")
+        is_admin = self.database.is_admin(admin_id)
 
         if not is_admin:
             return {
@@ -739,16 +748,7 @@ class ConnectionManager:
             return {'status': 'error', 'message': 'Username is required'}
 
         # Verify admin status
-        is_admin = False
-        try:
-            conn = self.database.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT is_admin FROM users WHERE user_id = ?", (admin_id,))
-            result = cursor.fetchone()
-            is_admin = result and result['is_admin'] == 1
-            conn.close()
-        except Exception as e:
-            logging.error(f"Error checking admin status: {e}")
+        is_admin = self.database.is_admin(admin_id)
 
         if not is_admin:
             return {
@@ -767,6 +767,49 @@ class ConnectionManager:
             'message': message
         }
 
+    def handle_session_ticket(self, data, address):
+        """Issue a resumption ticket bound to the client's session key and logged-in user"""
+        client_info = self.clients[address]
+
+        ticket = self.ticket_manager.issue(
+            client_info['encryption_manager'].encryption_key,
+            user_id=client_info['user_id'],
+            username=client_info['username']
+        )
+
+        return {
+            'status': 'success',
+            'data': {
+                'ticket': ticket,
+                'lifetime': self.ticket_manager.lifetime
+            }
+        }
+
+    def handle_negotiate_record_layer(self, data, address):
+        """Negotiate the AEAD record layer for the client's session"""
+        ciphers = data.get('ciphers')
+        if not isinstance(ciphers, list):
+            return {
+                'status': 'error',
+                'message': "No record ciphers offered"
+            }
+
+        negotiated = self.clients[address]['encryption_manager'].enable_record_layer(ciphers)
+        if negotiated is None:
+            return {
+                'status': 'error',
+                'message': "No common record cipher"
+            }
+
+        cipher_name, salt = negotiated
+        return {
+            'status': 'success',
+            'data': {
+                'cipher': cipher_name,
+                'salt': base64.b64encode(salt).decode()
+            }
+        }
+
     def handle_ping(self, data, address):
         """Handle ping request"""
         # Update last seen time
@@ -0,0 +1,74 @@
+"""
+Session resumption tickets for the Central Management Server.
+A ticket seals the session key with a key known only to this server process,
+so a client that drops briefly can resume without a new RSA key exchange.
+"""
+
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# Key exchange frames. The client opens with a resumption request or a hello, the server only
+# takes an RSA key and sends its public key after a hello or a rejected ticket.
+# The accept frame is followed by the server's nonce.
+KEY_EXCHANGE_HELLO = b'NCHELLO1'
+RESUME_MAGIC = b'NCRESUME1'
+RESUME_ACCEPTED = b'RESUMED'
+RESUME_REJECTED = b'REJECTED'
+RESUME_NONCE_SIZE = 16
+
+
+def derive_resumed_key(client_key, server_nonce):
+    """Fernet key of a resumed session, from the client's new key and a nonce chosen by the server"""
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=server_nonce, info=b'nc session resume')
+    return base64.urlsafe_b64encode(hkdf.derive(client_key))
+
+
+class TicketManager:
+    """Issues and redeems encrypted, expiring session resumption tickets"""
+
+    def __init__(self, lifetime=300):
+        self.lifetime = lifetime
+
+        # Tickets are sealed with a process-local key, restarting the server invalidates them
+        self.cipher = Fernet(Fernet.generate_key())
+
+        # Ids of redeemed tickets until they expire, each ticket resumes one connection only
+        self.redeemed = {}
+        self.lock = threading.Lock()
+
+    def issue(self, session_key, **claims):
+        """Issue a ticket for the given session key"""
+        if isinstance(session_key, bytes):
+            session_key = session_key.decode()
+
+        payload = dict(claims, key=session_key, id=os.urandom(16).hex())
+        return self.cipher.encrypt(json.dumps(payload).encode()).decode()
+
+    def redeem(self, ticket):
+        """Return the claims of a valid, unexpired ticket that was not redeemed before, or None"""
+        try:
+            payload = json.loads(self.cipher.decrypt(ticket, ttl=self.lifetime))
+            payload['key'] = payload['key'].encode()
+            ticket_id = payload['id']
+            expires = self.cipher.extract_timestamp(ticket) + self.lifetime
+        except (InvalidToken, ValueError, KeyError, TypeError) as e:
+            logging.debug(f"Rejected session ticket: {e}")
+            return None
+
+        with self.lock:
+            now = time.time()
+            for expired in [key for key, until in self.redeemed.items() if until <= now]:
+                del self.redeemed[expired]
+
+            if ticket_id in self.redeemed:
+                logging.warning("Rejected a session ticket that was already redeemed")
+                return None
+            self.redeemed[ticket_id] = expires
+        return payload
\ No newline at end of file
@@ -3,51 +3,50 @@ Database manager for the Central Management Server.
 Handles database operations for users, servers, and connections.
 """
 
-import sqlite3
 import logging
 import hashlib
 from datetime import datetime
 
+from central_server.database.pool import ConnectionPool, POOL_SIZE
+
 
 class DatabaseManager:
-    def __init__(self, db_path="central_server.db"):
+    def __init__(self, db_path="central_server.db", pool_size=POOL_SIZE, journal_mode='wal'):
         self.db_path = db_path
 
-    def get_connection(self):
-        """Get a database connection"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row  # This enables column access by name
-            return conn
-        except Exception as e:
-            logging.error(f"Database connection error: {e}")
-            return None
+        # Every query borrows one of a few long-lived connections instead of opening its own
+        self.pool = ConnectionPool(db_path, size=pool_size, journal_mode=journal_mode)
+
+    def connection(self, write=False):
+        """Borrow a database connection for a with block, pass write=True if the block changes data"""
+        return self.pool.connection(write)
+
+    def close(self):
+        """Close the pooled connections"""
+        self.pool.close()
 
     def authenticate_user(self, username, password):
         """Authenticate a user by username and password"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
             # Hash the password for comparison
             password_hash = hashlib.sha256(password.encode()).hexdigest()
 
-            cursor.execute(
-                "SELECT * FROM users WHERE username = ? AND password_hash = ?",
-                (username, password_hash)
-            )
-
-            user = cursor.fetchone()
-
-            if user:
-                # Update last login timestamp
+            with self.connection() as conn:
+                cursor = conn.cursor()
                 cursor.execute(
-                    "UPDATE users SET last_login = ? WHERE user_id = ?",
-                    (datetime.now(), user['user_id'])
+                    "SELECT * FROM users WHERE username = ? AND password_hash = ?",
+                    (username, password_hash)
                 )
-                conn.commit()
+                user = cursor.fetchone()
+
+            if user:
+                # Update last login timestamp, only this part waits for the writer lock
+                with self.connection(write=True) as conn:
+                    conn.execute(
+                        "UPDATE users SET last_login = ? WHERE user_id = ?",
+                        (datetime.now(), user['user_id'])
+                    )
 
-            conn.close()
             return dict(user) if user else None
 
         except Exception as e:
@@ -57,41 +56,47 @@ class DatabaseManager:
     def create_user(self, username, password, is_admin=0):
         """Create a new user"""
         try:
-            # Check if username already exists
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.connection(write=True) as conn:
+                cursor = conn.cursor()
 
-            cursor.execute("SELECT username FROM users WHERE username = ?", (username,))
-            if cursor.fetchone():
-                conn.close()
-                return False, "Username already exists"
+                # Check if username already exists
+                cursor.execute("SELECT username FROM users WHERE username = ?", (username,))
+                if cursor.fetchone():
+                    return False, "Username already exists"
 
-            # Hash the password and create the user
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
+                # Hash the password and create the user
+                password_hash = hashlib.sha256(password.encode()).hexdigest()
 
-            cursor.execute(
-                "INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, ?)",
-                (username, password_hash, is_admin)
-            )
+                cursor.execute(
+                    "INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, ?)",
+                    (username, password_hash, is_admin)
+                )
 
-            conn.commit()
-            conn.close()
             return True, "User created successfully"
 
         except Exception as e:
             logging.error(f"Error creating user: {e}")
             return False, str(e)
 
+    def is_admin(self, user_id):
+        """Check whether a user has admin privileges"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT is_admin FROM users WHERE user_id = ?", (user_id,))
+                result = cursor.fetchone()
+            return bool(result and result['is_admin'] == 1)
+        except Exception as e:
+            logging.error(f"Error checking admin status: {e}")
+            return False
+
     def get_all_users(self):
         """Get all users"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            cursor.execute("SELECT user_id, username, created_at, last_login, is_admin FROM users")
-            users = [dict(row) for row in cursor.fetchall()]
-
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT user_id, username, created_at, last_login, is_admin FROM users")
+                users = [dict(row) for row in cursor.fetchall()]
             return users
         except Exception as e:
             logging.error(f"Error getting users: {e}")
@@ -100,30 +105,28 @@ class DatabaseManager:
     def register_server(self, ip_address, port, client_ip):
         """Register a server - simplified to not set sharing_with here"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            # First, ensure the server exists in the servers table
-            cursor.execute(
-                """
-                INSERT OR IGNORE INTO servers (ip_address, port) 
-                VALUES (?, ?)
-                """,
-                (ip_address, port)
-            )
-
-            # Update the server record with last_seen time
-            cursor.execute(
-                """
-                UPDATE servers 
-                SET last_seen = ? 
-                WHERE ip_address = ? AND port = ?
-                """,
-                (datetime.now(), ip_address, port)
-            )
-
-            conn.commit()
-            conn.close()
+            with self.connection(write=True) as conn:
+                cursor = conn.cursor()
+
+                # First, ensure the server exists in the servers table
+                cursor.execute(
+                    """
+                    INSERT OR IGNORE INTO servers (ip_address, port)
+                    VALUES (?, ?)
+                    """,
+                    (ip_address, port)
+                )
+
+                # Update the server record with last_seen time
+                cursor.execute(
+                    """
+                    UPDATE servers
+                    SET last_seen = ?
+                    WHERE ip_address = ? AND port = ?
+                    """,
+                    (datetime.now(), ip_address, port)
+                )
+
             return True, "Server registered successfully"
 
         except Exception as e:
@@ -133,32 +136,29 @@ class DatabaseManager:
     def unregister_server(self, ip_address, port):
         """Unregister a server - DO NOT clear recent_connection"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            # Get the server_id
-            cursor.execute(
-                "SELECT server_id FROM servers WHERE ip_address = ? AND port = ?",
-                (ip_address, port)
-            )
-            server_record = cursor.fetchone()
-
-            if not server_record:
-                conn.close()
-                return False, "Server not found"
-
-            # Just update last_seen time - DON'T clear recent_connection
-            cursor.execute(
-                """
-                UPDATE servers 
-                SET last_seen = ? 
-                WHERE ip_address = ? AND port = ?
-                """,
-                (datetime.now(), ip_address, port)
-            )
-
-            conn.commit()
-            conn.close()
+            with self.connection(write=True) as conn:
+                cursor = conn.cursor()
+
+                # Get the server_id
+                cursor.execute(
+                    "SELECT server_id FROM servers WHERE ip_address = ? AND port = ?",
+                    (ip_address, port)
+                )
+                server_record = cursor.fetchone()
+
+                if not server_record:
+                    return False, "Server not found"
+
+                # Just update last_seen time - DON'T clear recent_connection
+                cursor.execute(
+                    """
+                    UPDATE servers
+                    SET last_seen = ?
+                    WHERE ip_address = ? AND port = ?
+                    """,
+                    (datetime.now(), ip_address, port)
+                )
+
             return True, "Server unregistered successfully"
 
         except Exception as e:
@@ -168,20 +168,15 @@ class DatabaseManager:
     def update_recent_connection(self, ip_address, port, username):
         """Update the recent_connection field for a server when a new connection is made"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            cursor.execute(
-                """
-                UPDATE servers
-                SET recent_connection = ?, last_seen = ?
-                WHERE ip_address = ? AND port = ?
-                """,
-                (username, datetime.now(), ip_address, port)
-            )
-
-            conn.commit()
-            conn.close()
+            with self.connection(write=True) as conn:
+                conn.execute(
+                    """
+                    UPDATE servers
+                    SET recent_connection = ?, last_seen = ?
+                    WHERE ip_address = ? AND port = ?
+                    """,
+                    (username, datetime.now(), ip_address, port)
+                )
 
             logging.info(f"Updated recent_connection to '{username}' for server {ip_address}:{port}")
             return True, "Recent connection updated successfully"
@@ -193,48 +188,44 @@ class DatabaseManager:
     def set_connection_sharing(self, ip_address, port, is_shared, username):
         """Set whether a connection is shared - only update recent_connection when sharing is enabled"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            # Get the server_id
-            cursor.execute(
-                "SELECT server_id FROM servers WHERE ip_address = ? AND port = ?",
-                (ip_address, port)
-            )
-            server_record = cursor.fetchone()
-
-            if not server_record:
-                conn.close()
-                return False, "Server not found"
-
-            server_id = server_record['server_id']
+            with self.connection(write=True) as conn:
+                cursor = conn.cursor()
 
-            # Only update recent_connection when sharing is enabled (new connection)
-            if is_shared:
-                # Set the recent_connection field to the username
+                # Get the server_id
                 cursor.execute(
-                    """
-                    UPDATE servers
-                    SET recent_connection = ?, last_seen = ?
-                    WHERE server_id = ?
-                    """,
-                    (username, datetime.now(), server_id)
+                    "SELECT server_id FROM servers WHERE ip_address = ? AND port = ?",
+                    (ip_address, port)
                 )
-                logging.info(f"Set recent_connection to '{username}' for server {ip_address}:{port}")
-            else:
-                # When is_shared is False, we DON'T clear recent_connection - just update last_seen
-                cursor.execute(
-                    """
-                    UPDATE servers
-                    SET last_seen = ?
-                    WHERE server_id = ?
-                    """,
-                    (datetime.now(), server_id)
-                )
-                logging.info(f"Updated last_seen for server {ip_address}:{port} (keeping recent_connection)")
-
-            conn.commit()
-            conn.close()
+                server_record = cursor.fetchone()
+
+                if not server_record:
+                    return False, "Server not found"
+
+                server_id = server_record['server_id']
+
+                # Only update recent_connection when sharing is enabled (new connection)
+                if is_shared:
+                    # Set the recent_connection field to the username
+                    cursor.execute(
+                        """
+                        UPDATE servers
+                        SET recent_connection = ?, last_seen = ?
+                        WHERE server_id = ?
+                        """,
+                        (username, datetime.now(), server_id)
+                    )
+                    logging.info(f"Set recent_connection to '{username}' for server {ip_address}:{port}")
+                else:
+                    # When is_shared is False, we DON'T clear recent_connection - just update last_seen
+                    cursor.execute(
+                        """
+                        UPDATE servers
+                        SET last_seen = ?
+                        WHERE server_id = ?
+                        """,
+                        (datetime.now(), server_id)
+                    )
+                    logging.info(f"Updated last_seen for server {ip_address}:{port} (keeping recent_connection)")
 
             return True, "Connection sharing status updated"
 
@@ -245,19 +236,16 @@ class DatabaseManager:
     def get_all_active_servers(self):
         """Get all servers that have a recent connection"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            cursor.execute(
-                """
-                SELECT ip_address, port
-                FROM servers
-                WHERE recent_connection <> ''
-                """
-            )
-
-            servers = [dict(row) for row in cursor.fetchall()]
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT ip_address, port
+                    FROM servers
+                    WHERE recent_connection <> ''
+                    """
+                )
+                servers = [dict(row) for row in cursor.fetchall()]
             return servers
 
         except Exception as e:
@@ -267,19 +255,16 @@ class DatabaseManager:
     def get_shared_servers(self):
         """Get all servers that have a recent connection"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            cursor.execute(
-                """
-                SELECT ip_address, port
-                FROM servers
-                WHERE recent_connection <> ''
-                """
-            )
-
-            servers = [dict(row) for row in cursor.fetchall()]
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT ip_address, port
+                    FROM servers
+                    WHERE recent_connection <> ''
+                    """
+                )
+                servers = [dict(row) for row in cursor.fetchall()]
             return servers
 
         except Exception as e:
@@ -289,20 +274,17 @@ class DatabaseManager:
     def get_user_connections(self, username):
         """Get all servers that a user has as recent connection"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            cursor.execute(
-                """
-                SELECT ip_address, port
-                FROM servers
-                WHERE recent_connection = ?
-                """,
-                (username,)
-            )
-
-            connections = [dict(row) for row in cursor.fetchall()]
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT ip_address, port
+                    FROM servers
+                    WHERE recent_connection = ?
+                    """,
+                    (username,)
+                )
+                connections = [dict(row) for row in cursor.fetchall()]
             return connections
 
         except Exception as e:
@@ -312,23 +294,20 @@ class DatabaseManager:
     def get_all_connection_details(self):
         """Get detailed information about all servers with recent connections"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            cursor.execute(
-                """
-                SELECT 
-                    ip_address as server_ip,
-                    last_seen as connected_at,
-                    recent_connection as connect_by,
-                    recent_connection
-                FROM servers
-                WHERE recent_connection <> ''
-                """
-            )
-
-            connection_details = [dict(row) for row in cursor.fetchall()]
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT
+                        ip_address as server_ip,
+                        last_seen as connected_at,
+                        recent_connection as connect_by,
+                        recent_connection
+                    FROM servers
+                    WHERE recent_connection <> ''
+                    """
+                )
+                connection_details = [dict(row) for row in cursor.fetchall()]
             return connection_details
 
         except Exception as e:
@@ -338,22 +317,20 @@ class DatabaseManager:
     def clean_disconnected_user(self, username):
         """When user disconnects, DON'T remove them from recent_connection - just log"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            # Count how many servers have this user as recent_connection
-            cursor.execute(
-                """
-                SELECT COUNT(*) as count
-                FROM servers
-                WHERE recent_connection = ?
-                """,
-                (username,)
-            )
-            result = cursor.fetchone()
-            count = result['count'] if result else 0
-
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+
+                # Count how many servers have this user as recent_connection
+                cursor.execute(
+                    """
+                    SELECT COUNT(*) as count
+                    FROM servers
+                    WHERE recent_connection = ?
+                    """,
+                    (username,)
+                )
+                result = cursor.fetchone()
+                count = result['count'] if result else 0
 
             # Just log that user disconnected, but don't clear recent_connection
             logging.info(f"User {username} disconnected. They remain as recent_connection for {count} servers")
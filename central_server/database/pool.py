@@ -0,0 +1,130 @@
+"""
+Pooled SQLite connections for the Central Management Server.
+Connections are opened and tuned once and then reused, so a query skips the open and finds
+its statement already compiled in the connection's cache. In WAL mode readers never wait on
+the writer, and writers take turns on a lock instead of backing off in SQLite's busy handler.
+"""
+
+import logging
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Connections kept open, threads beyond this wait for one to be returned
+POOL_SIZE = 8
+
+# Seconds to wait for a free connection, and for a lock held by another process
+ACQUIRE_TIMEOUT = 30.0
+BUSY_TIMEOUT = 30.0
+
+# Compiled statements each connection keeps, more than the server has distinct queries
+STATEMENT_CACHE = 256
+
+# Per-connection tuning. NORMAL sync is safe with WAL, a power cut can only lose the last commits.
+PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=67108864"
+)
+
+
+class ConnectionPool:
+    """Thread-safe pool of connections to one SQLite database.
+    A size of 0 opens a plain connection for every use instead, as before the pool."""
+
+    def __init__(self, db_path, size=POOL_SIZE, journal_mode='wal'):
+        self.db_path = db_path
+        self.size = size
+        self.journal_mode = journal_mode
+
+        # Most recently returned first, its pages are the likeliest to still be cached
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.closed = False
+
+    def open(self):
+        """Open a connection, tuned unless the pool is disabled"""
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE)
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        if self.size:
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """Take an idle connection, open one while below the pool size, otherwise wait for one"""
+        if not self.size:
+            return self.open()
+
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            if self.opened < self.size:
+                self.opened += 1
+                try:
+                    return self.open()
+                except Exception:
+                    self.opened -= 1
+                    raise
+
+        try:
+            return self.idle.get(timeout=ACQUIRE_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError("No database connection became free")
+
+    def release(self, conn):
+        """Return a connection to the pool, closing it if the pool is disabled or closed"""
+        if not self.size or self.closed:
+            conn.close()
+            return
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            # A connection that can't even roll back is replaced on the next acquire
+            logging.warning(f"Dropping broken database connection: {e}")
+            conn.close()
+            with self.lock:
+                self.opened -= 1
+            return
+        self.idle.put(conn)
+
+    @contextmanager
+    def connection(self, write=False):
+        """Borrow a connection for a with block, committed when the block ends and rolled back if it raises.
+        Blocks that write pass write=True and run one at a time."""
+        write = write and self.size
+        if write:
+            self.write_lock.acquire()
+        try:
+            conn = self.acquire()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                self.release(conn)
+        finally:
+            if write:
+                self.write_lock.release()
+
+    def close(self):
+        """Close every idle connection, borrowed ones are closed as they come back"""
+        self.closed = True
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
\ No newline at end of file
@@ -11,12 +11,12 @@ import hashlib
 DATABASE_PATH = "central_server.db"
 
 
-def create_schema():
+def create_schema(db_path=DATABASE_PATH):
     """Create the database schema if it doesn't exist"""
-    if os.path.exists(DATABASE_PATH) and os.path.getsize(DATABASE_PATH) > 0:
+    if os.path.exists(db_path) and os.path.getsize(db_path) > 0:
         # If database exists, check if we need to update the schema
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = sqlite3.connect(db_path)
             cursor = conn.cursor()
 
             # Check if servers table needs to be updated
@@ -38,14 +38,14 @@ def create_schema():
             conn.commit()
             conn.close()
 
-            logging.info(f"Database schema updated successfully at {DATABASE_PATH}")
+            logging.info(f"Database schema updated successfully at {db_path}")
         except Exception as e:
             logging.error(f"Error updating database schema: {e}")
 
         return True
 
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
 
         # Create users table
@@ -85,7 +85,7 @@ def create_schema():
         conn.commit()
         conn.close()
 
-        logging.info(f"Database schema created successfully at {DATABASE_PATH}")
+        logging.info(f"Database schema created successfully at {db_path}")
         return True
 
     except Exception as e:
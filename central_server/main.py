@@ -11,6 +11,7 @@ import os
 
 from central_server.database.schema import create_schema
 from central_server.connection.manager import ConnectionManager
+from central_server.connection.key_pool import KEY_POLICIES
 from central_server.utils.logging import setup_logging
 
 
@@ -24,6 +25,12 @@ def parse_arguments():
     parser.add_argument("-l", "--log-level", type=str,
                         choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
                         default="INFO", help="Logging level (default: INFO)")
+    parser.add_argument("--key-policy", type=str, choices=list(KEY_POLICIES), default="pool",
+                        help="RSA key policy for the key exchange (default: pool)")
+    parser.add_argument("--key-pool-size", type=int, default=8,
+                        help="Pre-generated RSA keys kept ready with the pool policy (default: 8)")
+    parser.add_argument("--ticket-lifetime", type=int, default=300,
+                        help="Seconds a session resumption ticket stays valid (default: 300)")
     return parser.parse_args()
 
 
@@ -60,7 +67,10 @@ def main():
     # Create and start server
     server = ConnectionManager(
         host=host,
-        port=port
+        port=port,
+        key_policy=args.key_policy,
+        key_pool_size=args.key_pool_size,
+        ticket_lifetime=args.ticket_lifetime
     )
     signal_handler.server = server
 
@@ -1,3 +1,4 @@
+import base64
 import socket
 import json
 import logging
@@ -5,6 +6,7 @@ import threading
 import time
 
 from nc_client.connection.encryption import EncryptionManager
+from nc_client.connection.manager import TICKET_EXPIRY_MARGIN
 
 
 class CentralServerClient:
@@ -21,6 +23,9 @@ class CentralServerClient:
         self.connected = False
         self.authenticated = False
 
+        # Session resumption ticket from the last connection
+        self.session_ticket = None
+
         # User information
         self.user_id = None
         self.username = None
@@ -63,8 +68,9 @@ class CentralServerClient:
                 # Use socket directly
                 wrapped_socket = client_socket
 
-                # Perform RSA + AES key exchange
-                if not self.encryption_manager.perform_key_exchange(wrapped_socket):
+                # Perform RSA + AES key exchange, resuming the previous session when possible
+                session_ticket = self.get_session_ticket()
+                if not self.encryption_manager.perform_key_exchange(wrapped_socket, session_ticket):
                     logging.warning("Key exchange failed, continuing with fallback encryption")
 
                 # Set cipher suite
@@ -75,10 +81,20 @@ class CentralServerClient:
                 self.connected = True
                 logging.info(f"Connected to central server at {self.host}:{self.port} with RSA + AES hybrid encryption")
 
-                # Start heartbeat thread
-                self.connection_thread = threading.Thread(target=self.heartbeat_loop)
-                self.connection_thread.daemon = True
-                self.connection_thread.start()
+                # Move traffic off Fernet onto the AEAD record layer
+                self.negotiate_record_layer()
+
+                # A resumed session is still logged in on the server side
+                if self.encryption_manager.resumed:
+                    self.authenticated = session_ticket.get('authenticated', False)
+                    logging.info(f"Resumed central server session for {self.username}")
+                    self.refresh_session_ticket()
+
+                # Start heartbeat thread unless the previous one is still running
+                if not self.connection_thread or not self.connection_thread.is_alive():
+                    self.connection_thread = threading.Thread(target=self.heartbeat_loop)
+                    self.connection_thread.daemon = True
+                    self.connection_thread.start()
 
                 return True
 
@@ -98,6 +114,7 @@ class CentralServerClient:
         """Disconnect from the central server"""
         self.connected = False
         self.authenticated = False
+        self.session_ticket = None
 
         if self.socket:
             try:
@@ -128,8 +145,56 @@ class CentralServerClient:
                 except:
                     pass
 
+    def negotiate_record_layer(self):
+        """Negotiate the AEAD record layer, Fernet stays in use if the server can't"""
+        if not self.encryption_manager.encryption_key:
+            return
+
+        response = self.send_command("negotiate_record_layer", {
+            "ciphers": self.encryption_manager.get_record_cipher_offer()
+        })
+        if response and response.get("status") == "success":
+            self.encryption_manager.enable_record_layer(
+                response["data"]["cipher"],
+                base64.b64decode(response["data"]["salt"])
+            )
+
+    def get_session_ticket(self):
+        """Get the stored session ticket if it has not expired"""
+        if self.session_ticket and self.session_ticket['expires'] > time.time():
+            return self.session_ticket
+        return None
+
+    def refresh_session_ticket(self):
+        """Request a session resumption ticket for the current session key"""
+        session_key = self.encryption_manager.encryption_key
+        self.session_ticket = None
+
+        if not session_key:
+            return
+
+        response = self.send_command("session_ticket", {})
+        if response and response.get("status") == "success":
+            ticket_data = response["data"]
+            self.session_ticket = {
+                'ticket': ticket_data['ticket'],
+                'key': session_key,
+                'authenticated': self.authenticated,
+                'expires': time.time() + ticket_data['lifetime'] - TICKET_EXPIRY_MARGIN
+            }
+
     def send_command(self, command_type, data):
         """Send a command to the central server with AES encryption"""
+        if (not self.socket or not self.connected) and self.get_session_ticket():
+            # Dropped connection with a valid ticket, resuming is a single round trip
+            if self.socket:
+                try:
+                    self.socket.close()
+                except:
+                    pass
+            self.socket = None
+            self.connect()
+
         if not self.socket or not self.connected:
             logging.error("Not connected to central server")
             self.connected = False
@@ -193,6 +258,9 @@ class CentralServerClient:
 
             logging.info(f"Successfully logged in as {self.username}")
 
+            # Ticket carries the login, so a dropped connection resumes without logging in again
+            self.refresh_session_ticket()
+
             # Refresh server lists
             self.refresh_server_lists()
 
@@ -8,11 +8,31 @@ Encryption utilities for the NC Client.
 Implements RSA + AES hybrid encryption for secure communication.
 """
 
+import base64
 import logging
 import struct
+import time
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from nc_client.connection.framing import send_message, recv_message
+from nc_client.connection.record_layer import RecordLayer, RECORD_CIPHERS, derive_record_keys, is_record
+
+# Key exchange frames. We open with a resumption request or a hello, the server only sends its
+# public key after a hello or a rejected ticket. The accept frame is followed by the server's nonce.
+KEY_EXCHANGE_HELLO = b'NCHELLO1'
+RESUME_MAGIC = b'NCRESUME1'
+RESUME_ACCEPTED = b'RESUMED'
+RESUME_NONCE_SIZE = 16
+
+
+def derive_resumed_key(client_key, server_nonce):
+    """Fernet key of a resumed session, from our new key and the nonce the server chose"""
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=server_nonce, info=b'nc session resume')
+    return base64.urlsafe_b64encode(hkdf.derive(client_key))
+
 
 class EncryptionManager:
     """Client-side encryption manager using AES via Fernet"""
@@ -26,23 +46,29 @@ class EncryptionManager:
         self.encryption_key = None
         self.cipher_suite = None
 
-    def perform_key_exchange(self, socket):
-        """Perform RSA + AES key exchange with server"""
-        try:
-            # Step 1: Receive RSA public key from server
-            public_key_size_bytes = socket.recv(4)
-            if len(public_key_size_bytes) != 4:
-                raise ConnectionError("Failed to receive public key size")
+        # Whether the last key exchange resumed a previous session
+        self.resumed = False
 
-            public_key_size = struct.unpack('>I', public_key_size_bytes)[0]
+        # Optional AEAD record layer negotiated after the key exchange
+        self.record_layer = None
 
-            # Receive public key
-            public_key_bytes = b''
-            while len(public_key_bytes) < public_key_size:
-                chunk = socket.recv(public_key_size - len(public_key_bytes))
-                if not chunk:
-                    raise ConnectionError("Connection closed while receiving public key")
-                public_key_bytes += chunk
+    def perform_key_exchange(self, socket, session_ticket=None):
+        """Perform RSA + AES key exchange with server, resuming from a session ticket if given"""
+        self.resumed = False
+        self.record_layer = None
+
+        try:
+            # Step 1: Open with a ticket from the previous session to skip the RSA exchange,
+            # otherwise ask for the server's public key
+            if session_ticket and session_ticket.get('expires', 0) > time.time():
+                if self.resume_session(socket, session_ticket):
+                    return True
+            else:
+                send_message(socket, KEY_EXCHANGE_HELLO)
+
+            # Receive RSA public key from server
+            public_key_bytes = recv_message(socket)
+            public_key_size = len(public_key_bytes)
 
             logging.info(f"Received RSA public key ({public_key_size} bytes) from server")
 
@@ -64,8 +90,7 @@ class EncryptionManager:
 
             # Step 5: Send encrypted AES key to server
             encrypted_key_size = len(encrypted_aes_key)
-            socket.send(struct.pack('>I', encrypted_key_size))
-            socket.send(encrypted_aes_key)
+            send_message(socket, encrypted_aes_key)
 
             logging.info(f"Sent encrypted AES key ({encrypted_key_size} bytes) to server")
 
@@ -82,6 +107,46 @@ class EncryptionManager:
             self.cipher_suite = self
             return False
 
+    def resume_session(self, socket, session_ticket):
+        """Present a session ticket and switch to a fresh key sealed with the previous one.
+        After a rejection the server goes on with the full key exchange."""
+        ticket = session_ticket['ticket']
+        if isinstance(ticket, str):
+            ticket = ticket.encode()
+
+        # The new key travels encrypted under the old session key, so only the ticket holder can use it
+        new_key = Fernet.generate_key()
+        sealed_key = Fernet(session_ticket['key']).encrypt(new_key)
+
+        send_message(socket, RESUME_MAGIC + struct.pack('>H', len(ticket)) + ticket + sealed_key)
+        reply = recv_message(socket)
+
+        if len(reply) != len(RESUME_ACCEPTED) + RESUME_NONCE_SIZE or not reply.startswith(RESUME_ACCEPTED):
+            logging.info("Session ticket rejected by server, performing full key exchange")
+            return False
+
+        self.encryption_key = derive_resumed_key(new_key, reply[len(RESUME_ACCEPTED):])
+        self.cipher_suite = Fernet(self.encryption_key)
+        self.resumed = True
+        logging.info("Resumed encrypted session from ticket")
+        return True
+
+    def get_record_cipher_offer(self):
+        """Record ciphers to offer the server, in order of preference"""
+        return list(RECORD_CIPHERS)
+
+    def enable_record_layer(self, cipher_name, salt):
+        """Switch outgoing messages to the AEAD record layer the server picked"""
+        try:
+            client_key, server_key = derive_record_keys(self.encryption_key, salt)
+            self.record_layer = RecordLayer(cipher_name, send_key=client_key, receive_key=server_key)
+            logging.info(f"AEAD record layer enabled with {cipher_name}")
+            return True
+        except Exception as e:
+            logging.error(f"Error enabling record layer: {e}")
+            self.record_layer = None
+            return False
+
     def set_encryption_key(self, key):
         """Set encryption key from server and initialize cipher"""
         try:
@@ -109,6 +174,8 @@ class EncryptionManager:
         if isinstance(data, str):
             data = data.encode()
         try:
+            if self.record_layer:
+                return self.record_layer.seal(data)
             return self.cipher_suite.encrypt(data)
         except Exception as e:
             logging.error(f"Encryption error: {e}")
@@ -125,6 +192,14 @@ class EncryptionManager:
                     return str(encrypted_data)
             return str(encrypted_data)
 
+        # Records and Fernet tokens can both arrive while the server is switching over
+        if self.record_layer and is_record(encrypted_data):
+            try:
+                return self.record_layer.open(encrypted_data).decode()
+            except (ValueError, UnicodeDecodeError) as e:
+                logging.error(f"Record layer error: {e}")
+                return ''
+
         if isinstance(encrypted_data, bytes):
             try:
                 decrypted = self.cipher_suite.decrypt(encrypted_data)
@@ -0,0 +1,73 @@
+"""
+Message framing for the NC Client command channel.
+Every message is sent as a 4-byte big-endian length prefix followed by the payload.
+"""
+
+import socket
+import struct
+import time
+
+HEADER_FORMAT = '>I'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Upper bound on a single message, protects against corrupt or hostile length prefixes
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+# Seconds a started message may go without receiving a byte before the peer is dropped
+MAX_STALL = 30.0
+
+
+def send_message(sock, payload):
+    """Send a single length-prefixed message"""
+    if isinstance(payload, str):
+        payload = payload.encode()
+
+    sock.sendall(struct.pack(HEADER_FORMAT, len(payload)) + payload)
+
+
+def recv_exact(sock, size, mid_message=False):
+    """Receive exactly size bytes from the socket.
+
+    A timeout before any byte of a new message has arrived is raised to the
+    caller so that idle loops keep working; once a message has started,
+    timeouts are retried so a slow sender cannot desynchronize the stream,
+    until no byte has arrived for MAX_STALL seconds.
+    """
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    stalled_since = None
+
+    while received < size:
+        try:
+            count = sock.recv_into(view[received:], size - received)
+        except socket.timeout:
+            if received == 0 and not mid_message:
+                raise
+            now = time.monotonic()
+            if stalled_since is None:
+                stalled_since = now
+            elif now - stalled_since > MAX_STALL:
+                raise ConnectionError(f"Peer stalled for over {MAX_STALL:.0f} seconds mid-message")
+            continue
+
+        if count == 0:
+            raise ConnectionError("Connection closed while receiving data")
+        received += count
+        stalled_since = None
+
+    return bytes(buffer)
+
+
+def recv_message(sock, max_size=MAX_MESSAGE_SIZE):
+    """Receive a single length-prefixed message"""
+    header = recv_exact(sock, HEADER_SIZE)
+    size = struct.unpack(HEADER_FORMAT, header)[0]
+
+    if size > max_size:
+        raise ConnectionError(f"Message of {size} bytes exceeds limit of {max_size} bytes")
+
+    if size == 0:
+        return b''
+
+    return recv_exact(sock, size, mid_message=True)
\ No newline at end of file
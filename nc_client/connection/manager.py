@@ -1,9 +1,20 @@
+import base64
 import socket
 import json
+import itertools
 import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 import time
 import logging
 from nc_client.connection.encryption import EncryptionManager
+from nc_client.connection.framing import send_message, recv_message
+
+
+# Refresh session tickets this many seconds before the server expires them
+TICKET_EXPIRY_MARGIN = 30
+
+# Seconds between system info frames pushed by the agent
+SYSTEM_INFO_INTERVAL = 5
 
 
 class ConnectionManager:
@@ -14,6 +25,10 @@ class ConnectionManager:
         # Initialize encryption manager
         self.encryption_manager = EncryptionManager()
 
+        # Callbacks for frames the agent pushes, by stream name
+        self.push_handlers = {}
+        self.register_push_handler('system_info', self.handle_system_info_push)
+
     def add_connection(self, host, port):
         """Add a new remote connection with auto-reconnect support and automatic sharing"""
         if not host:
@@ -45,6 +60,14 @@ class ConnectionManager:
             'connection_active': False,
             'reconnect_attempts': 0,
             'last_reconnect_time': time.time(),
+            'session_ticket': None,
+            'command_lock': threading.Lock(),
+            'send_lock': threading.Lock(),
+            'request_ids': itertools.count(1),
+            'pending': None,
+            'multiplexed': False,
+            'subscriptions': {},
+            'last_push': 0,
             'is_shared': True  # Default to sharing enabled
         }
 
@@ -157,7 +180,7 @@ class ConnectionManager:
             encryption_manager = EncryptionManager()
 
             # Perform RSA + AES key exchange
-            if not encryption_manager.perform_key_exchange(wrapped_socket):
+            if not encryption_manager.perform_key_exchange(wrapped_socket, self.get_session_ticket(connection_id)):
                 logging.warning(f"Key exchange failed for {host}:{port}, continuing with fallback encryption")
 
             # Update connection info
@@ -168,6 +191,9 @@ class ConnectionManager:
             # Always set is_shared to True
             self.connections[connection_id]['is_shared'] = True
 
+            # Replies and pushed frames are read by a receiver thread from now on
+            self.start_receiver(connection_id)
+
             # Update UI from the main thread
             self.parent_app.after(0, lambda conn_id=connection_id:
             self.parent_app.connection_tab.computer_list.set(conn_id, "status", "Connected"))
@@ -184,6 +210,12 @@ class ConnectionManager:
                 # Schedule auto-registration with a slight delay to ensure connection is stable
                 self.parent_app.after(500, lambda: self.auto_register_with_central_server(connection_id))
 
+            # Move bulk traffic off Fernet onto the AEAD record layer
+            self.negotiate_record_layer(connection_id)
+
+            # Get a ticket so a dropped connection can resume without a new key exchange
+            self.refresh_session_ticket(connection_id)
+
             # Start monitoring thread
             monitor_thread = threading.Thread(
                 target=self.monitor_connection,
@@ -270,14 +302,11 @@ class ConnectionManager:
             }
             print(f"Sending command: {command_type}")
 
-            # Convert to JSON
-            json_data = json.dumps(command)
-
-            # Set socket timeout based on command type
+            # Set response timeout based on command type
             if command_type in ['start_rdp', 'stop_rdp']:
-                connection['socket'].settimeout(30.0)  # Longer timeout for these operations
+                timeout = 30.0  # Longer timeout for these operations
             else:
-                connection['socket'].settimeout(10.0)  # Standard timeout
+                timeout = 10.0  # Standard timeout
 
             # Get cipher suite
             cipher_suite = connection.get('cipher_suite')
@@ -286,31 +315,13 @@ class ConnectionManager:
                 connection['connection_active'] = False
                 return None
 
-            # Encrypt and send data
-            encrypted_data = cipher_suite.encrypt_data(json_data)
-            connection['socket'].send(encrypted_data)
-            print("Command sent successfully")
-
             # Receive response with timeout handling
             try:
                 print("Waiting for response...")
-                encrypted_response = connection['socket'].recv(16384)
-
-                # Update last successful communication time
-                connection['last_health_check'] = time.time()
-
-                if not encrypted_response:
-                    print("Received empty response from server")
-                    # Mark connection as inactive to trigger reconnection
-                    connection['connection_active'] = False
-                    return None
 
-                print(f"Received encrypted response of length: {len(encrypted_response)}")
-
-                # Decrypt the response
+                # Send the command and wait for the reply routed back by the receiver thread
                 try:
-                    decrypted_data = cipher_suite.decrypt_data(encrypted_response)
-                    response = json.loads(decrypted_data)
+                    response = self.exchange(connection, command, timeout)
                     print("Response parsed successfully")
 
                     # Mark as successfully communicated
@@ -363,6 +374,255 @@ class ConnectionManager:
             connection['connection_active'] = False
             return None
 
+    def start_receiver(self, connection_id):
+        """Start the thread reading replies and pushed frames from a connection's socket"""
+        connection = self.connections[connection_id]
+        connection.setdefault('command_lock', threading.Lock())
+        connection.setdefault('send_lock', threading.Lock())
+        connection.setdefault('subscriptions', {})
+        connection.setdefault('request_ids', itertools.count(1))
+
+        # Commands in flight on this socket by request id
+        pending = {}
+        connection['pending'] = pending
+
+        # Until the agent echoes request ids, commands go one at a time
+        connection['multiplexed'] = False
+
+        receiver_thread = threading.Thread(
+            target=self.receive_loop,
+            args=(connection_id, connection['socket'], connection['cipher_suite'], pending)
+        )
+        receiver_thread.daemon = True
+        receiver_thread.start()
+
+    def receive_loop(self, connection_id, sock, cipher_suite, pending):
+        """Route frames from one socket to waiting commands or push handlers"""
+        while connection_id in self.connections and self.connections[connection_id].get('socket') is sock:
+            try:
+                encrypted_message = recv_message(sock)
+            except socket.timeout:
+                # Idle connection, keep waiting
+                continue
+            except (OSError, ValueError) as e:
+                # Wake every waiting command so it sees the broken connection
+                for future in list(pending.values()):
+                    future.set_exception(e)
+                pending.clear()
+                return
+
+            try:
+                message = json.loads(cipher_suite.decrypt_data(encrypted_message))
+            except json.JSONDecodeError as e:
+                logging.error(f"Invalid JSON from {connection_id}: {e}")
+                # Without request ids the reply can only belong to the single command in flight
+                if pending and not self.connections.get(connection_id, {}).get('multiplexed'):
+                    pending.pop(next(iter(pending))).set_exception(e)
+                continue
+
+            if isinstance(message, dict) and 'push' in message:
+                self.dispatch_push(connection_id, message)
+                continue
+
+            request_id = message.get('id') if isinstance(message, dict) else None
+            if request_id is not None:
+                connection = self.connections.get(connection_id)
+                if connection:
+                    connection['multiplexed'] = True
+                future = pending.pop(request_id, None)
+            else:
+                # Agents without request ids reply in order, one command at a time
+                future = pending.pop(next(iter(pending))) if pending else None
+
+            if future is None:
+                # Reply to a command that already timed out
+                logging.debug(f"Dropping late reply from {connection_id}")
+            else:
+                future.set_result(message)
+
+    def exchange(self, connection, command, timeout):
+        """Send one encrypted command and wait for its reply"""
+        if connection.get('multiplexed'):
+            return self.send_request(connection, command, timeout)
+
+        # Agents that don't echo request ids need strict lockstep
+        with connection['command_lock']:
+            return self.send_request(connection, command, timeout)
+
+    def send_request(self, connection, command, timeout):
+        """Send a command tagged with a request id and wait for the matching reply"""
+        request_id = next(connection['request_ids'])
+        future = Future()
+        pending = connection['pending']
+        pending[request_id] = future
+
+        try:
+            encrypted_data = connection['cipher_suite'].encrypt_data(json.dumps(dict(command, id=request_id)))
+            with connection['send_lock']:
+                send_message(connection['socket'], encrypted_data)
+
+            reply = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise socket.timeout("Timed out waiting for response")
+        finally:
+            pending.pop(request_id, None)
+
+        # Update last successful communication time
+        connection['last_health_check'] = time.time()
+        return reply
+
+    def register_push_handler(self, stream, handler):
+        """Register a callback(connection_id, data) for frames pushed on a stream"""
+        self.push_handlers.setdefault(stream, []).append(handler)
+
+    def dispatch_push(self, connection_id, message):
+        """Hand a pushed frame to the handlers registered for its stream"""
+        connection = self.connections.get(connection_id)
+        if connection:
+            connection['last_push'] = time.time()
+
+        for handler in self.push_handlers.get(message['push'], []):
+            try:
+                handler(connection_id, message.get('data'))
+            except Exception as e:
+                logging.error(f"Error handling {message['push']} push from {connection_id}: {e}")
+
+    def subscribe(self, connection_id, stream, interval, **options):
+        """Ask the agent to push a stream, returns the negotiated interval or None"""
+        connection = self.connections.get(connection_id)
+        if not connection:
+            return None
+
+        response = self.send_command(connection_id, 'subscribe', dict(options, stream=stream, interval=interval))
+        if not response or response.get('status') != 'success':
+            # Older agents don't push, callers fall back to polling
+            return None
+
+        connection['subscriptions'][stream] = dict(options, interval=interval)
+        connection['last_push'] = time.time()
+        return response['data']['interval']
+
+    def unsubscribe(self, connection_id, stream):
+        """Stop the agent pushing a stream"""
+        connection = self.connections.get(connection_id)
+        if not connection or connection['subscriptions'].pop(stream, None) is None:
+            return
+
+        self.send_command(connection_id, 'unsubscribe', {'stream': stream})
+
+    def send_batch(self, connection_id, commands):
+        """Send several commands in one round trip, returns their responses in order"""
+        response = self.send_command(connection_id, 'batch', {'commands': commands})
+        if response and response.get('status') == 'success':
+            return response['data']['results']
+
+        # Older agents don't batch, fall back to one round trip per command
+        if response and 'Unknown command' in response.get('message', ''):
+            return [self.send_command(connection_id, command['type'], command.get('data', {}))
+                    for command in commands]
+
+        return [None] * len(commands)
+
+    def negotiate_record_layer(self, connection_id):
+        """Negotiate the AEAD record layer, Fernet stays in use if the agent can't"""
+        connection = self.connections.get(connection_id)
+        if not connection or not getattr(connection.get('cipher_suite'), 'encryption_key', None):
+            return
+
+        response = self.send_command(connection_id, 'negotiate_record_layer', {
+            'ciphers': connection['cipher_suite'].get_record_cipher_offer()
+        })
+        self.apply_record_layer(connection_id, response)
+
+    def apply_record_layer(self, connection_id, response):
+        """Switch a connection to the record cipher from a negotiate_record_layer response"""
+        connection = self.connections.get(connection_id)
+        if not connection or not response or response.get('status') != 'success':
+            return
+
+        connection['cipher_suite'].enable_record_layer(
+            response['data']['cipher'],
+            base64.b64decode(response['data']['salt'])
+        )
+
+    def restore_session(self, connection_id):
+        """Fetch a session ticket and resubscribe a new socket to the streams the old one had"""
+        connection = self.connections.get(connection_id)
+        if not connection:
+            return
+
+        session_key = getattr(connection.get('cipher_suite'), 'encryption_key', None)
+        subscriptions = list(connection['subscriptions'].items())
+
+        record_ciphers = connection['cipher_suite'].get_record_cipher_offer()
+        commands = [
+            {'type': 'negotiate_record_layer', 'data': {'ciphers': record_ciphers}},
+            {'type': 'session_ticket', 'data': {}}
+        ]
+        commands += [{'type': 'subscribe', 'data': dict(options, stream=stream)} for stream, options in subscriptions]
+        responses = self.send_batch(connection_id, commands)
+
+        self.apply_record_layer(connection_id, responses[0])
+        self.store_session_ticket(connection_id, session_key, responses[1])
+
+        for (stream, options), response in zip(subscriptions, responses[2:]):
+            if response and response.get('status') == 'success':
+                connection['last_push'] = time.time()
+            else:
+                # Not pushed anymore, callers fall back to polling
+                connection['subscriptions'].pop(stream, None)
+
+    def handle_system_info_push(self, connection_id, data):
+        """Store system info pushed by the agent"""
+        connection = self.connections.get(connection_id)
+        if not connection:
+            return
+
+        connection['system_info'] = data
+        connection['connection_active'] = True
+
+    def get_session_ticket(self, connection_id):
+        """Get the stored session ticket for a connection if it has not expired"""
+        connection = self.connections.get(connection_id)
+        if not connection:
+            return None
+
+        session_ticket = connection.get('session_ticket')
+        if session_ticket and session_ticket['expires'] > time.time():
+            return session_ticket
+        return None
+
+    def refresh_session_ticket(self, connection_id):
+        """Request a session resumption ticket for the current session key"""
+        connection = self.connections.get(connection_id)
+        if not connection:
+            return
+
+        cipher_suite = connection.get('cipher_suite')
+        session_key = getattr(cipher_suite, 'encryption_key', None)
+        connection['session_ticket'] = None
+
+        if not session_key:
+            return
+
+        response = self.send_command(connection_id, 'session_ticket', {})
+        self.store_session_ticket(connection_id, session_key, response)
+
+    def store_session_ticket(self, connection_id, session_key, response):
+        """Keep the ticket from a session_ticket response with the key it is bound to"""
+        connection = self.connections.get(connection_id)
+        if not connection:
+            return
+
+        connection['session_ticket'] = None
+        if session_key and response and response.get('status') == 'success':
+            ticket_data = response['data']
+            connection['session_ticket'] = {
+                'ticket': ticket_data['ticket'],
+                'key': session_key,
+                'expires': time.time() + ticket_data['lifetime'] - TICKET_EXPIRY_MARGIN
+            }
+
     def attempt_reconnection(self, connection_id):
         """Attempt to reconnect to a failed connection with RSA + AES hybrid encryption"""
         connection = self.connections.get(connection_id)
@@ -393,8 +653,8 @@ class ConnectionManager:
             # Create a new encryption manager
             encryption_manager = EncryptionManager()
 
-            # Perform RSA + AES key exchange
-            if not encryption_manager.perform_key_exchange(wrapped_socket):
+            # Perform RSA + AES key exchange, resuming the previous session when possible
+            if not encryption_manager.perform_key_exchange(wrapped_socket, self.get_session_ticket(connection_id)):
                 logging.warning(
                     f"Key exchange failed on reconnect for {host}:{port}, continuing with fallback encryption")
 
@@ -402,9 +662,15 @@ class ConnectionManager:
             self.connections[connection_id]['socket'] = wrapped_socket
             self.connections[connection_id]['cipher_suite'] = encryption_manager
             self.connections[connection_id]['connection_active'] = True
+            self.start_receiver(connection_id)
+
+            # Tickets are bound to the session key and subscriptions to the old socket,
+            # renew both in one round trip
+            self.restore_session(connection_id)
 
             # Log the successful reconnection
-            logging.info(f"Successfully reconnected to {host}:{port}")
+            resumed = " (resumed session)" if encryption_manager.resumed else ""
+            logging.info(f"Successfully reconnected to {host}:{port}{resumed}")
             self.parent_app.toast.show_toast(f"Reconnected to {host}:{port}", "success")
 
             return True
@@ -503,20 +769,29 @@ class ConnectionManager:
         reconnect_delay = 5  # Initial reconnect delay in seconds
         max_reconnect_delay = 60  # Maximum reconnect delay
 
+        # Let the agent push system info instead of asking for it, older agents are polled
+        push_interval = self.subscribe(connection_id, 'system_info', SYSTEM_INFO_INTERVAL)
+
         while connection_id in self.connections:
             try:
-                # Get system info
-                response = self.send_command(connection_id, 'system_info', {})
-                if response and response.get('status') == 'success':
-                    self.connections[connection_id]['system_info'] = response['data']
-                    # Reset reconnect delay on successful communication
+                if push_interval and 'system_info' in self.connections[connection_id]['subscriptions']:
+                    # Pushed frames keep last_push fresh, silence means the connection is gone
+                    if time.time() - self.connections[connection_id]['last_push'] > push_interval * 3:
+                        raise ConnectionError("No system info pushed by server")
                     reconnect_delay = 5
-                    # Update status in computer list
-                    self.parent_app.connection_tab.computer_list.set(connection_id, "status", "Connected")
-                    self.connections[connection_id]['connection_active'] = True
                 else:
-                    # Handle failed response
-                    raise ConnectionError("Invalid response from server")
+                    # Get system info
+                    response = self.send_command(connection_id, 'system_info', {})
+                    if response and response.get('status') == 'success':
+                        self.connections[connection_id]['system_info'] = response['data']
+                        # Reset reconnect delay on successful communication
+                        reconnect_delay = 5
+                        # Update status in computer list
+                        self.parent_app.connection_tab.computer_list.set(connection_id, "status", "Connected")
+                        self.connections[connection_id]['connection_active'] = True
+                    else:
+                        # Handle failed response
+                        raise ConnectionError("Invalid response from server")
 
             except Exception as e:
                 print(f"Monitoring error for {connection_id}: {str(e)}")
@@ -570,20 +845,15 @@ class ConnectionManager:
                     # Check connection status
                     try:
                         # Very simple ping without extensive processing
-                        if connection.get('socket') and connection.get('cipher_suite'):
+                        if (connection.get('socket') and connection.get('cipher_suite') and
+                                connection.get('pending') is not None):
                             # Send a small ping command
                             try:
-                                connection['socket'].settimeout(2.0)  # Short timeout for health check
-                                ping_cmd = json.dumps({'type': 'ping', 'data': {}})
-                                # Get cipher suite
-                                cipher_suite = connection.get('cipher_suite')
-                                # Encrypt the data
-                                encrypted_data = cipher_suite.encrypt_data(ping_cmd)
-                                connection['socket'].send(encrypted_data)
-
-                                # Wait for response
-                                encrypted_response = connection['socket'].recv(1024)
-                                if encrypted_response:
+                                ping_cmd = {'type': 'ping', 'data': {}}
+
+                                # Short timeout for health check
+                                response = self.exchange(connection, ping_cmd, 2.0)
+                                if response:
                                     # If we got any response, mark as active
                                     connection['connection_active'] = True
                                     connection['last_health_check'] = time.time()
@@ -0,0 +1,56 @@
+"""
+Delta decoding for NC Client monitoring responses.
+Keeps the last snapshot of a monitoring stream and merges deltas from the agent into it.
+"""
+
+import copy
+
+
+def apply_delta(snapshot, delta):
+    """Apply set and unset key paths to a snapshot in place"""
+    for path, value in delta.get('set', []):
+        target = snapshot
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = value
+
+    for path in delta.get('unset', []):
+        target = snapshot
+        for key in path[:-1]:
+            target = target.get(key, {})
+        target.pop(path[-1], None)
+
+    return snapshot
+
+
+class DeltaStream:
+    """Client side of one delta-encoded monitoring stream"""
+
+    def __init__(self):
+        self.seq = None
+        self.snapshot = None
+
+    def request_data(self):
+        """Request data asking for changes since the snapshot we hold"""
+        return {'delta': True, 'since_seq': self.seq}
+
+    def update(self, data):
+        """Merge a delta response and return a copy of the full snapshot"""
+        if 'full' in data:
+            self.snapshot = data['full']
+        elif self.snapshot is not None and data.get('base_seq') == self.seq:
+            apply_delta(self.snapshot, data.get('delta', {}))
+        else:
+            # Delta against a snapshot we don't hold, start over on the next request
+            self.reset()
+            return None
+
+        self.seq = data.get('seq')
+
+        # The UI keeps references to what it displays, don't let later deltas mutate them
+        return copy.deepcopy(self.snapshot)
+
+    def reset(self):
+        """Forget the held snapshot"""
+        self.seq = None
+        self.snapshot = None
\ No newline at end of file
@@ -1,9 +1,37 @@
 import time
+import base64
+import bisect
 import logging
+import sys
 import threading
+from array import array
 import customtkinter as ctk
 import tkinter as tk
 
+from nc_client.monitoring.delta import DeltaStream
+
+
+# Seconds of history backfilled when a connection is first monitored
+HISTORY_BACKFILL_SECONDS = 3600
+
+# Seconds between hardware updates, pushed by the agent or polled
+MONITOR_INTERVAL = 2
+
+# Metrics drawn on the history chart and their line colours
+HISTORY_SERIES = (('cpu_percent', '#3b8ed0'), ('memory_percent', '#2fa572'))
+
+
+def decode_metrics_history(data):
+    """Decode a metrics_history response into lists per metric"""
+    history = {}
+    for name, typecode in data.get('fields', []):
+        column = array(typecode)
+        column.frombytes(base64.b64decode(data['columns'][name]))
+        if sys.byteorder == 'big':
+            column.byteswap()
+        history[name] = column.tolist()
+    return history
+
 
 class SystemMonitor:
     def __init__(self, parent_app):
@@ -14,11 +42,27 @@ class SystemMonitor:
         self.last_disk_usage = {}
         self.progress_bars = {}
 
+        # Metrics history per connection, backfilled from the agent's ring buffer. Live samples are
+        # stamped on the agent's clock so they continue the backfilled timeline without a jump.
+        self.metrics_history = {}
+        self.clock_offsets = {}
+
+        # Delta-encoded hardware snapshot per connection
+        self.hardware_streams = {}
+
+        # Hardware frames pushed by the agent for the active connection
+        self.push_streams = {}
+        self.subscribed_connection = None
+        self.push_unsupported = set()
+
     def initialize_monitoring(self):
         """Initialize monitoring threads safely"""
         if hasattr(self, 'monitoring_thread'):
             return  # Don't create multiple threads
 
+        # Route hardware frames pushed by agents to the displays
+        self.parent_app.connection_manager.register_push_handler('hardware', self.handle_hardware_push)
+
         # Start hardware monitoring thread
         self.monitoring_thread = threading.Thread(
             target=self.monitor_resources,
@@ -32,12 +76,15 @@ class SystemMonitor:
         logging.info("Starting resource monitoring")
         while getattr(self.parent_app, 'running', True):  # Safe attribute access
             try:
-                if self.parent_app.active_connection and self.monitoring_active:
+                # Pushed frames update the displays, poll only agents that can't push
+                pushing = self.update_subscription()
+
+                if self.parent_app.active_connection and self.monitoring_active and not pushing:
                     # Don't check for specific attributes, just call refresh
                     print("Refreshing monitoring...")
                     self.refresh_monitoring()
                 # Always sleep to prevent excessive CPU usage
-                time.sleep(2)  # Reduced update frequency
+                time.sleep(MONITOR_INTERVAL)  # Reduced update frequency
             except Exception as e:
                 logging.error(f"Monitor resources error: {str(e)}")
                 time.sleep(2)  # Wait before trying again
@@ -51,12 +98,31 @@ class SystemMonitor:
             return
 
         try:
+            connection_id = self.parent_app.active_connection
+
+            # Only ask for what changed since the snapshot we already hold
+            stream = self.hardware_streams.setdefault(connection_id, DeltaStream())
+
+            commands = [
+                {'type': 'hardware_monitor', 'data': stream.request_data()},
+                {'type': 'system_info', 'data': {}}
+            ]
+
+            # Fill in the history we missed in the same request instead of polling it back together
+            if connection_id not in self.metrics_history:
+                commands.append({'type': 'metrics_history', 'data': {'seconds': HISTORY_BACKFILL_SECONDS}})
+
             # FIX: Access connection_manager through parent_app
-            response = self.parent_app.connection_manager.send_command(
-                self.parent_app.active_connection,
-                'hardware_monitor',
-                {}
-            )
+            # The whole refresh costs one round trip
+            responses = self.parent_app.connection_manager.send_batch(connection_id, commands)
+            response, system_info_response = responses[0], responses[1]
+
+            if len(responses) > 2:
+                self.store_history(connection_id, responses[2])
+
+            connection = self.parent_app.connection_manager.connections.get(connection_id)
+            if connection and system_info_response and system_info_response.get('status') == 'success':
+                connection['system_info'] = system_info_response['data']
 
             # Print for debugging
             print(f"Refresh monitoring response: {response}")
@@ -80,15 +146,167 @@ class SystemMonitor:
                 print("Invalid data format from server")
                 return
 
+            # Merge delta replies into the held snapshot, older agents always send the full snapshot
+            if 'seq' in data:
+                data = stream.update(data)
+                if data is None:
+                    return
+
             # Print for debugging
             print(f"Hardware data: {data}")
 
             # Update hardware info with validation
+            self.add_history_sample(connection_id, data)
             self.update_hardware_info(data)
 
         except Exception as e:
             print(f"Refresh monitoring error: {str(e)}")
 
+    def update_subscription(self):
+        """Keep the hardware push subscription on the monitored connection, returns True if pushing"""
+        connection_manager = self.parent_app.connection_manager
+        target = self.parent_app.active_connection if self.monitoring_active else None
+
+        if target != self.subscribed_connection:
+            if self.subscribed_connection:
+                connection_manager.unsubscribe(self.subscribed_connection, 'hardware')
+                self.subscribed_connection = None
+
+            if target and target not in self.push_unsupported:
+                if target not in self.metrics_history:
+                    self.backfill_history(target)
+
+                # Each subscription starts a new delta chain with a full snapshot
+                self.push_streams[target] = DeltaStream()
+                if connection_manager.subscribe(target, 'hardware', MONITOR_INTERVAL, delta=True):
+                    self.subscribed_connection = target
+                else:
+                    self.push_unsupported.add(target)
+
+        connection = connection_manager.connections.get(target)
+        return bool(target and target == self.subscribed_connection and connection and
+                    'hardware' in connection.get('subscriptions', {}))
+
+    def handle_hardware_push(self, connection_id, data):
+        """Merge a pushed hardware frame and update the displays"""
+        if not isinstance(data, dict):
+            return
+
+        if 'seq' in data:
+            stream = self.push_streams.setdefault(connection_id, DeltaStream())
+            data = stream.update(data)
+            if data is None:
+                # Lost track of the delta chain, subscribe again for a full snapshot
+                self.subscribed_connection = None
+                return
+
+        # A pushed frame counts as successful communication, the same as a polled reply
+        connection = self.parent_app.connection_manager.connections.get(connection_id)
+        if connection:
+            connection['last_health_check'] = time.time()
+            if not connection.get('connection_active'):
+                connection['connection_active'] = True
+                self.parent_app.after(0, lambda: self.parent_app.connection_tab.computer_list.set(
+                    connection_id, "status", "Connected"
+                ))
+
+        if connection_id != self.parent_app.active_connection:
+            return
+
+        self.add_history_sample(connection_id, data)
+        self.parent_app.after(0, lambda snapshot=data: self.update_hardware_info(snapshot))
+
+    def backfill_history(self, connection_id, seconds=HISTORY_BACKFILL_SECONDS):
+        """Load recent metrics history for a connection from the agent"""
+        response = self.parent_app.connection_manager.send_command(
+            connection_id,
+            'metrics_history',
+            {'seconds': seconds}
+        )
+        self.store_history(connection_id, response)
+
+    def store_history(self, connection_id, response):
+        """Keep the history from a metrics_history response"""
+        self.clock_offsets[connection_id] = 0.0
+        if not response or response.get('status') != 'success':
+            # Older agents don't keep history, start from live samples
+            self.metrics_history[connection_id] = {'timestamp': [], 'cpu_percent': [], 'memory_percent': []}
+            return
+
+        history = decode_metrics_history(response['data'])
+        self.metrics_history[connection_id] = history
+        if history.get('timestamp'):
+            self.clock_offsets[connection_id] = history['timestamp'][-1] - time.time()
+        logging.info(f"Backfilled {response['data'].get('count', 0)} history samples for {connection_id}")
+
+        # The chart starts out with the backfilled hour instead of an empty plot
+        self.draw_history(connection_id)
+
+    def add_history_sample(self, connection_id, data):
+        """Stamp a live hardware sample now and add it to the history on the Tk thread,
+        the only thread that reads the history columns"""
+        timestamp = time.time() + self.clock_offsets.get(connection_id, 0.0)
+        self.parent_app.after(0, lambda: self.record_history_sample(connection_id, data, timestamp))
+
+    def record_history_sample(self, connection_id, data, timestamp):
+        """Append a live hardware sample to the connection's history and redraw the chart"""
+        history = self.metrics_history.get(connection_id)
+        if history is None:
+            return
+
+        values = {
+            'timestamp': timestamp,
+            'cpu_percent': data.get('cpu_percent') or 0.0,
+            'memory_percent': (data.get('memory_usage') or {}).get('percent') or 0.0
+        }
+
+        for name, column in history.items():
+            # Metrics the live sample doesn't carry repeat their last value so columns stay aligned
+            column.append(values.get(name, column[-1] if column else 0.0))
+
+        # Keep the backfill window of time, live samples come less often than the agent samples
+        expired = bisect.bisect_left(history['timestamp'], timestamp - HISTORY_BACKFILL_SECONDS)
+        for column in history.values():
+            del column[:expired]
+
+        self._draw_history_chart(connection_id)
+
+    def draw_history(self, connection_id):
+        """Redraw the CPU and memory history chart on the Tk thread"""
+        self.parent_app.after(0, lambda: self._draw_history_chart(connection_id))
+
+    def _draw_history_chart(self, connection_id):
+        """Plot the last hour of CPU and memory usage of the active connection"""
+        canvas = getattr(getattr(self.parent_app, 'monitoring_tab', None), 'history_canvas', None)
+        if canvas is None or not canvas.winfo_exists():
+            return
+
+        canvas.delete('history')
+        history = self.metrics_history.get(connection_id)
+        if not self.monitoring_active or not history or connection_id != self.parent_app.active_connection:
+            return
+
+        timestamps = history.get('timestamp') or []
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        if len(timestamps) < 2 or width < 2 or height < 2:
+            return
+
+        # The window ends at the newest sample, thinned to about one point per pixel column
+        start = timestamps[-1] - HISTORY_BACKFILL_SECONDS
+        step = max(1, len(timestamps) // width)
+        indexes = range(len(timestamps) - 1, -1, -step)
+        for name, colour in HISTORY_SERIES:
+            column = history.get(name)
+            if not column:
+                continue
+
+            points = []
+            for index in reversed(indexes):
+                points += ((timestamps[index] - start) / HISTORY_BACKFILL_SECONDS * width,
+                           height - min(column[index], 100.0) / 100.0 * height)
+            if len(points) >= 4:
+                canvas.create_line(*points, fill=colour, width=2, tags='history')
+
     def update_hardware_info(self, data):
         """Update hardware monitoring displays with widget validation and value preservation"""
         if not self.monitoring_active:
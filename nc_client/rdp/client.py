@@ -4,11 +4,16 @@ import logging
 import sys
 import tkinter as tk
 import time
-import struct
+import zlib
 from PIL import Image, ImageTk
 import cv2
 import numpy as np
 
+from nc_client.rdp.transport import (RDPChannel, RDP_CIPHERS, MSG_TILES, MSG_MIXED_TILES, MSG_CURSOR,
+                                     MSG_CURSOR_SHAPE, CURSOR_BODY, CURSOR_SHAPE_HEADER, FRAME_INFO)
+from nc_client.rdp.tiles import apply_tiles, apply_mixed_tiles
+from nc_client.rdp.telemetry import FrameTelemetry
+
 
 class RDPClient:
     def __init__(self, parent_app):
@@ -17,6 +22,7 @@ class RDPClient:
         # RDP session state
         self.rdp_active = False
         self.rdp_socket = None
+        self.rdp_channel = None
         self.rdp_display_thread = None
         self.rdp_connection = None
         self.rdp_tab_active = False
@@ -29,9 +35,38 @@ class RDPClient:
         self.scale_factor = 1.0
         self.image_id = None
 
-        # Mouse movement throttling
-        self.last_move_time = 0
+        # Canvas size last sent to the agent, which scales frames down to it
+        self.viewport = None
+
+        # Decoded frame handed from the display thread to the Tk thread, as RGBA the PIL image
+        # shares its memory, and the Tk image it is pasted into
+        self.display_lock = threading.Lock()
+        self.display_buffer = None
+        self.display_image = None
+        self.photo_image = None
+        self.blit_scheduled = False
+
+        # Per-frame histograms of this session, and the newest decoded frame waiting to be shown as
+        # (sequence, agent capture time, decode time, receive time). With telemetry the agent numbers
+        # and timestamps frames and the console acknowledges each one it puts on screen.
+        self.telemetry = False
+        self.frame_telemetry = FrameTelemetry()
+        self.frame_info = None
+
+        # Pointer drawn on the canvas from the agent's cursor messages, in server coordinates
+        self.cursor_position = None
+        self.cursor_image = None
+        self.cursor_hotspot = (0, 0)
+        self.cursor_photo = None
+        self.cursor_id = None
+        self.cursor_scheduled = False
+
+        # Pointer moves are coalesced to the latest position and sent once per tick,
+        # a click takes the pending move along in the same write
         self.move_throttle = 0.02  # 50 Hz maximum for mouse movement
+        self.MOUSE_MOVE = 204
+        self.pending_move = None
+        self.move_scheduled = False
 
         # UI references - these will be set when needed
         self.rdp_tab = None
@@ -58,12 +93,20 @@ class RDPClient:
             return
 
         try:
-            # Request RDP server start
+            # Request RDP server start, offering to encrypt the stream and accept dirty tiles,
+            # lossless text tiles, frames downscaled on a congested link, a separate pointer channel
+            # and numbered frames for latency telemetry
             response = self.parent_app.connection_manager.send_command(
-                self.parent_app.active_connection, 'start_rdp', {})
+                self.parent_app.active_connection, 'start_rdp',
+                {'ciphers': list(RDP_CIPHERS), 'encodings': ['tiles', 'lossless', 'scaling', 'cursor', 'telemetry']})
 
             if response and response.get('status') == 'success':
                 ip, port = response['data']['ip'], response['data']['port']
+                cipher_name = response['data'].get('cipher')
+
+                # Older agents send frames without the telemetry header
+                self.telemetry = bool(response['data'].get('telemetry'))
+                self.frame_telemetry = FrameTelemetry()
 
                 # Update UI status
                 self._update_connection_status("Connecting to remote desktop...", "#FFAA00")
@@ -74,9 +117,24 @@ class RDPClient:
                 self.rdp_socket.settimeout(5.0)
                 self.rdp_socket.connect((ip, port))
 
+                # Key the stream from this console's agent session
+                if cipher_name:
+                    connection = self.parent_app.connection_manager.connections[self.parent_app.active_connection]
+                    session_key = connection['cipher_suite'].encryption_key
+                    self.rdp_channel = RDPChannel.connect(self.rdp_socket, session_key, cipher_name)
+                else:
+                    logging.warning("Agent does not support RDP encryption, using an unencrypted stream")
+                    self.rdp_channel = RDPChannel(self.rdp_socket)
+
                 # Send platform info
                 platform_code = b'win' if sys.platform == "win32" else b'osx' if sys.platform == "darwin" else b'x11'
-                self.rdp_socket.sendall(platform_code)
+                self.rdp_channel.send_platform(platform_code)
+
+                # Have the agent scale frames to the canvas from the first one
+                self.viewport = None
+                canvas = self.rdp_tab.rdp_canvas
+                if canvas:
+                    self.update_viewport(canvas.winfo_width(), canvas.winfo_height())
 
                 # Hide the welcome message
                 self.rdp_tab.rdp_message.place_forget()
@@ -112,6 +170,21 @@ class RDPClient:
                 except:
                     pass
                 self.rdp_socket = None
+                self.rdp_channel = None
+
+            # Leave the session's numbers in the log, they're what tells a slow link from a slow console
+            self.log_frame_stats()
+
+            # Drop the display buffers, the next session may have another size
+            with self.display_lock:
+                self.frame_info = None
+                self.display_buffer = self.display_image = self.photo_image = None
+                self.image_id = None
+                self.cursor_position = self.cursor_image = self.cursor_photo = None
+                self.cursor_id = None
+
+            # A pointer move queued for this session has nowhere to go
+            self.pending_move = None
 
             # Clear display
             if hasattr(self.rdp_tab, 'rdp_canvas'):
@@ -141,19 +214,15 @@ class RDPClient:
             self.rdp_tab.rdp_button.configure(text="Start Remote Desktop", state="normal")
 
     def rdp_display_loop(self):
-        """Display loop for RDP with proper resolution handling and positioning"""
+        """Receive and decode frames off the Tk thread, the Tk thread only blits the newest one"""
         try:
-            last_image = None
+            # Console copy of the remote screen, tiles are patched into it in place
+            framebuffer = None
 
             # First, receive the server resolution information
             try:
-                resolution_header = self.receive_exact(9)
-                msg_type, width, height = struct.unpack(">BII", resolution_header)
-
-                if msg_type == 0:  # Resolution info message
-                    self.server_width = width
-                    self.server_height = height
-                    print(f"Received server resolution: {self.server_width}x{self.server_height}")
+                self.server_width, self.server_height = self.rdp_channel.receive_resolution()
+                print(f"Received server resolution: {self.server_width}x{self.server_height}")
             except Exception as e:
                 logging.error(f"Error receiving resolution: {str(e)}")
 
@@ -163,28 +232,62 @@ class RDPClient:
             self.scale_factor = 1.0
             self.image_id = None
 
-            # Track the last time we had a full redraw
-            last_full_redraw = time.time()
+            # Frames received so far, acknowledged once decoded so the agent can pace the stream
+            frame_count = 0
 
             while self.rdp_active:
                 try:
                     img_type, img_data = self.receive_rdp_frame()
 
-                    # Process image
-                    np_arr = np.frombuffer(img_data, dtype=np.uint8)
-                    img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-
-                    if img is None:
-                        print("Warning: Failed to decode image, skipping frame")
+                    # Pointer updates are drawn on the canvas, they aren't frames
+                    if img_type == MSG_CURSOR:
+                        self.move_cursor(*CURSOR_BODY.unpack(img_data))
+                        continue
+                    if img_type == MSG_CURSOR_SHAPE:
+                        self.set_cursor_shape(img_data)
                         continue
 
-                    if img_type == 0 and last_image is not None:  # Diff frame
-                        img = cv2.bitwise_xor(last_image, img)
-
-                    last_image = img.copy()
-
-                    # Display the frame
-                    self._display_frame(img, last_full_redraw)
+                    frame_count += 1
+                    received_at = time.perf_counter()
+
+                    # Strip the frame's number and capture time
+                    sequence = captured_at = 0
+                    if self.telemetry:
+                        sequence, captured_at = FRAME_INFO.unpack_from(img_data)
+                        img_data = memoryview(img_data)[FRAME_INFO.size:]
+                    self.frame_telemetry.record('frame_kb', len(img_data) / 1024)
+
+                    if img_type == MSG_TILES:
+                        # Patch the changed tiles onto the last full frame
+                        if framebuffer is None:
+                            continue
+                        rectangles = apply_tiles(framebuffer, img_data)
+                    elif img_type == MSG_MIXED_TILES:
+                        # Each tile in the codec that suits it, a keyframe may bring a new framebuffer
+                        framebuffer, rectangles = apply_mixed_tiles(framebuffer, img_data)
+                        if framebuffer is None:
+                            continue
+                    else:
+                        # Process image
+                        np_arr = np.frombuffer(img_data, dtype=np.uint8)
+                        img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+
+                        if img is None:
+                            print("Warning: Failed to decode image, skipping frame")
+                            continue
+
+                        if img_type == 0 and framebuffer is not None:  # Diff frame
+                            img = cv2.bitwise_xor(framebuffer, img)
+
+                        # The decoded frame becomes the framebuffer, no copy needed
+                        framebuffer = img
+                        rectangles = None
+
+                    # Hand the frame to the Tk thread
+                    decode_time = time.perf_counter() - received_at
+                    self.frame_telemetry.record('decode_ms', decode_time * 1000)
+                    self.present_frame(framebuffer, rectangles, (sequence, captured_at, decode_time, received_at))
+                    self.rdp_channel.send_ack(frame_count)
 
                 except socket.timeout:
                     # Timeout is expected, just continue
@@ -203,114 +306,184 @@ class RDPClient:
             # Clean up on exit
             self.parent_app.after(0, self.stop_rdp)
 
-    def _display_frame(self, img, last_full_redraw):
-        """Display a single frame on the canvas"""
-        # Convert to PIL format
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        pil_img = Image.fromarray(img_rgb)
-
-        # Update canvas if it exists
-        canvas = self.rdp_tab.rdp_canvas
-        if not canvas:
-            return
-
-        # Get canvas dimensions (with check for initialization)
-        canvas_width = canvas.winfo_width() or 800
-        canvas_height = canvas.winfo_height() or 600
-
-        # Original image dimensions
-        img_width, img_height = pil_img.size
+    def present_frame(self, framebuffer, rectangles=None, frame_info=None):
+        """Convert the changed part of the frame into the display buffer and schedule a blit.
+        Frames that arrive before the Tk thread gets to them are coalesced into one blit."""
+        with self.display_lock:
+            self.frame_info = frame_info
+            if self.display_buffer is None or self.display_buffer.shape[:2] != framebuffer.shape[:2]:
+                # New frame size, the display buffer and the PIL view of it are rebuilt
+                height, width = framebuffer.shape[:2]
+                self.display_buffer = np.empty((height, width, 4), dtype=np.uint8)
+                self.display_image = Image.frombuffer('RGBA', (width, height), self.display_buffer, 'raw', 'RGBA', 0, 1)
+                rectangles = None
+
+            if rectangles is None:
+                cv2.cvtColor(framebuffer, cv2.COLOR_BGR2RGBA, dst=self.display_buffer)
+            else:
+                for x, y, w, h in rectangles:
+                    cv2.cvtColor(framebuffer[y:y + h, x:x + w], cv2.COLOR_BGR2RGBA,
+                                 dst=self.display_buffer[y:y + h, x:x + w])
+
+            if self.blit_scheduled:
+                return
+            self.blit_scheduled = True
+
+        self.parent_app.after(0, self._display_frame)
+
+    def _display_frame(self):
+        """Blit the newest decoded frame onto the canvas, runs on the Tk thread"""
+        with self.display_lock:
+            self.blit_scheduled = False
+            image = self.display_image
+            frame_info, self.frame_info = self.frame_info, None
+
+            # Update canvas if it exists
+            canvas = self.rdp_tab.rdp_canvas
+            if not canvas or image is None or not self.rdp_active:
+                return
+
+            # Get canvas dimensions (with check for initialization)
+            canvas_width = canvas.winfo_width() or 800
+            canvas_height = canvas.winfo_height() or 600
+            self.update_viewport(canvas_width, canvas_height)
+
+            # Frames may arrive downscaled, show them at the server's resolution
+            img_width, img_height = image.size
+            screen_width = self.server_width or img_width
+            screen_height = self.server_height or img_height
+            new_width, new_height = screen_width, screen_height
+
+            # Only shrink if needed and if canvas dimensions are valid
+            if (canvas_width > 10 and canvas_height > 10 and
+                    (screen_width > canvas_width or screen_height > canvas_height)):
+
+                # Calculate scales with preserved aspect ratio
+                width_scale = canvas_width / screen_width
+                height_scale = canvas_height / screen_height
+                scale = min(width_scale, height_scale)
+
+                # New dimensions
+                new_width = int(screen_width * scale)
+                new_height = int(screen_height * scale)
+
+            # Update scale factor for coordinate mapping, from display to server
+            self.scale_factor = screen_width / new_width
+
+            # Resize only until the agent has caught up with the canvas size
+            if (new_width, new_height) != (img_width, img_height):
+                image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+            # Reuse the Tk image while the size holds, pasting copies the pixels into it
+            if self.photo_image is not None and (self.photo_image.width(), self.photo_image.height()) == image.size:
+                self.photo_image.paste(image)
+            else:
+                self.photo_image = ImageTk.PhotoImage(image=image)
 
-        # Only resize if needed and if canvas dimensions are valid
-        if (canvas_width > 10 and canvas_height > 10 and
-                (img_width > canvas_width or img_height > canvas_height)):
+        # Calculate position to center the image
+        self.image_x = max(0, (canvas_width - new_width) // 2)
+        self.image_y = max(0, (canvas_height - new_height) // 2)
 
-            # Calculate scales with preserved aspect ratio
-            width_scale = canvas_width / img_width
-            height_scale = canvas_height / img_height
-            scale = min(width_scale, height_scale)
+        # Update the existing image item, or create one if there is none
+        if self.image_id and canvas.type(self.image_id) == "image":
+            canvas.itemconfig(self.image_id, image=self.photo_image)
+            canvas.coords(self.image_id, self.image_x, self.image_y)
+        else:
+            canvas.delete("all")
+            self.image_id = canvas.create_image(
+                self.image_x, self.image_y,
+                anchor=tk.NW,
+                image=self.photo_image
+            )
+            self.cursor_id = None
 
-            # New dimensions
-            new_width = int(img_width * scale)
-            new_height = int(img_height * scale)
+        # Keep reference to prevent garbage collection
+        canvas.photo = self.photo_image
 
-            # Update scale factor for coordinate mapping
-            self.scale_factor = img_width / new_width  # From display to server
+        # The image may have moved or been recreated, put the pointer back on top of it
+        self._draw_cursor()
 
-            # Resize image
-            pil_img = pil_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        else:
-            # Direct 1:1 mapping
-            self.scale_factor = 1.0
+        if frame_info is not None:
+            self.acknowledge_display(*frame_info)
 
-        # Calculate position to center the image
-        self.image_x = max(0, (canvas_width - pil_img.width) // 2)
-        self.image_y = max(0, (canvas_height - pil_img.height) // 2)
+    def acknowledge_display(self, sequence, captured_at, decode_time, received_at):
+        """Record how long the newest frame took to reach the screen and report it to the agent"""
+        display_delay = time.perf_counter() - received_at
+        self.frame_telemetry.record('receive_to_display_ms', display_delay * 1000)
+        if not self.telemetry or not self.rdp_channel:
+            return
 
-        # Convert to PhotoImage
-        photo_img = ImageTk.PhotoImage(image=pil_img)
+        try:
+            self.rdp_channel.send_frame_ack(sequence, captured_at, int(decode_time * 1e6), int(display_delay * 1e6))
+        except Exception as e:
+            logging.error(f"Error sending frame ack: {e}")
 
-        # Current time for redraw decision
-        current_time = time.time()
+    def get_stats(self):
+        """Histograms of this session's frames as seen by the console"""
+        return self.frame_telemetry.stats()
 
-        # Clear and redraw everything periodically (every 2 seconds)
-        # to prevent artifacts from building up
-        if current_time - last_full_redraw > 2.0:
-            canvas.delete("all")
-            self.image_id = canvas.create_image(
-                self.image_x, self.image_y,
-                anchor=tk.NW,
-                image=photo_img
-            )
-            last_full_redraw = current_time
+    def log_frame_stats(self):
+        """Log a one-line summary of the session's frames"""
+        stats = self.get_stats()
+        if not stats['decode_ms']['count']:
+            return
+        logging.info(f"RDP session: {stats['decode_ms']['count']} frames, "
+                     f"{stats['frame_kb']['mean']} KB/frame, decode p95 {stats['decode_ms']['p95']} ms, "
+                     f"receive to display p95 {stats['receive_to_display_ms']['p95']} ms")
+
+    def move_cursor(self, x, y):
+        """Record the pointer position and schedule a redraw, moves between redraws are coalesced"""
+        with self.display_lock:
+            self.cursor_position = (x, y)
+            if self.cursor_scheduled:
+                return
+            self.cursor_scheduled = True
+
+        self.parent_app.after(0, self._draw_cursor)
+
+    def set_cursor_shape(self, body):
+        """Decode a pointer image from the agent, the Tk image is built when it is next drawn"""
+        width, height, hot_x, hot_y = CURSOR_SHAPE_HEADER.unpack_from(body)
+        pixels = zlib.decompress(body[CURSOR_SHAPE_HEADER.size:])
+        with self.display_lock:
+            self.cursor_image = Image.frombytes('RGBA', (width, height), pixels)
+            self.cursor_hotspot = (hot_x, hot_y)
+            self.cursor_photo = None
+
+    def _draw_cursor(self):
+        """Move the pointer item to the latest position, runs on the Tk thread"""
+        with self.display_lock:
+            self.cursor_scheduled = False
+            position = self.cursor_position
+
+            canvas = self.rdp_tab.rdp_canvas
+            if not canvas or position is None or self.cursor_image is None or not self.rdp_active:
+                return
+            if self.cursor_photo is None:
+                self.cursor_photo = ImageTk.PhotoImage(image=self.cursor_image)
+
+        # Server coordinates to canvas coordinates, the inverse of the input mapping
+        x = self.image_x + position[0] / self.scale_factor - self.cursor_hotspot[0]
+        y = self.image_y + position[1] / self.scale_factor - self.cursor_hotspot[1]
+
+        if self.cursor_id and canvas.type(self.cursor_id) == "image":
+            canvas.itemconfig(self.cursor_id, image=self.cursor_photo)
+            canvas.coords(self.cursor_id, x, y)
+            canvas.tag_raise(self.cursor_id)
         else:
-            # If we have an existing image, just update its image
-            if self.image_id and canvas.type(self.image_id) == "image":
-                canvas.itemconfig(self.image_id, image=photo_img)
-            else:
-                # If no existing image or it's not valid, create a new one
-                canvas.delete("all")
-                self.image_id = canvas.create_image(
-                    self.image_x, self.image_y,
-                    anchor=tk.NW,
-                    image=photo_img
-                )
+            self.cursor_id = canvas.create_image(x, y, anchor=tk.NW, image=self.cursor_photo)
 
-        # Keep reference to prevent garbage collection
-        canvas.photo = photo_img
+    def update_viewport(self, canvas_width, canvas_height):
+        """Send the canvas size to the agent when it changed, frames then arrive at the size they're shown"""
+        if canvas_width <= 10 or canvas_height <= 10 or (canvas_width, canvas_height) == self.viewport:
+            return
+        self.viewport = (canvas_width, canvas_height)
+        self.rdp_channel.send_viewport(canvas_width, canvas_height)
 
     def receive_rdp_frame(self):
         """Receive a frame from the RDP server"""
-        # Get header
-        header = self.receive_exact(5)
-        img_type, length = struct.unpack(">BI", header)
-
-        # Get image data
-        img_data = b''
-        buffer_size = 10240
-        while length > 0:
-            chunk_size = min(buffer_size, length)
-            chunk = self.receive_exact(chunk_size)
-            img_data += chunk
-            length -= len(chunk)
-
-        return img_type, img_data
-
-    def receive_exact(self, size):
-        """Receive exact number of bytes"""
-        data = b''
-        while len(data) < size and self.rdp_active:
-            try:
-                chunk = self.rdp_socket.recv(size - len(data))
-                if not chunk:
-                    raise ConnectionError("Connection lost")
-                data += chunk
-            except socket.timeout:
-                continue
-            except Exception as e:
-                logging.error(f"Error receiving data: {str(e)}")
-                raise
-        return data
+        # Frames land in the channel's reusable buffer, no per-chunk copies
+        return self.rdp_channel.receive_frame()
 
     def setup_rdp_input_handlers(self):
         """Set up input handlers for RDP with built-in cursor position correction"""
@@ -321,7 +494,6 @@ class RDPClient:
         # Mouse constants
         MOUSE_LEFT = 201
         MOUSE_RIGHT = 203
-        MOUSE_MOVE = 204
 
         # Function to map canvas coordinates to server coordinates with built-in correction
         def map_to_server_coordinates(event):
@@ -363,13 +535,11 @@ class RDPClient:
                 print(f"Mouse event error: {e}")
 
         def motion_handler(event):
-            """Handle mouse motion with throttling"""
-            current_time = time.time()
-            elapsed = current_time - self.last_move_time
-
-            if elapsed >= self.move_throttle:
-                self.last_move_time = current_time
-                mouse_event_handler(MOUSE_MOVE, 0, event)
+            """Handle mouse motion, only the latest position in each tick is sent"""
+            try:
+                self.queue_mouse_move(*map_to_server_coordinates(event))
+            except Exception as e:
+                print(f"Mouse event error: {e}")
 
         # Bind mouse events
         canvas.bind("<Button-1>", lambda e: mouse_event_handler(MOUSE_LEFT, 100, e))
@@ -397,20 +567,46 @@ class RDPClient:
         # Set focus to canvas
         canvas.focus_set()
 
+    def queue_mouse_move(self, x, y):
+        """Remember the pointer position and send it at the end of the tick, replacing older moves"""
+        self.pending_move = (x, y)
+        if not self.move_scheduled:
+            self.move_scheduled = True
+            self.parent_app.after(int(self.move_throttle * 1000), self.flush_mouse_move)
+
+    def take_pending_move(self):
+        """The queued pointer move as a list of input events, empty if there is none"""
+        if self.pending_move is None:
+            return []
+        x, y = self.pending_move
+        self.pending_move = None
+        return [(self.MOUSE_MOVE, 0, x, y)]
+
+    def flush_mouse_move(self):
+        """Send the latest pointer position of the tick, runs on the Tk thread"""
+        self.move_scheduled = False
+        events = self.take_pending_move()
+        if events:
+            self.send_rdp_events(events, "mouse event")
+
     def send_rdp_mouse_event(self, button, action, x, y):
-        """Send mouse event to RDP server"""
-        if not self.rdp_active or not self.rdp_socket:
+        """Send mouse event to RDP server, after the pointer move it may be waiting on"""
+        self.send_rdp_events(self.take_pending_move() + [(button, action, x, y)], "mouse event")
+
+    def send_rdp_events(self, events, kind):
+        """Send a batch of input events to RDP server in one write"""
+        if not self.rdp_active or not self.rdp_channel:
             return
 
         try:
-            self.rdp_socket.sendall(struct.pack('>BBHH', button, action, x, y))
+            self.rdp_channel.send_inputs(events)
         except Exception as e:
-            logging.error(f"Error sending mouse event: {str(e)}")
+            logging.error(f"Error sending {kind}: {str(e)}")
             self.stop_rdp()
 
     def send_rdp_key_event(self, key, action):
         """Send keyboard event to RDP server - simplified implementation"""
-        if not self.rdp_active or not self.rdp_socket:
+        if not self.rdp_active or not self.rdp_channel:
             return
 
         try:
@@ -431,9 +627,10 @@ class RDPClient:
             # Get scan code
             scan_code = key_map.get(key_lower, key_map.get(key, 0))
 
-            # Send key event
+            # Send key event, after the pointer move it may be waiting on
             if scan_code > 0:
-                self.rdp_socket.sendall(struct.pack('>BBHH', scan_code, action, 0, 0))
+                self.flush_mouse_move()
+                self.rdp_channel.send_input(scan_code, action, 0, 0)
         except Exception as e:
             logging.error(f"Error sending key event: {str(e)}")
 
@@ -0,0 +1,84 @@
+"""
+Frame telemetry for the NC Client RDP stream.
+Fixed-bucket histograms of per-frame display latency, decode time and frame size,
+cheap enough to record every frame and small enough to log when the session ends.
+Capture-to-display latency needs the agent's clock, the agent keeps that one from the acks.
+"""
+
+import bisect
+import threading
+
+# Bucket upper bounds, anything above the last one lands in an overflow bucket
+MILLISECOND_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+KILOBYTE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+# Histograms kept for every stream and the buckets they use
+FRAME_HISTOGRAMS = {
+    'receive_to_display_ms': MILLISECOND_BUCKETS,
+    'decode_ms': MILLISECOND_BUCKETS,
+    'frame_kb': KILOBYTE_BUCKETS
+}
+
+
+class Histogram:
+    """Counts of recorded values per bucket, with the exact mean and maximum"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, value):
+        """Count one value"""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of values, never above the recorded maximum"""
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(self.bounds[index], self.maximum) if index < len(self.bounds) else self.maximum
+        return 0.0
+
+    def summary(self):
+        """Count, mean, percentiles and the non-empty buckets"""
+        buckets = {}
+        for index, count in enumerate(self.counts):
+            if count:
+                label = f"<={self.bounds[index]}" if index < len(self.bounds) else f">{self.bounds[-1]}"
+                buckets[label] = count
+
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 2) if self.count else 0.0,
+            'p50': round(self.percentile(0.5), 2),
+            'p95': round(self.percentile(0.95), 2),
+            'p99': round(self.percentile(0.99), 2),
+            'max': round(self.maximum, 2),
+            'buckets': buckets
+        }
+
+
+class FrameTelemetry:
+    """The per-frame histograms of one RDP stream, safe to record from several threads"""
+
+    def __init__(self, histograms=FRAME_HISTOGRAMS):
+        self.histograms = {name: Histogram(bounds) for name, bounds in histograms.items()}
+        self.lock = threading.Lock()
+
+    def record(self, name, value):
+        """Count one value in the named histogram"""
+        with self.lock:
+            self.histograms[name].record(value)
+
+    def stats(self):
+        """Summaries of every histogram by name"""
+        with self.lock:
+            return {name: histogram.summary() for name, histogram in self.histograms.items()}
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""
+Dirty tile decoder for the NC Client RDP stream.
+Patches the tiles the agent sends onto the console's copy of the remote screen.
+"""
+
+import logging
+import struct
+import zlib
+
+import cv2
+import numpy as np
+
+# Tiles message: tile count, then per tile its rectangle and encoded length followed by the data
+TILE_COUNT = struct.Struct('>H')
+TILE_HEADER = struct.Struct('>HHHHI')
+
+# Mixed tiles message: frame size and keyframe flag, tile count, then per tile its rectangle,
+# codec and encoded length followed by the data. A keyframe covers the whole frame.
+MIXED_HEADER = struct.Struct('>HHB')
+MIXED_TILE_HEADER = struct.Struct('>HHHHBI')
+
+# Per-tile codecs
+TILE_JPEG = 0
+TILE_LOSSLESS = 1
+TILE_FILL = 2
+
+
+def apply_tiles(framebuffer, body):
+    """Decode a tiles message onto the framebuffer in place, returns the patched rectangles"""
+    body = memoryview(body)
+    count, = TILE_COUNT.unpack_from(body)
+    offset = TILE_COUNT.size
+
+    rectangles = []
+    for _ in range(count):
+        x, y, w, h, length = TILE_HEADER.unpack_from(body, offset)
+        offset += TILE_HEADER.size
+
+        tile = cv2.imdecode(np.frombuffer(body[offset:offset + length], dtype=np.uint8), cv2.IMREAD_COLOR)
+        offset += length
+
+        if tile is None or tile.shape[:2] != (h, w):
+            logging.warning(f"Skipping undecodable tile at {x},{y}")
+            continue
+
+        framebuffer[y:y + h, x:x + w] = tile
+        rectangles.append((x, y, w, h))
+    return rectangles
+
+
+def apply_mixed_tiles(framebuffer, body):
+    """Decode a mixed tiles message onto the framebuffer in place. Returns the framebuffer, a new
+    one if a keyframe changed the frame size, and the patched rectangles, None for a keyframe."""
+    body = memoryview(body)
+    width, height, keyframe = MIXED_HEADER.unpack_from(body)
+    offset = MIXED_HEADER.size
+
+    if keyframe:
+        if framebuffer is None or framebuffer.shape != (height, width, 3):
+            framebuffer = np.empty((height, width, 3), dtype=np.uint8)
+    elif framebuffer is None or framebuffer.shape[:2] != (height, width):
+        # Tiles for a frame we don't have, wait for the next keyframe
+        return framebuffer, []
+
+    count, = TILE_COUNT.unpack_from(body, offset)
+    offset += TILE_COUNT.size
+
+    rectangles = []
+    for _ in range(count):
+        x, y, w, h, codec, length = MIXED_TILE_HEADER.unpack_from(body, offset)
+        offset += MIXED_TILE_HEADER.size
+        data = body[offset:offset + length]
+        offset += length
+
+        if codec == TILE_FILL:
+            framebuffer[y:y + h, x:x + w] = np.frombuffer(data, dtype=np.uint8)
+        elif codec == TILE_LOSSLESS:
+            framebuffer[y:y + h, x:x + w] = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(h, w, 3)
+        else:
+            tile = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if tile is None or tile.shape[:2] != (h, w):
+                logging.warning(f"Skipping undecodable tile at {x},{y}")
+                continue
+            framebuffer[y:y + h, x:x + w] = tile
+        rectangles.append((x, y, w, h))
+    return framebuffer, None if keyframe else rectangles
\ No newline at end of file
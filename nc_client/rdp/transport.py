@@ -0,0 +1,248 @@
+"""
+RDP stream transport for the NC Client.
+Frames the remote desktop stream and, when the agent supports it, seals every
+message with an AEAD cipher keyed from the agent session key.
+"""
+
+import os
+import socket
+import struct
+import threading
+import time
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# Supported stream ciphers in order of preference
+RDP_CIPHERS = {
+    'aes-256-gcm': AESGCM,
+    'chacha20-poly1305': ChaCha20Poly1305
+}
+
+# Message types
+MSG_RESOLUTION = 0
+MSG_FRAME = 1
+MSG_PLATFORM = 2
+MSG_INPUT = 3
+MSG_TILES = 4
+MSG_ACK = 5
+MSG_VIEWPORT = 6
+MSG_MIXED_TILES = 7
+MSG_CURSOR = 8
+MSG_CURSOR_SHAPE = 9
+MSG_FRAME_ACK = 10
+
+# Message header: type and body length, authenticated as associated data
+MSG_HEADER = struct.Struct('>BI')
+RESOLUTION_BODY = struct.Struct('>II')
+INPUT_BODY = struct.Struct('>BBHH')
+ACK_BODY = struct.Struct('>I')
+CURSOR_BODY = struct.Struct('>HH')
+
+# Cursor shape: size and hotspot followed by the deflated RGBA pixels
+CURSOR_SHAPE_HEADER = struct.Struct('>HHHH')
+
+# With telemetry every frame body starts with its sequence number and the agent's capture time
+# in microseconds, the console echoes both back once the frame is on screen along with its
+# decode time and the time from receiving the frame to displaying it, also in microseconds
+FRAME_INFO = struct.Struct('>IQ')
+FRAME_ACK_BODY = struct.Struct('>IQII')
+
+# Legacy resolution message: type, width, height
+LEGACY_RESOLUTION = struct.Struct('>BII')
+
+# Upper bound on a message from the agent, far above any encoded frame. Checked before the body
+# is read, the length arrives before anything is authenticated.
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+# Seconds a started message may go without receiving a byte before the connection is dropped
+MAX_STALL = 30.0
+
+# Random bytes each side contributes to the per-connection keys
+HANDSHAKE_NONCE_SIZE = 16
+TAG_SIZE = 16
+
+
+def derive_rdp_keys(session_key, server_nonce, client_nonce):
+    """Derive the per-connection client-to-server and server-to-client keys"""
+    keys = []
+    for direction in (b'client to server', b'server to client'):
+        hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=server_nonce + client_nonce,
+                    info=b'nc rdp stream ' + direction)
+        keys.append(hkdf.derive(session_key))
+    return keys
+
+
+def send_buffers(sock, buffers):
+    """Send several buffers in one syscall where the platform allows it, without joining them"""
+    if not hasattr(sock, 'sendmsg'):
+        # Windows has no sendmsg
+        for buffer in buffers:
+            sock.sendall(buffer)
+        return
+
+    views = [memoryview(buffer).cast('B') for buffer in buffers]
+    while views:
+        sent = sock.sendmsg(views)
+
+        # Drop what went out and retry the rest after a partial write
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if views and sent:
+            views[0] = views[0][sent:]
+
+
+class RDPChannel:
+    """One remote desktop connection, plaintext for older agents or AEAD sealed"""
+
+    def __init__(self, sock, cipher_name=None, send_key=None, receive_key=None):
+        self.sock = sock
+        self.secure = cipher_name is not None
+
+        if self.secure:
+            self.send_cipher = RDP_CIPHERS[cipher_name](send_key)
+            self.receive_cipher = RDP_CIPHERS[cipher_name](receive_key)
+
+        # Each direction has one sender, so sequence numbers stay implicit
+        self.send_seq = 0
+        self.receive_seq = 0
+        self.send_lock = threading.Lock()
+
+        # Reused for every incoming message so frames aren't rebuilt chunk by chunk
+        self.receive_buffer = bytearray(64 * 1024)
+
+    @classmethod
+    def connect(cls, sock, session_key, cipher_name):
+        """Agree on per-connection keys with the agent we just connected to"""
+        server_nonce = bytes(cls(sock).receive_exact(HANDSHAKE_NONCE_SIZE))
+        client_nonce = os.urandom(HANDSHAKE_NONCE_SIZE)
+        sock.sendall(client_nonce)
+
+        client_key, server_key = derive_rdp_keys(session_key, server_nonce, client_nonce)
+        return cls(sock, cipher_name, send_key=client_key, receive_key=server_key)
+
+    @staticmethod
+    def nonce(seq):
+        """96-bit nonce from a sequence number, keys are never shared between directions"""
+        return b'\x00\x00\x00\x00' + struct.pack('>Q', seq)
+
+    def send(self, msg_type, payload):
+        """Send one message, the header and body leave in a single write.
+        The payload may be a list of buffers, sent back to back as one body."""
+        self.send_batch([(msg_type, payload)])
+
+    def send_batch(self, messages):
+        """Send several (type, payload) messages in a single write, each sealed on its own"""
+        buffers = []
+        with self.send_lock:
+            for msg_type, payload in messages:
+                parts = payload if isinstance(payload, list) else [payload]
+                if not self.secure:
+                    length = sum(memoryview(part).nbytes for part in parts)
+                    buffers += [MSG_HEADER.pack(msg_type, length)] + parts
+                    continue
+
+                # The cipher needs one contiguous plaintext
+                plaintext = parts[0] if len(parts) == 1 else b''.join(parts)
+                header = MSG_HEADER.pack(msg_type, memoryview(plaintext).nbytes + TAG_SIZE)
+                sealed = self.send_cipher.encrypt(self.nonce(self.send_seq), plaintext, header)
+                self.send_seq += 1
+                buffers += [header, sealed]
+            send_buffers(self.sock, buffers)
+
+    def receive(self):
+        """Receive one message, returns (type, body) with the body valid until the next receive"""
+        header = bytes(self.receive_exact(MSG_HEADER.size))
+        msg_type, length = MSG_HEADER.unpack(header)
+        if length > MAX_MESSAGE_SIZE:
+            raise ConnectionError(f"RDP message of {length} bytes exceeds limit of {MAX_MESSAGE_SIZE} bytes")
+        body = self.receive_exact(length)
+
+        if not self.secure:
+            return msg_type, body
+
+        try:
+            plaintext = self.receive_cipher.decrypt(self.nonce(self.receive_seq), body, header)
+        except Exception:
+            raise ConnectionError("RDP message failed authentication")
+        self.receive_seq += 1
+        return msg_type, plaintext
+
+    def receive_exact(self, size):
+        """Read exactly size bytes into the reusable buffer and return a view of them"""
+        if len(self.receive_buffer) < size:
+            self.receive_buffer = bytearray(size)
+
+        view = memoryview(self.receive_buffer)[:size]
+        received = 0
+        stalled_since = None
+        while received < size:
+            try:
+                count = self.sock.recv_into(view[received:])
+            except socket.timeout:
+                # Only give up between messages, a half-read message would desync the stream,
+                # unless the agent has stopped sending altogether
+                if received == 0:
+                    raise
+                now = time.monotonic()
+                if stalled_since is None:
+                    stalled_since = now
+                elif now - stalled_since > MAX_STALL:
+                    raise ConnectionError(f"Agent stalled for over {MAX_STALL:.0f} seconds mid-message")
+                continue
+            if not count:
+                raise ConnectionError("Connection lost")
+            received += count
+            stalled_since = None
+        return view
+
+    def receive_resolution(self):
+        """Receive the agent's screen resolution as (width, height)"""
+        if not self.secure:
+            _, width, height = LEGACY_RESOLUTION.unpack(self.receive_exact(LEGACY_RESOLUTION.size))
+            return width, height
+
+        msg_type, body = self.receive()
+        if msg_type != MSG_RESOLUTION:
+            raise ConnectionError(f"Expected resolution message, got type {msg_type}")
+        return RESOLUTION_BODY.unpack(body)
+
+    def receive_frame(self):
+        """Receive one encoded frame as (type, data)"""
+        return self.receive()
+
+    def send_platform(self, platform_code):
+        """Send the platform code, the agent won't stream to a secure console until it opens"""
+        if self.secure:
+            self.send(MSG_PLATFORM, platform_code)
+        else:
+            self.sock.sendall(platform_code)
+
+    def send_input(self, key, action, x, y):
+        """Send one input event"""
+        self.send_inputs([(key, action, x, y)])
+
+    def send_inputs(self, events):
+        """Send several (key, action, x, y) input events in a single write"""
+        packed = [INPUT_BODY.pack(*event) for event in events]
+        if self.secure:
+            self.send_batch([(MSG_INPUT, event) for event in packed])
+        else:
+            self.sock.sendall(b''.join(packed))
+
+    def send_ack(self, frame_count):
+        """Acknowledge every frame up to frame_count, the agent paces its stream on these"""
+        if self.secure:
+            self.send(MSG_ACK, ACK_BODY.pack(frame_count))
+
+    def send_frame_ack(self, sequence, captured_at, decode_time, display_delay):
+        """Report a frame on screen, echoing its capture time so the agent can measure the whole trip"""
+        if self.secure:
+            self.send(MSG_FRAME_ACK, FRAME_ACK_BODY.pack(sequence, captured_at, decode_time, display_delay))
+
+    def send_viewport(self, width, height):
+        """Tell the agent the size the desktop is shown at, so it doesn't send pixels we'd scale away"""
+        if self.secure:
+            self.send(MSG_VIEWPORT, RESOLUTION_BODY.pack(width, height))
\ No newline at end of file
@@ -52,6 +52,16 @@ class MonitoringTab:
         self.mem_label = ctk.CTkLabel(self.mem_frame, text="0%")
         self.mem_label.pack(side=tk.LEFT, padx=5)
 
+        # CPU and memory over the last hour, backfilled from the agent when monitoring starts
+        self.history_frame = ctk.CTkFrame(monitoring_frame)
+        self.history_frame.pack(fill=tk.X, padx=10, pady=5)
+        self.history_label = ctk.CTkLabel(self.history_frame, text="Last Hour (CPU blue, Memory green):")
+        self.history_label.pack(anchor=tk.W, padx=5)
+        self.history_canvas = tk.Canvas(self.history_frame, height=120, bg="#2b2b2b", highlightthickness=0)
+        self.history_canvas.pack(fill=tk.X, padx=5, pady=5)
+        self.history_canvas.bind("<Configure>", lambda event: self.app.system_monitor.draw_history(
+            getattr(self.app, 'active_connection', None)))
+
         # Container frame for disk usage
         self.disk_container = ctk.CTkFrame(monitoring_frame)
         self.disk_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
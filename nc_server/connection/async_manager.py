@@ -0,0 +1,223 @@
+"""
+asyncio-based connection manager for the NC Server.
+Serves every console session from a single event loop instead of a thread per client.
+"""
+
+import asyncio
+import logging
+import threading
+from datetime import datetime
+
+from nc_server.monitoring.system_info import get_system_info
+from nc_server.connection.manager import ConnectionManager
+from nc_server.connection.framing import read_message, write_message
+from nc_server.connection.encryption import EncryptionManager
+from nc_server.connection.tickets import KEY_EXCHANGE_HELLO, RESUME_MAGIC, RESUME_ACCEPTED, RESUME_REJECTED
+
+
+class AsyncConnectionManager(ConnectionManager):
+    def __init__(self, host='0.0.0.0', port=5000, max_workers=8, key_policy='pool', key_pool_size=8,
+                 ticket_lifetime=300, sample_interval=1.0, partition_interval=30.0, history_size=3600,
+                 capture_backend='auto', rdp_rate_bounds=None):
+        """Initialize the asyncio connection manager with a bounded worker pool"""
+        # Blocking work (psutil probes, power actions, RSA) runs on the worker pool
+        super().__init__(host=host, port=port, key_policy=key_policy, key_pool_size=key_pool_size,
+                         ticket_lifetime=ticket_lifetime, sample_interval=sample_interval,
+                         partition_interval=partition_interval, history_size=history_size,
+                         max_workers=max_workers, capture_backend=capture_backend,
+                         rdp_rate_bounds=rdp_rate_bounds)
+
+        self.loop = None
+        self.server = None
+        self.stop_event = None
+
+        # The loop only keeps weak references to tasks, in-flight commands are held here
+        self.dispatch_tasks = set()
+
+    def start(self):
+        """Start the server and serve connections until stopped"""
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            logging.error(f"Server error: {e}")
+        finally:
+            self.stop()
+
+    async def serve(self):
+        """Run the asyncio server until stop() is called"""
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+
+        self.server = await asyncio.start_server(
+            self.handle_client_async,
+            host=self.host,
+            port=self.port,
+            reuse_address=True
+        )
+
+        logging.info(f"Async server started on {self.host}:{self.port} with AES encryption "
+                     f"({self.max_workers} workers)")
+
+        async with self.server:
+            await self.stop_event.wait()
+
+    def stop(self):
+        """Stop the event loop, worker pool and all client connections"""
+        if self.loop and self.stop_event and not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(self.stop_event.set)
+            except RuntimeError:
+                # Loop already closed
+                pass
+
+        super().stop()
+
+    async def run_blocking(self, func, *args):
+        """Run a blocking call on the bounded worker pool"""
+        return await self.loop.run_in_executor(self.executor, func, *args)
+
+    def start_push(self, address):
+        """Start pushing subscribed streams to a client, or wake its push task"""
+        # Subscriptions are handled on a worker thread, the push task lives on the event loop
+        self.loop.call_soon_threadsafe(self.wake_push, address)
+
+    def wake_push(self, address):
+        """Create the push task for a client or wake the existing one"""
+        client_info = self.clients.get(address)
+        if client_info is None:
+            return
+
+        if client_info.get('push_task') and not client_info['push_task'].done():
+            client_info['push_event'].set()
+            return
+
+        client_info['push_event'] = asyncio.Event()
+        client_info['push_task'] = self.loop.create_task(self.push_loop_async(address))
+
+    async def push_loop_async(self, address):
+        """Push due stream frames to a client until it disconnects"""
+        while self.running:
+            client_info = self.clients.get(address)
+            if client_info is None:
+                return
+
+            due, delay = self.get_due_pushes(client_info)
+            try:
+                for stream, subscription in due:
+                    encrypted_frame = await self.run_blocking(self.build_push_frame, address, stream, subscription)
+                    async with client_info['send_lock']:
+                        write_message(client_info['socket'], encrypted_frame)
+                        await client_info['socket'].drain()
+            except (ConnectionError, KeyError) as e:
+                logging.info(f"Stopped pushing to {address}: {e}")
+                return
+            except Exception as e:
+                logging.error(f"Error pushing to {address}: {e}")
+
+            try:
+                await asyncio.wait_for(client_info['push_event'].wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            client_info['push_event'].clear()
+
+    async def dispatch_message_async(self, encryption_manager, data, address):
+        """Process a single command on the worker pool and send the encrypted response"""
+        try:
+            encrypted_response = await self.run_blocking(self.handle_message, encryption_manager, data, address)
+            client_info = self.clients.get(address)
+            if encrypted_response is None or client_info is None:
+                return
+
+            # One writer drains at a time
+            async with client_info['send_lock']:
+                write_message(client_info['socket'], encrypted_response)
+                await client_info['socket'].drain()
+        except ConnectionError as e:
+            logging.info(f"Could not reply to {address}: {e}")
+        except Exception as e:
+            logging.error(f"Error dispatching command from {address}: {e}")
+
+    async def handle_client_async(self, reader, writer):
+        """Handle a client connection with RSA + AES hybrid encryption"""
+        address = writer.get_extra_info('peername')
+        logging.info(f"New connection from {address}")
+
+        try:
+            # Step 1: Receive the client's opening frame, a resumption request needs no RSA key
+            opening = await asyncio.wait_for(read_message(reader), timeout=10.0)
+
+            encryption_manager = None
+            if opening.startswith(RESUME_MAGIC):
+                resuming = EncryptionManager(key_exchange=False)
+                if await self.run_blocking(resuming.resume_session, opening, self.ticket_manager) is not None:
+                    encryption_manager = resuming
+                    write_message(writer, RESUME_ACCEPTED + encryption_manager.resume_nonce)
+                    logging.info(f"Resumed session for {address} from ticket")
+                else:
+                    # Client falls back to the full key exchange on the same connection
+                    write_message(writer, RESUME_REJECTED)
+                    logging.info(f"Rejected session ticket from {address}, expecting full key exchange")
+                await writer.drain()
+            elif opening != KEY_EXCHANGE_HELLO:
+                raise Exception("Unexpected key exchange opening frame")
+
+            if encryption_manager is None:
+                # Key generation may fall back to CPU bound work, keep it off the event loop
+                encryption_manager = await self.run_blocking(self.create_encryption_manager)
+
+                # Step 2: Send RSA public key to client
+                public_key_bytes = encryption_manager.get_public_key_bytes()
+                write_message(writer, public_key_bytes)
+                await writer.drain()
+
+                logging.info(f"Sent RSA public key ({len(public_key_bytes)} bytes) to {address}")
+
+                # Step 3: Receive the encrypted AES key
+                encrypted_key = await asyncio.wait_for(read_message(reader), timeout=10.0)
+                logging.info(f"Received encrypted AES key ({len(encrypted_key)} bytes) from {address}")
+
+                # Step 4: Decrypt and set the AES key
+                if not await self.run_blocking(encryption_manager.set_client_encryption_key, encrypted_key):
+                    raise Exception("Failed to decrypt client AES key")
+
+            # Store client information with individual encryption manager
+            self.clients[address] = {
+                'socket': writer,
+                'encryption_manager': encryption_manager,
+                'last_seen': datetime.now(),
+                'system_info': await self.run_blocking(get_system_info),
+                'send_lock': asyncio.Lock(),
+                'subscriptions': {},
+                'delta_bases': {},
+                'delta_lock': threading.Lock()
+            }
+
+            # Main communication loop - waiting on the reader costs nothing while idle
+            while self.running:
+                data = await read_message(reader)
+                self.clients[address]['last_seen'] = datetime.now()
+
+                # Don't wait for the reply before reading the next request, commands can be in flight together
+                task = self.loop.create_task(self.dispatch_message_async(encryption_manager, data, address))
+                self.dispatch_tasks.add(task)
+                task.add_done_callback(self.dispatch_tasks.discard)
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logging.info(f"Client {address} disconnected")
+        except asyncio.TimeoutError:
+            logging.error(f"Key exchange timed out for {address}")
+        except Exception as e:
+            logging.error(f"Client handler error for {address}: {e}")
+        finally:
+            # Clean up client connection and its push task
+            client_info = self.clients.pop(address, None)
+            if client_info and client_info.get('push_task'):
+                client_info['push_task'].cancel()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (Exception, asyncio.CancelledError):
+                # The loop cancels handlers on shutdown, there is nothing left to close then
+                pass
+
+            logging.info(f"Connection closed from {address}")
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+Message framing for the NC Server command channel.
+Every message is sent as a 4-byte big-endian length prefix followed by the payload.
+"""
+
+import asyncio
+import socket
+import struct
+import time
+
+HEADER_FORMAT = '>I'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Upper bound on a single message, protects against corrupt or hostile length prefixes
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+# Seconds a started message may go without receiving a byte before the peer is dropped
+MAX_STALL = 30.0
+
+
+def send_message(sock, payload):
+    """Send a single length-prefixed message"""
+    if isinstance(payload, str):
+        payload = payload.encode()
+
+    sock.sendall(struct.pack(HEADER_FORMAT, len(payload)) + payload)
+
+
+def recv_exact(sock, size, mid_message=False):
+    """Receive exactly size bytes from the socket.
+
+    A timeout before any byte of a new message has arrived is raised to the
+    caller so that idle loops keep working; once a message has started,
+    timeouts are retried so a slow sender cannot desynchronize the stream,
+    until no byte has arrived for MAX_STALL seconds.
+    """
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    stalled_since = None
+
+    while received < size:
+        try:
+            count = sock.recv_into(view[received:], size - received)
+        except socket.timeout:
+            if received == 0 and not mid_message:
+                raise
+            now = time.monotonic()
+            if stalled_since is None:
+                stalled_since = now
+            elif now - stalled_since > MAX_STALL:
+                raise ConnectionError(f"Peer stalled for over {MAX_STALL:.0f} seconds mid-message")
+            continue
+
+        if count == 0:
+            raise ConnectionError("Connection closed while receiving data")
+        received += count
+        stalled_since = None
+
+    return bytes(buffer)
+
+
+def recv_message(sock, max_size=MAX_MESSAGE_SIZE):
+    """Receive a single length-prefixed message"""
+    header = recv_exact(sock, HEADER_SIZE)
+    size = struct.unpack(HEADER_FORMAT, header)[0]
+
+    if size > max_size:
+        raise ConnectionError(f"Message of {size} bytes exceeds limit of {max_size} bytes")
+
+    if size == 0:
+        return b''
+
+    return recv_exact(sock, size, mid_message=True)
+
+
+async def read_exact(reader, size):
+    """Read exactly size bytes of a started message from an asyncio stream reader,
+    giving up once no byte has arrived for MAX_STALL seconds like recv_exact does"""
+    buffer = bytearray()
+    while len(buffer) < size:
+        try:
+            chunk = await asyncio.wait_for(reader.read(size - len(buffer)), MAX_STALL)
+        except asyncio.TimeoutError:
+            raise ConnectionError(f"Peer stalled for over {MAX_STALL:.0f} seconds mid-message")
+        if not chunk:
+            raise asyncio.IncompleteReadError(bytes(buffer), size)
+        buffer += chunk
+    return bytes(buffer)
+
+
+async def read_message(reader, max_size=MAX_MESSAGE_SIZE):
+    """Read a single length-prefixed message from an asyncio stream reader"""
+    # Waiting for a new message is unbounded, once its first byte is in the rest must keep coming
+    header = await reader.readexactly(1)
+    header += await read_exact(reader, HEADER_SIZE - 1)
+    size = struct.unpack(HEADER_FORMAT, header)[0]
+
+    if size > max_size:
+        raise ConnectionError(f"Message of {size} bytes exceeds limit of {max_size} bytes")
+
+    if size == 0:
+        return b''
+
+    return await read_exact(reader, size)
+
+
+def write_message(writer, payload):
+    """Queue a single length-prefixed message on an asyncio stream writer"""
+    if isinstance(payload, str):
+        payload = payload.encode()
+
+    writer.write(struct.pack(HEADER_FORMAT, len(payload)) + payload)
\ No newline at end of file
@@ -1,52 +1,113 @@
+import base64
 import socket
+import itertools
 import threading
 import json
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import struct
 
 from nc_server.monitoring.system_info import get_system_info
-from nc_server.monitoring.hardware import get_hardware_info
+from nc_server.monitoring.sampler import HardwareSampler
+from nc_server.monitoring.history import MetricsHistory
+from nc_server.monitoring.delta import diff_snapshot, keyed_network_info
+from nc_server.monitoring.connections import ConnectionTracker
 from nc_server.monitoring.network import get_network_info
 from nc_server.power.controller import handle_power_action
 from nc_server.rdp.server import RDPServer
+from nc_server.rdp.transport import RDP_CIPHERS
 from nc_server.connection.encryption import EncryptionManager
+from nc_server.connection.key_pool import RSAKeyPool
+from nc_server.connection.tickets import (TicketManager, KEY_EXCHANGE_HELLO, RESUME_MAGIC, RESUME_ACCEPTED,
+                                          RESUME_REJECTED)
+from nc_server.connection.framing import send_message, recv_message
+
+# Streams a console can subscribe to and the push interval limits in seconds
+PUSH_STREAMS = ('hardware', 'network', 'system_info')
+MIN_PUSH_INTERVAL = 0.5
+MAX_PUSH_INTERVAL = 60.0
+
+# Most sub-commands accepted in one batch
+MAX_BATCH_COMMANDS = 32
 
 
 class ConnectionManager:
-    def __init__(self, host='0.0.0.0', port=5000):
+    def __init__(self, host='0.0.0.0', port=5000, key_policy='pool', key_pool_size=8, ticket_lifetime=300,
+                 sample_interval=1.0, partition_interval=30.0, history_size=3600, max_workers=8,
+                 capture_backend='auto', rdp_rate_bounds=None):
         """Initialize the connection manager with AES encryption"""
         logging.info("Initializing NC Server Connection Manager with AES encryption")
 
         self.host = host
         self.port = port
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Listening socket of the threaded server, created in start()
+        self.server_socket = None
         self.clients = {}
 
+        # Commands run on a bounded worker pool so a slow probe doesn't hold up other requests
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nc-worker")
+
+        # Batch sub-commands get their own pool, a batch waiting on the command pool could starve it
+        self.batch_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nc-batch")
+
+        # RSA keys for the key exchange are prepared ahead of time
+        self.key_pool = RSAKeyPool(policy=key_policy, pool_size=key_pool_size)
+        self.key_pool.start()
+
+        # Resumption tickets let briefly disconnected consoles skip the RSA exchange
+        self.ticket_manager = TicketManager(lifetime=ticket_lifetime)
+
+        # Hardware is probed in the background, monitoring requests read the latest snapshot
+        # and every sample is kept in a ring buffer for history queries
+        self.metrics_history = MetricsHistory(capacity=history_size)
+        self.hardware_sampler = HardwareSampler(sample_interval=sample_interval,
+                                                partition_interval=partition_interval,
+                                                history=self.metrics_history)
+
+        # Socket table is diffed between snapshots, consoles share one snapshot per interval
+        self.connection_tracker = ConnectionTracker()
+
+        # Network snapshots are taken per request, number them for delta responses
+        self.network_seq = itertools.count(1)
+        self.hardware_sampler.start()
+
         # Initialize the encryption manager with AES
-        self.encryption_manager = EncryptionManager()
+        self.encryption_manager = self.create_encryption_manager()
         self.encryption_key = self.encryption_manager.encryption_key
 
         self.running = True
 
+        # One RDP server is shared by every console viewing this agent
         self.rdp_server = None
         self.rdp_thread = None
+        self.rdp_lock = threading.Lock()
+        self.capture_backend = capture_backend
+        self.rdp_rate_bounds = rdp_rate_bounds
 
         # Command handlers mapping
         self.command_handlers = {
             'system_info': self.handle_system_info,
             'hardware_monitor': self.handle_hardware_monitor,
+            'metrics_history': self.handle_metrics_history,
             'power_management': self.handle_power_management,
             'network_monitor': self.handle_network_monitor,
             'start_rdp': self.handle_start_rdp,
             'stop_rdp': self.handle_stop_rdp,
+            'rdp_stats': self.handle_rdp_stats,
+            'session_ticket': self.handle_session_ticket,
+            'negotiate_record_layer': self.handle_negotiate_record_layer,
+            'subscribe': self.handle_subscribe,
+            'unsubscribe': self.handle_unsubscribe,
+            'batch': self.handle_batch,
             'ping': self.handle_ping
         }
 
     def start(self):
         """Start the server and listen for connections"""
         try:
+            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.bind((self.host, self.port))
             self.server_socket.listen(5)
             self.server_socket.settimeout(1.0)
@@ -89,10 +150,21 @@ class ConnectionManager:
                 pass
 
         # Close server socket
-        try:
-            self.server_socket.close()
-        except:
-            pass
+        if self.server_socket:
+            try:
+                self.server_socket.close()
+            except:
+                pass
+
+        # Stop generating handshake keys
+        self.key_pool.stop()
+
+        # Stop sampling hardware
+        self.hardware_sampler.stop()
+
+        # Stop accepting command work
+        self.executor.shutdown(wait=False)
+        self.batch_executor.shutdown(wait=False)
 
         # Stop RDP server if running
         if self.rdp_server:
@@ -114,80 +186,74 @@ class ConnectionManager:
             # Set a timeout for operations
             wrapped_socket.settimeout(10.0)
 
-            # Create individual encryption manager for this client
-            encryption_manager = EncryptionManager()
-
-            # Step 1: Send RSA public key to client
-            public_key_bytes = encryption_manager.get_public_key_bytes()
-            public_key_size = len(public_key_bytes)
-
-            # Send public key size first
-            wrapped_socket.send(struct.pack('>I', public_key_size))
-            # Send public key
-            wrapped_socket.send(public_key_bytes)
-
-            logging.info(f"Sent RSA public key ({public_key_size} bytes) to {address}")
-
-            # Step 2: Receive encrypted AES key from client
-            encrypted_key_size_bytes = wrapped_socket.recv(4)
-            if len(encrypted_key_size_bytes) != 4:
-                raise ConnectionError("Failed to receive encrypted key size")
-
-            encrypted_key_size = struct.unpack('>I', encrypted_key_size_bytes)[0]
-
-            # Receive encrypted AES key
-            encrypted_key = b''
-            while len(encrypted_key) < encrypted_key_size:
-                chunk = wrapped_socket.recv(encrypted_key_size - len(encrypted_key))
-                if not chunk:
-                    raise ConnectionError("Connection closed while receiving encrypted key")
-                encrypted_key += chunk
-
-            logging.info(f"Received encrypted AES key ({encrypted_key_size} bytes) from {address}")
-
-            # Step 3: Decrypt and set the AES key
-            if not encryption_manager.set_client_encryption_key(encrypted_key):
-                raise Exception("Failed to decrypt client AES key")
+            # Step 1: Receive the client's opening frame, a resumption request needs no RSA key
+            opening = recv_message(wrapped_socket)
+
+            if opening.startswith(RESUME_MAGIC):
+                resuming = EncryptionManager(key_exchange=False)
+                if resuming.resume_session(opening, self.ticket_manager) is not None:
+                    encryption_manager = resuming
+                    send_message(wrapped_socket, RESUME_ACCEPTED + encryption_manager.resume_nonce)
+                    logging.info(f"Resumed session for {address} from ticket")
+                else:
+                    # Client falls back to the full key exchange on the same connection
+                    send_message(wrapped_socket, RESUME_REJECTED)
+                    logging.info(f"Rejected session ticket from {address}, expecting full key exchange")
+            elif opening != KEY_EXCHANGE_HELLO:
+                raise Exception("Unexpected key exchange opening frame")
+
+            if encryption_manager is None:
+                # Create individual encryption manager for this client
+                encryption_manager = self.create_encryption_manager()
+
+                # Step 2: Send RSA public key to client
+                public_key_bytes = encryption_manager.get_public_key_bytes()
+                public_key_size = len(public_key_bytes)
+                send_message(wrapped_socket, public_key_bytes)
+
+                logging.info(f"Sent RSA public key ({public_key_size} bytes) to {address}")
+
+                # Step 3: Receive the encrypted AES key
+                encrypted_key = recv_message(wrapped_socket)
+                encrypted_key_size = len(encrypted_key)
+                logging.info(f"Received encrypted AES key ({encrypted_key_size} bytes) from {address}")
+
+                # Step 4: Decrypt and set the AES key
+                if not encryption_manager.set_client_encryption_key(encrypted_key):
+                    raise Exception("Failed to decrypt client AES key")
 
             # Shorter timeout for regular operations
             wrapped_socket.settimeout(1.0)
 
             # Store client information with individual encryption manager
+            # Replies and pushed frames share the socket, send_lock keeps frames whole
             self.clients[address] = {
                 'socket': wrapped_socket,
                 'encryption_manager': encryption_manager,
                 'last_seen': datetime.now(),
-                'system_info': get_system_info()
+                'system_info': get_system_info(),
+                'send_lock': threading.Lock(),
+                'subscriptions': {},
+                'delta_bases': {},
+                'delta_lock': threading.Lock()
             }
 
             # Main communication loop
             while self.running:
                 try:
                     # Receive encrypted data
-                    data = wrapped_socket.recv(4096)
-                    if not data:
-                        logging.info(f"Client {address} disconnected (empty data)")
-                        break
-
-                    # Decrypt the data
-                    try:
-                        decrypted_data = encryption_manager.decrypt_data(data)
-                        command = json.loads(decrypted_data)
-
-                        # Process the command
-                        response = self.process_command(command)
-
-                        # Encrypt and send response
-                        response_json = json.dumps(response)
-                        encrypted_response = encryption_manager.encrypt_data(response_json)
-                        wrapped_socket.send(encrypted_response)
-                    except json.JSONDecodeError as e:
-                        logging.error(f"Invalid JSON from {address}: {e}")
-                        continue
+                    data = recv_message(wrapped_socket)
+
+                    # Process the command on the worker pool so the next request can be read right away,
+                    # replies carry the request id so the client can match them up
+                    self.executor.submit(self.dispatch_message, encryption_manager, data, address)
 
                 except socket.timeout:
                     # Just continue on timeout (this is normal)
                     continue
+                except ConnectionError:
+                    logging.info(f"Client {address} disconnected")
+                    break
                 except Exception as e:
                     logging.error(f"Error handling client {address}: {e}")
                     break
@@ -195,8 +261,11 @@ class ConnectionManager:
         except Exception as e:
             logging.error(f"Client handler error for {address}: {e}")
         finally:
-            # Clean up client connection
-            self.clients.pop(address, None)
+            # Clean up client connection and wake its push thread so it exits
+            client_info = self.clients.pop(address, None)
+            if client_info and client_info.get('push_event'):
+                client_info['push_event'].set()
+            self.release_rdp(address)
             try:
                 client_socket.close()
             except Exception as close_error:
@@ -204,7 +273,46 @@ class ConnectionManager:
 
             logging.info(f"Connection closed from {address}")
 
-    def process_command(self, command):
+    def create_encryption_manager(self):
+        """Create an encryption manager with an RSA key from the key pool"""
+        return EncryptionManager(self.key_pool.acquire())
+
+    def dispatch_message(self, encryption_manager, data, address):
+        """Process a single command on a worker thread and send the encrypted response"""
+        try:
+            encrypted_response = self.handle_message(encryption_manager, data, address)
+            client_info = self.clients.get(address)
+            if encrypted_response is None or client_info is None:
+                return
+
+            with client_info['send_lock']:
+                send_message(client_info['socket'], encrypted_response)
+        except OSError as e:
+            logging.info(f"Could not reply to {address}: {e}")
+        except Exception as e:
+            logging.error(f"Error dispatching command from {address}: {e}")
+
+    def handle_message(self, encryption_manager, data, address):
+        """Decrypt a single command, process it and return the encrypted response"""
+        try:
+            decrypted_data = encryption_manager.decrypt_data(data)
+            command = json.loads(decrypted_data)
+        except json.JSONDecodeError as e:
+            logging.error(f"Invalid JSON from {address}: {e}")
+            return None
+
+        # Process the command
+        response = self.process_command(command, address)
+
+        # Echo the request id so replies can be matched to requests in flight
+        if isinstance(command, dict) and 'id' in command:
+            response = dict(response, id=command['id'])
+
+        # Encrypt the response
+        response_json = json.dumps(response)
+        return encryption_manager.encrypt_data(response_json)
+
+    def process_command(self, command, address=None):
         """Process client command and return response"""
         try:
             cmd_type = command.get('type', '')
@@ -222,7 +330,7 @@ class ConnectionManager:
                     cmd_data = {}
 
                 # Call the handler with the command data
-                return handler(cmd_data)
+                return handler(cmd_data, address)
             else:
                 logging.warning(f"Unknown command received: {cmd_type}")
                 return {'status': 'error', 'message': f'Unknown command: {cmd_type}'}
@@ -231,101 +339,183 @@ class ConnectionManager:
             logging.error(f"Error processing command: {str(e)}")
             return {'status': 'error', 'message': 'Internal server error'}
 
-    def handle_system_info(self, data):
+    def handle_system_info(self, data, address):
         """Handle system information request"""
         return {
             'status': 'success',
             'data': get_system_info()
         }
 
-    def handle_hardware_monitor(self, data):
+    def handle_hardware_monitor(self, data, address):
         """Handle hardware monitoring request"""
+        if data.get('delta'):
+            seq, snapshot = self.hardware_sampler.latest_with_seq()
+            return {
+                'status': 'success',
+                'data': self.encode_delta_response(address, 'hardware', seq, snapshot, data.get('since_seq'))
+            }
+
         return {
             'status': 'success',
-            'data': get_hardware_info()
+            'data': self.hardware_sampler.latest()
         }
 
-    def handle_network_monitor(self, data):
-        """Handle network monitoring request"""
+    def handle_metrics_history(self, data, address):
+        """Handle metrics history request for a time range"""
+        try:
+            end = data.get('end')
+            start = data.get('start')
+            if start is None:
+                # Default to the last hour up to now
+                start = (end or time.time()) - data.get('seconds', 3600)
+
+            return {
+                'status': 'success',
+                'data': self.metrics_history.encode(start=start, end=end, max_points=data.get('max_points'))
+            }
+        except (TypeError, ValueError) as e:
+            return {
+                'status': 'error',
+                'message': f"Invalid metrics history range: {e}"
+            }
+
+    def handle_network_monitor(self, data, address):
+        """Handle network monitoring request, aggregates by default and detail pages on demand"""
+        view = data.get('view', 'summary')
+
+        try:
+            if view == 'summary':
+                network_info = self.connection_tracker.summary()
+            elif view == 'detail':
+                network_info = self.connection_tracker.detail(
+                    state=data.get('state'),
+                    port=data.get('port'),
+                    pid=data.get('pid'),
+                    page=data.get('page', 0),
+                    page_size=data.get('page_size', 100)
+                )
+            elif view == 'full':
+                network_info = get_network_info()
+            else:
+                return {
+                    'status': 'error',
+                    'message': f"Unknown network view: {view}"
+                }
+        except (TypeError, ValueError) as e:
+            return {
+                'status': 'error',
+                'message': f"Invalid network filter: {e}"
+            }
+
+        if data.get('delta'):
+            # Delta clients get connections keyed so each one can be diffed on its own
+            snapshot = keyed_network_info(network_info) if 'connections' in network_info else network_info
+            return {
+                'status': 'success',
+                'data': self.encode_delta_response(address, f'network_{view}', next(self.network_seq), snapshot,
+                                                   data.get('since_seq'))
+            }
+
         return {
             'status': 'success',
-            'data': get_network_info()
+            'data': network_info
+        }
+
+    def encode_delta_response(self, address, stream, seq, snapshot, since_seq):
+        """Encode a monitoring snapshot as a delta against the last one sent to this client"""
+        client_info = self.clients.get(address)
+        if client_info is None:
+            return {'seq': seq, 'full': snapshot}
+
+        # Remember what this client holds so the next request can be answered with a delta.
+        # Requests from one client run concurrently, each must see the base the other left.
+        with client_info['delta_lock']:
+            base = client_info['delta_bases'].get(stream)
+            client_info['delta_bases'][stream] = (seq, snapshot)
+
+        if base is None or since_seq is None or base[0] != since_seq:
+            # Client has no usable base (first request, reconnect or missed reply)
+            return {'seq': seq, 'full': snapshot}
+
+        return {
+            'seq': seq,
+            'base_seq': since_seq,
+            'delta': diff_snapshot(base[1], snapshot)
         }
 
-    def handle_power_management(self, data):
+    def handle_power_management(self, data, address):
         """Handle power management request"""
         action = data.get('action')
         seconds = data.get('seconds')
         return handle_power_action(action, seconds)
 
-    def handle_start_rdp(self, data):
-        """Start RDP server"""
+    def handle_start_rdp(self, data, address):
+        """Start RDP server, or let another console view the one already running"""
         try:
-            # Force close any existing RDP server
-            if self.rdp_server is not None:
-                logging.info("Stopping existing RDP server before starting a new one")
-                self.rdp_server.stop()
-                self.rdp_server = None
-
-                # Wait for thread to terminate
-                if self.rdp_thread and self.rdp_thread.is_alive():
-                    self.rdp_thread.join(timeout=2)
-                    self.rdp_thread = None
-
-                # Wait for resources to be released
-                time.sleep(1)
-
             # Use the actual server's IP
             rdp_host = socket.gethostbyname(socket.gethostname())
             rdp_port = 5900  # Default RDP port
 
-            # Create and start RDP server
-            self.rdp_server = RDPServer(host='0.0.0.0', port=rdp_port)
-            self.rdp_thread = threading.Thread(target=self.rdp_server.start)
-            self.rdp_thread.daemon = True
-            self.rdp_thread.start()
-
-            # Wait for server to start
-            time.sleep(1.5)
+            offered_ciphers = data.get('ciphers') or []
+            session_key = self.clients[address]['encryption_manager'].encryption_key
+
+            with self.rdp_lock:
+                if self.rdp_server is None:
+                    # Encrypt the stream when the console offers a cipher, older consoles get the plain stream
+                    cipher_name = next((name for name in offered_ciphers if name in RDP_CIPHERS), None)
+                    if not (cipher_name and session_key):
+                        cipher_name = None
+                        logging.warning(f"Starting unencrypted RDP stream for {address}")
+
+                    # The socket listens once constructed, so the console can connect straight away
+                    self.rdp_server = RDPServer(host='0.0.0.0', port=rdp_port, cipher_name=cipher_name,
+                                                encodings=data.get('encodings'), capture_backend=self.capture_backend,
+                                                rate_bounds=self.rdp_rate_bounds)
+                    self.rdp_thread = threading.Thread(target=self.rdp_server.start)
+                    self.rdp_thread.daemon = True
+                    self.rdp_thread.start()
+                elif self.rdp_server.cipher_name and not (self.rdp_server.cipher_name in offered_ciphers and
+                                                          session_key):
+                    return {
+                        'status': 'error',
+                        'message': f'RDP is already streaming with {self.rdp_server.cipher_name}, '
+                                   f'which this console does not offer'
+                    }
+
+                # Streams are keyed per console, a second console views alongside the first
+                cipher_name, telemetry = self.rdp_server.cipher_name, self.rdp_server.telemetry
+                self.rdp_server.add_console(address, session_key if cipher_name else None)
 
             return {
                 'status': 'success',
                 'data': {
                     'ip': rdp_host,
-                    'port': rdp_port
+                    'port': rdp_port,
+                    'cipher': cipher_name,
+                    'telemetry': telemetry
                 }
             }
         except Exception as e:
             logging.error(f"Failed to start RDP server: {e}")
 
-            # Clean up in case of error
-            if hasattr(self, 'rdp_server') and self.rdp_server:
-                try:
-                    self.rdp_server.stop()
-                    self.rdp_server = None
-                except:
-                    pass
+            # Clean up in case of error, other consoles keep viewing
+            try:
+                self.release_rdp(address)
+            except:
+                pass
 
             return {
                 'status': 'error',
                 'message': str(e)
             }
 
-    def handle_stop_rdp(self, data):
-        """Stop RDP server"""
+    def handle_stop_rdp(self, data, address):
+        """Stop viewing RDP, the server stops once no console is viewing it"""
         try:
-            if self.rdp_server:
-                logging.info("Stopping RDP server")
-                self.rdp_server.stop()
-                self.rdp_server = None
-
-                # Clean up thread reference
-                if self.rdp_thread:
-                    if self.rdp_thread.is_alive():
-                        self.rdp_thread.join(timeout=3)
-                    self.rdp_thread = None
-
+            if self.release_rdp(address):
                 return {'status': 'success', 'message': 'RDP server stopped successfully'}
+            elif self.rdp_server:
+                return {'status': 'success', 'message': 'RDP server left running for other consoles'}
             else:
                 return {'status': 'success', 'message': 'No RDP server was running'}
         except Exception as e:
@@ -337,7 +527,248 @@ class ConnectionManager:
 
             return {'status': 'error', 'message': f'Error stopping RDP server: {e}'}
 
-    def handle_ping(self, data):
+    def release_rdp(self, address):
+        """Forget a console's RDP key, stopping the server when it was the last one. Returns True if stopped."""
+        with self.rdp_lock:
+            if not self.rdp_server or self.rdp_server.remove_console(address):
+                return False
+
+            logging.info("Stopping RDP server")
+            self.rdp_server.stop()
+            self.rdp_server = None
+
+            # Clean up thread reference
+            if self.rdp_thread:
+                if self.rdp_thread.is_alive():
+                    self.rdp_thread.join(timeout=3)
+                self.rdp_thread = None
+            return True
+
+    def handle_rdp_stats(self, data, address):
+        """Report the RDP stream settings, link measurements and per-frame histograms"""
+        rdp_server = self.rdp_server
+        if rdp_server is None:
+            return {'status': 'error', 'message': 'No RDP server is running'}
+
+        return {
+            'status': 'success',
+            'data': rdp_server.get_stats()
+        }
+
+    def handle_session_ticket(self, data, address):
+        """Issue a resumption ticket for the client's current session key"""
+        client_info = self.clients.get(address)
+        if not client_info or not client_info['encryption_manager'].encryption_key:
+            return {'status': 'error', 'message': 'No established session'}
+
+        ticket = self.ticket_manager.issue(client_info['encryption_manager'].encryption_key)
+
+        return {
+            'status': 'success',
+            'data': {
+                'ticket': ticket,
+                'lifetime': self.ticket_manager.lifetime
+            }
+        }
+
+    def handle_negotiate_record_layer(self, data, address):
+        """Negotiate the AEAD record layer for the client's session"""
+        ciphers = data.get('ciphers')
+        if not isinstance(ciphers, list):
+            return {
+                'status': 'error',
+                'message': "No record ciphers offered"
+            }
+
+        negotiated = self.clients[address]['encryption_manager'].enable_record_layer(ciphers)
+        if negotiated is None:
+            return {
+                'status': 'error',
+                'message': "No common record cipher"
+            }
+
+        cipher_name, salt = negotiated
+        return {
+            'status': 'success',
+            'data': {
+                'cipher': cipher_name,
+                'salt': base64.b64encode(salt).decode()
+            }
+        }
+
+    def handle_subscribe(self, data, address):
+        """Handle subscription to a pushed monitoring stream"""
+        stream = data.get('stream')
+        if stream not in PUSH_STREAMS:
+            return {
+                'status': 'error',
+                'message': f"Unknown stream: {stream}"
+            }
+
+        try:
+            interval = float(data.get('interval', 2.0))
+        except (TypeError, ValueError):
+            return {
+                'status': 'error',
+                'message': "Invalid push interval"
+            }
+
+        # Pushing hardware faster than it is sampled would only resend the same snapshot
+        min_interval = MIN_PUSH_INTERVAL
+        if stream == 'hardware':
+            min_interval = max(min_interval, self.hardware_sampler.sample_interval)
+        interval = min(max(interval, min_interval), MAX_PUSH_INTERVAL)
+
+        client_info = self.clients[address]
+        client_info['subscriptions'][stream] = {
+            'interval': interval,
+            'delta': bool(data.get('delta', True)),
+            'next_push': time.time()
+        }
+
+        # A new subscription restarts the delta chain with a full snapshot
+        with client_info['delta_lock']:
+            client_info['delta_bases'].pop(f'push_{stream}', None)
+
+        self.start_push(address)
+
+        return {
+            'status': 'success',
+            'data': {
+                'stream': stream,
+                'interval': interval
+            }
+        }
+
+    def handle_unsubscribe(self, data, address):
+        """Handle unsubscription from one or all pushed streams"""
+        subscriptions = self.clients[address]['subscriptions']
+        stream = data.get('stream')
+
+        if stream is None:
+            subscriptions.clear()
+        else:
+            subscriptions.pop(stream, None)
+
+        return {
+            'status': 'success',
+            'data': {
+                'streams': list(subscriptions)
+            }
+        }
+
+    def start_push(self, address):
+        """Start pushing subscribed streams to a client, or wake its push thread"""
+        client_info = self.clients[address]
+
+        if client_info.get('push_thread') and client_info['push_thread'].is_alive():
+            client_info['push_event'].set()
+            return
+
+        client_info['push_event'] = threading.Event()
+        client_info['push_thread'] = threading.Thread(
+            target=self.push_loop,
+            args=(address,)
+        )
+        client_info['push_thread'].daemon = True
+        client_info['push_thread'].start()
+
+    def push_loop(self, address):
+        """Push due stream frames to a client until it disconnects"""
+        while self.running:
+            client_info = self.clients.get(address)
+            if client_info is None:
+                return
+
+            due, delay = self.get_due_pushes(client_info)
+            try:
+                for stream, subscription in due:
+                    encrypted_frame = self.build_push_frame(address, stream, subscription)
+                    with client_info['send_lock']:
+                        send_message(client_info['socket'], encrypted_frame)
+            except (OSError, KeyError) as e:
+                logging.info(f"Stopped pushing to {address}: {e}")
+                return
+            except Exception as e:
+                logging.error(f"Error pushing to {address}: {e}")
+
+            client_info['push_event'].wait(delay)
+            client_info['push_event'].clear()
+
+    def get_due_pushes(self, client_info):
+        """Get the subscriptions due for a push and the seconds until the next one"""
+        now = time.time()
+        due = []
+        next_push = now + MAX_PUSH_INTERVAL
+
+        for stream, subscription in list(client_info['subscriptions'].items()):
+            if subscription['next_push'] <= now:
+                due.append((stream, subscription))
+                subscription['next_push'] = now + subscription['interval']
+            next_push = min(next_push, subscription['next_push'])
+
+        return due, max(0.0, next_push - now)
+
+    def build_push_frame(self, address, stream, subscription):
+        """Build an encrypted push frame for one stream"""
+        if stream == 'hardware':
+            seq, snapshot = self.hardware_sampler.latest_with_seq()
+            if subscription['delta']:
+                # The client holds whatever we pushed last, diff against that
+                base = self.clients[address]['delta_bases'].get('push_hardware')
+                data = self.encode_delta_response(address, 'push_hardware', seq, snapshot,
+                                                  base[0] if base else None)
+            else:
+                data = snapshot
+        elif stream == 'network':
+            data = self.connection_tracker.summary()
+        else:
+            data = get_system_info()
+
+        frame = json.dumps({'push': stream, 'data': data})
+        return self.clients[address]['encryption_manager'].encrypt_data(frame)
+
+    def handle_batch(self, data, address):
+        """Handle a batch of sub-commands and return all results in one response"""
+        commands = data.get('commands')
+        if not isinstance(commands, list) or not commands:
+            return {
+                'status': 'error',
+                'message': "Batch requires a list of commands"
+            }
+
+        if len(commands) > MAX_BATCH_COMMANDS:
+            return {
+                'status': 'error',
+                'message': f"Batch limited to {MAX_BATCH_COMMANDS} commands"
+            }
+
+        # Sub-commands are independent unless the client asks for them in order
+        if data.get('sequential'):
+            results = [self.process_batch_command(command, address) for command in commands]
+        else:
+            futures = [self.batch_executor.submit(self.process_batch_command, command, address)
+                       for command in commands]
+            results = [future.result() for future in futures]
+
+        return {
+            'status': 'success',
+            'data': {
+                'results': results
+            }
+        }
+
+    def process_batch_command(self, command, address):
+        """Process one sub-command of a batch"""
+        if not isinstance(command, dict):
+            return {'status': 'error', 'message': 'Invalid batch command'}
+
+        if command.get('type') == 'batch':
+            return {'status': 'error', 'message': 'Batches cannot be nested'}
+
+        return self.process_command(command, address)
+
+    def handle_ping(self, data, address):
         """Handle ping request (for connection testing)"""
         return {
             'status': 'success',
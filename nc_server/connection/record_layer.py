@@ -0,0 +1,106 @@
+"""
+AEAD record layer for the NC Server.
+Binary records sealed with AES-GCM or ChaCha20-Poly1305 and counter nonces,
+negotiated after the key exchange with Fernet kept as the fallback.
+"""
+
+import struct
+import threading
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# Supported record ciphers in order of preference
+RECORD_CIPHERS = {
+    'aes-256-gcm': AESGCM,
+    'chacha20-poly1305': ChaCha20Poly1305
+}
+
+# Record header: marker byte and 64-bit sequence number, authenticated as associated data.
+# Fernet tokens always start with 'g', so both formats can share a socket.
+RECORD_MARKER = 0x01
+RECORD_HEADER = struct.Struct('>BQ')
+
+# Late records accepted when replies are sealed out of order by worker threads
+REPLAY_WINDOW = 64
+
+
+def derive_record_keys(session_key, salt):
+    """Derive the client-to-server and server-to-client keys from the session key"""
+    keys = []
+    for direction in (b'client to server', b'server to client'):
+        hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=b'nc record layer ' + direction)
+        keys.append(hkdf.derive(session_key))
+    return keys
+
+
+def is_record(data):
+    """Check whether data is an AEAD record rather than a Fernet token"""
+    return isinstance(data, (bytes, bytearray, memoryview)) and len(data) > 0 and data[0] == RECORD_MARKER
+
+
+class RecordLayer:
+    """Seals and opens AEAD records with per-direction keys and sequence numbers"""
+
+    def __init__(self, cipher_name, send_key, receive_key):
+        if cipher_name not in RECORD_CIPHERS:
+            raise ValueError(f"Unsupported record cipher: {cipher_name}")
+
+        self.cipher_name = cipher_name
+        self.send_cipher = RECORD_CIPHERS[cipher_name](send_key)
+        self.receive_cipher = RECORD_CIPHERS[cipher_name](receive_key)
+
+        self.send_seq = 0
+        self.send_lock = threading.Lock()
+
+        # Sliding window of sequence numbers already opened
+        self.receive_max = -1
+        self.receive_window = 0
+        self.receive_lock = threading.Lock()
+
+    def seal(self, data):
+        """Encrypt data into a record"""
+        with self.send_lock:
+            seq = self.send_seq
+            self.send_seq += 1
+
+        header = RECORD_HEADER.pack(RECORD_MARKER, seq)
+        return header + self.send_cipher.encrypt(self.nonce(seq), data, header)
+
+    def open(self, record):
+        """Decrypt a record, rejecting forgeries and replays"""
+        record = memoryview(record)
+        if len(record) < RECORD_HEADER.size:
+            raise ValueError("Truncated record")
+
+        header = bytes(record[:RECORD_HEADER.size])
+        _, seq = RECORD_HEADER.unpack(header)
+
+        try:
+            data = self.receive_cipher.decrypt(self.nonce(seq), record[RECORD_HEADER.size:], header)
+        except InvalidTag:
+            raise ValueError("Record failed authentication")
+
+        self.check_replay(seq)
+        return data
+
+    def check_replay(self, seq):
+        """Accept each sequence number once, tolerating slight reordering"""
+        with self.receive_lock:
+            if seq > self.receive_max:
+                shift = seq - self.receive_max
+                self.receive_window = ((self.receive_window << shift) | 1) & ((1 << REPLAY_WINDOW) - 1)
+                self.receive_max = seq
+                return
+
+            offset = self.receive_max - seq
+            if offset >= REPLAY_WINDOW or self.receive_window & (1 << offset):
+                raise ValueError(f"Replayed or stale record {seq}")
+            self.receive_window |= 1 << offset
+
+    @staticmethod
+    def nonce(seq):
+        """96-bit nonce from a sequence number, keys are never shared between directions"""
+        return b'\x00\x00\x00\x00' + struct.pack('>Q', seq)
\ No newline at end of file
@@ -5,6 +5,9 @@ import sys
 import os
 
 from nc_server.connection.manager import ConnectionManager
+from nc_server.connection.async_manager import AsyncConnectionManager
+from nc_server.connection.key_pool import KEY_POLICIES
+from nc_server.rdp.capture import CAPTURE_BACKENDS
 from nc_server.utils.logging import setup_logging
 
 
@@ -18,9 +21,40 @@ def parse_arguments():
     parser.add_argument("-l", "--log-level", type=str,
                         choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
                         default="INFO", help="Logging level")
+    parser.add_argument("-m", "--mode", type=str, choices=["threaded", "async"],
+                        default="threaded",
+                        help="Connection handling mode: thread per client or asyncio (default: threaded)")
+    parser.add_argument("-w", "--workers", type=int, default=8,
+                        help="Worker threads that run client commands (default: 8)")
+    parser.add_argument("--key-policy", type=str, choices=list(KEY_POLICIES), default="pool",
+                        help="RSA key policy for the key exchange (default: pool)")
+    parser.add_argument("--key-pool-size", type=int, default=8,
+                        help="Pre-generated RSA keys kept ready with the pool policy (default: 8)")
+    parser.add_argument("--ticket-lifetime", type=int, default=300,
+                        help="Seconds a session resumption ticket stays valid (default: 300)")
+    parser.add_argument("--sample-interval", type=float, default=1.0,
+                        help="Seconds between background hardware samples (default: 1.0)")
+    parser.add_argument("--partition-interval", type=float, default=30.0,
+                        help="Seconds between disk partition list refreshes (default: 30)")
+    parser.add_argument("--history-size", type=int, default=3600,
+                        help="Hardware samples kept for metrics_history (default: 3600)")
+    parser.add_argument("--capture-backend", type=str, choices=["auto"] + list(CAPTURE_BACKENDS), default="auto",
+                        help="Remote desktop screen capture, auto picks the fastest available (default: auto)")
+    parser.add_argument("--rdp-quality", type=int, nargs=2, metavar=("MIN", "MAX"),
+                        help="JPEG quality range the remote desktop adapts within (default: 40 95)")
+    parser.add_argument("--rdp-fps", type=float, nargs=2, metavar=("MIN", "MAX"),
+                        help="Frame rate range the remote desktop adapts within (default: 2 15)")
+    parser.add_argument("--rdp-scale", type=float, nargs=2, metavar=("MIN", "MAX"),
+                        help="Resolution scale range the remote desktop adapts within (default: 0.5 1.0)")
     return parser.parse_args()
 
 
+def rdp_rate_bounds(args):
+    """Remote desktop rate control bounds given on the command line"""
+    bounds = {'quality': args.rdp_quality, 'frame_rate': args.rdp_fps, 'scale': args.rdp_scale}
+    return {name: tuple(bound) for name, bound in bounds.items() if bound}
+
+
 def signal_handler(sig, frame):
     """Handle interrupt signals"""
     print("\nShutting down server...")
@@ -41,7 +75,24 @@ def main():
     setup_logging(args.log_level)
 
     # Create and start server
-    server = ConnectionManager(host=args.address, port=args.port)
+    if args.mode == "async":
+        server = AsyncConnectionManager(host=args.address, port=args.port, max_workers=args.workers,
+                                        key_policy=args.key_policy, key_pool_size=args.key_pool_size,
+                                        ticket_lifetime=args.ticket_lifetime,
+                                        sample_interval=args.sample_interval,
+                                        partition_interval=args.partition_interval,
+                                        history_size=args.history_size,
+                                        capture_backend=args.capture_backend,
+                                        rdp_rate_bounds=rdp_rate_bounds(args))
+    else:
+        server = ConnectionManager(host=args.address, port=args.port, max_workers=args.workers,
+                                   key_policy=args.key_policy, key_pool_size=args.key_pool_size,
+                                   ticket_lifetime=args.ticket_lifetime,
+                                   sample_interval=args.sample_interval,
+                                   partition_interval=args.partition_interval,
+                                   history_size=args.history_size,
+                                   capture_backend=args.capture_backend,
+                                   rdp_rate_bounds=rdp_rate_bounds(args))
     signal_handler.server = server
 
     # Register signal handlers
@@ -49,7 +100,7 @@ def main():
     signal.signal(signal.SIGTERM, signal_handler)
 
     try:
-        logging.info(f"Starting NC Server on {args.address}:{args.port}")
+        logging.info(f"Starting NC Server on {args.address}:{args.port} ({args.mode} mode)")
         server.start()
     except Exception as e:
         logging.critical(f"Server failed to start: {e}")
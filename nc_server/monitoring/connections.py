@@ -0,0 +1,178 @@
+"""
+Connection table tracker for the NC Server.
+Diffs successive socket tables and keeps aggregate counts up to date incrementally.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+
+import psutil
+
+# Detail page limits
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Entries in each top talker list
+TOP_TALKERS = 10
+
+
+def connection_key(conn):
+    """Identity of a socket across snapshots, state is tracked separately"""
+    return (conn.fd, conn.family, conn.type, tuple(conn.laddr or ()), tuple(conn.raddr or ()), conn.pid)
+
+
+def connection_to_dict(conn):
+    """Convert a psutil connection to a JSON friendly dict"""
+    return {
+        'fd': conn.fd,
+        'family': int(conn.family),
+        'type': int(conn.type),
+        'laddr': list(conn.laddr) if conn.laddr else [],
+        'raddr': list(conn.raddr) if conn.raddr else [],
+        'status': conn.status,
+        'pid': conn.pid
+    }
+
+
+class ConnectionTracker:
+    """Keeps the socket table with per-state counts and top talkers"""
+
+    def __init__(self, min_interval=2.0):
+        # Requests within this many seconds share one psutil snapshot
+        self.min_interval = min_interval
+
+        self.connections = {}
+        self.state_counts = Counter()
+        self.pid_counts = Counter()
+        self.remote_counts = Counter()
+
+        self.last_refresh = 0
+        self.last_changes = {'added': 0, 'removed': 0, 'changed': 0}
+        self.sorted_keys = None
+        self.process_names = {}
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """Take a new socket table snapshot if the current one is stale"""
+        with self.lock:
+            if time.time() - self.last_refresh < self.min_interval:
+                return
+
+            try:
+                current = {connection_key(conn): conn for conn in psutil.net_connections()}
+            except Exception as e:
+                logging.error(f"Error reading connection table: {e}")
+                return
+
+            added = removed = changed = 0
+
+            for key, conn in self.connections.items():
+                new_conn = current.get(key)
+                if new_conn is None:
+                    self.count(conn, -1)
+                    removed += 1
+                elif new_conn.status != conn.status:
+                    self.count(conn, -1)
+                    self.count(new_conn, 1)
+                    changed += 1
+
+            for key, conn in current.items():
+                if key not in self.connections:
+                    self.count(conn, 1)
+                    added += 1
+
+            self.connections = current
+            self.last_refresh = time.time()
+            self.last_changes = {'added': added, 'removed': removed, 'changed': changed}
+
+            if added or removed:
+                self.sorted_keys = None
+
+                # Forget processes whose sockets are gone, their pid may be reused by another process
+                for pid in [pid for pid in self.process_names if pid not in self.pid_counts]:
+                    del self.process_names[pid]
+
+    def count(self, conn, delta):
+        """Adjust the aggregate counters for one connection"""
+        self.state_counts[conn.status] += delta
+        if not self.state_counts[conn.status]:
+            del self.state_counts[conn.status]
+
+        if conn.pid is not None:
+            self.pid_counts[conn.pid] += delta
+            if not self.pid_counts[conn.pid]:
+                del self.pid_counts[conn.pid]
+
+        if conn.raddr:
+            self.remote_counts[conn.raddr[0]] += delta
+            if not self.remote_counts[conn.raddr[0]]:
+                del self.remote_counts[conn.raddr[0]]
+
+    def get_process_name(self, pid):
+        """Get a process name, cached per pid while the pid has sockets in the table"""
+        if pid not in self.process_names:
+            try:
+                self.process_names[pid] = psutil.Process(pid).name()
+            except (psutil.Error, ValueError):
+                return None
+        return self.process_names[pid]
+
+    def summary(self):
+        """Aggregate view of the socket table"""
+        self.refresh()
+
+        with self.lock:
+            listening_ports = sorted({conn.laddr[1] for conn in self.connections.values()
+                                      if conn.status == psutil.CONN_LISTEN and conn.laddr})
+
+            return {
+                'total': len(self.connections),
+                'states': dict(self.state_counts),
+                'top_processes': [
+                    {'pid': pid, 'name': self.get_process_name(pid), 'connections': count}
+                    for pid, count in self.pid_counts.most_common(TOP_TALKERS)
+                ],
+                'top_remotes': [
+                    {'address': address, 'connections': count}
+                    for address, count in self.remote_counts.most_common(TOP_TALKERS)
+                ],
+                'listening_ports': listening_ports,
+                'changes': dict(self.last_changes),
+                'io_counters': dict(psutil.net_io_counters()._asdict())
+            }
+
+    def detail(self, state=None, port=None, pid=None, page=0, page_size=DEFAULT_PAGE_SIZE):
+        """One page of connections matching the filters"""
+        self.refresh()
+
+        page = max(0, int(page))
+        page_size = min(max(1, int(page_size)), MAX_PAGE_SIZE)
+        port = int(port) if port is not None else None
+        pid = int(pid) if pid is not None else None
+
+        with self.lock:
+            # Sort once per table change so pages stay stable between requests
+            if self.sorted_keys is None:
+                self.sorted_keys = sorted(self.connections, key=str)
+
+            matches = []
+            for key in self.sorted_keys:
+                conn = self.connections[key]
+                if state is not None and conn.status != state:
+                    continue
+                if pid is not None and conn.pid != pid:
+                    continue
+                if port is not None and not ((conn.laddr and conn.laddr[1] == port) or
+                                             (conn.raddr and conn.raddr[1] == port)):
+                    continue
+                matches.append(conn)
+
+            start = page * page_size
+            return {
+                'total': len(matches),
+                'page': page,
+                'page_size': page_size,
+                'connections': [connection_to_dict(conn) for conn in matches[start:start + page_size]]
+            }
\ No newline at end of file
@@ -0,0 +1,39 @@
+"""
+Delta encoding for NC Server monitoring responses.
+Lets a console that already holds a snapshot receive only what changed since.
+"""
+
+
+def diff_snapshot(old, new, path=None):
+    """Get the changes that turn old into new as set and unset key paths"""
+    path = path or []
+    delta = {'set': [], 'unset': []}
+
+    for key, value in new.items():
+        old_value = old.get(key)
+        if isinstance(value, dict) and isinstance(old_value, dict):
+            # Descend so one changed field doesn't resend the whole dict
+            nested = diff_snapshot(old_value, value, path + [key])
+            delta['set'].extend(nested['set'])
+            delta['unset'].extend(nested['unset'])
+        elif key not in old or old_value != value:
+            delta['set'].append([path + [key], value])
+
+    for key in old:
+        if key not in new:
+            delta['unset'].append(path + [key])
+
+    return delta
+
+
+def connection_key(connection):
+    """Stable key for a network connection entry"""
+    return f"{connection.get('type')}|{connection.get('laddr')}|{connection.get('raddr')}|{connection.get('pid')}"
+
+
+def keyed_network_info(network_info):
+    """Key the connection list so connections can be diffed individually"""
+    keyed = dict(network_info)
+    keyed['connections'] = {connection_key(connection): connection
+                            for connection in network_info.get('connections', [])}
+    return keyed
\ No newline at end of file
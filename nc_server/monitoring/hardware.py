@@ -3,34 +3,48 @@ import logging
 import platform
 
 
-def get_hardware_info():
+def get_partition_mountpoints():
+    """List mountpoints of all drives, including removable ones"""
+    mountpoints = []
+
+    for partition in psutil.disk_partitions(all=True):  # Changed to all=True to include all drives
+        # Skip optical drives on Windows which often cause errors
+        if platform.system() == 'Windows' and 'cdrom' in partition.opts.lower():
+            continue
+        mountpoints.append(partition.mountpoint)
+
+    return mountpoints
+
+
+def get_disk_usage(mountpoints):
+    """Collect disk usage for the given mountpoints"""
+    disk_usage = {}
+
+    for mountpoint in mountpoints:
+        # Attempt to get usage for all drives (including removable)
+        try:
+            usage = psutil.disk_usage(mountpoint)
+            disk_usage[mountpoint] = dict(usage._asdict())
+        except PermissionError:
+            # Skip drives we can't access (like empty card readers)
+            continue
+        except Exception as e:
+            logging.warning(f"Could not access drive {mountpoint}: {e}")
+            continue
+
+    return disk_usage
+
+
+def get_hardware_info(cpu_interval=1, mountpoints=None):
     """Monitor hardware metrics including removable drives"""
     try:
-        disk_usage = {}
-
-        # Safely collect disk usage information
-        for partition in psutil.disk_partitions(all=True):  # Changed to all=True to include all drives
-            try:
-                # Skip optical drives on Windows which often cause errors
-                if platform.system() == 'Windows' and 'cdrom' in partition.opts.lower():
-                    continue
-
-                # Attempt to get usage for all drives (including removable)
-                try:
-                    usage = psutil.disk_usage(partition.mountpoint)
-                    disk_usage[partition.mountpoint] = dict(usage._asdict())
-                except PermissionError:
-                    # Skip drives we can't access (like empty card readers)
-                    continue
-
-            except Exception as e:
-                logging.warning(f"Could not access drive {partition.mountpoint}: {e}")
-                continue
+        if mountpoints is None:
+            mountpoints = get_partition_mountpoints()
 
         return {
-            'cpu_percent': psutil.cpu_percent(interval=1),
+            'cpu_percent': psutil.cpu_percent(interval=cpu_interval),
             'memory_usage': dict(psutil.virtual_memory()._asdict()),
-            'disk_usage': disk_usage,
+            'disk_usage': get_disk_usage(mountpoints),
             'network_io': dict(psutil.net_io_counters()._asdict())
         }
     except Exception as e:
@@ -0,0 +1,105 @@
+"""
+Metrics history for the NC Server.
+Keeps recent hardware samples in fixed-size, array-backed ring buffers.
+"""
+
+import base64
+import sys
+import threading
+from array import array
+
+# Column name and array typecode, timestamps need double precision
+METRIC_FIELDS = (
+    ('timestamp', 'd'),
+    ('cpu_percent', 'f'),
+    ('memory_percent', 'f'),
+    ('disk_percent', 'f'),
+    ('net_sent_rate', 'f'),
+    ('net_recv_rate', 'f'),
+)
+
+
+class MetricsHistory:
+    """Fixed-size columnar ring buffer of hardware samples"""
+
+    def __init__(self, capacity=3600):
+        self.capacity = max(1, capacity)
+
+        # One preallocated column per metric, nothing is allocated per sample
+        self.columns = {name: array(typecode, [0]) * self.capacity for name, typecode in METRIC_FIELDS}
+        self.head = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+        self.last_network_io = None
+        self.last_timestamp = None
+
+    def append(self, snapshot, timestamp):
+        """Record one hardware snapshot"""
+        memory_usage = snapshot.get('memory_usage') or {}
+        network_io = snapshot.get('network_io') or {}
+
+        # Network counters are cumulative, store rates so charts can use them directly
+        sent_rate = recv_rate = 0.0
+        if self.last_network_io and network_io and timestamp > self.last_timestamp:
+            elapsed = timestamp - self.last_timestamp
+            sent_rate = max(0, network_io.get('bytes_sent', 0) - self.last_network_io.get('bytes_sent', 0)) / elapsed
+            recv_rate = max(0, network_io.get('bytes_recv', 0) - self.last_network_io.get('bytes_recv', 0)) / elapsed
+        self.last_network_io = network_io
+        self.last_timestamp = timestamp
+
+        values = {
+            'timestamp': timestamp,
+            'cpu_percent': snapshot.get('cpu_percent') or 0.0,
+            'memory_percent': memory_usage.get('percent') or 0.0,
+            'disk_percent': get_disk_percent(snapshot.get('disk_usage') or {}),
+            'net_sent_rate': sent_rate,
+            'net_recv_rate': recv_rate
+        }
+
+        with self.lock:
+            for name, _ in METRIC_FIELDS:
+                self.columns[name][self.head] = values[name]
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def query(self, start=None, end=None, max_points=None):
+        """Get the samples between start and end as columns in chronological order"""
+        with self.lock:
+            # Oldest sample sits at head once the buffer has wrapped
+            first = (self.head - self.count) % self.capacity
+            order = [(first + i) % self.capacity for i in range(self.count)]
+            timestamps = self.columns['timestamp']
+            indices = [i for i in order
+                       if (start is None or timestamps[i] >= start) and (end is None or timestamps[i] <= end)]
+
+            # Thin long ranges evenly instead of truncating them
+            if max_points and len(indices) > max_points:
+                step = len(indices) / max_points
+                indices = [indices[int(i * step)] for i in range(max_points)]
+
+            return {name: array(typecode, (self.columns[name][i] for i in indices))
+                    for name, typecode in METRIC_FIELDS}
+
+    def encode(self, start=None, end=None, max_points=None):
+        """Get a range of samples as base64 encoded little-endian columns"""
+        columns = self.query(start, end, max_points)
+
+        encoded = {}
+        for name, column in columns.items():
+            if sys.byteorder == 'big':
+                column.byteswap()
+            encoded[name] = base64.b64encode(column.tobytes()).decode()
+
+        return {
+            'count': len(columns['timestamp']),
+            'fields': [[name, typecode] for name, typecode in METRIC_FIELDS],
+            'columns': encoded
+        }
+
+
+def get_disk_percent(disk_usage):
+    """Combined usage percent across all drives"""
+    total = sum(usage.get('total', 0) for usage in disk_usage.values())
+    used = sum(usage.get('used', 0) for usage in disk_usage.values())
+    return used / total * 100 if total else 0.0
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""
+Background hardware sampler for the NC Server.
+Probes the hardware on a fixed cadence so monitoring requests only read the latest snapshot.
+"""
+
+import logging
+import threading
+import time
+
+import psutil
+
+from nc_server.monitoring.hardware import get_hardware_info, get_partition_mountpoints
+
+
+class HardwareSampler:
+    """Keeps a rolling hardware snapshot shared by every console"""
+
+    def __init__(self, sample_interval=1.0, partition_interval=30.0, history=None):
+        self.sample_interval = sample_interval
+        self.partition_interval = partition_interval
+
+        # Optional ring buffer every sample is recorded into
+        self.history = history
+
+        self.mountpoints = []
+        self.last_partition_refresh = 0
+
+        # Replaced as a whole on every sample, readers never see a partial snapshot
+        self.current = (0, None)
+        self.seq = 0
+        self.timestamp = 0
+
+        self.running = False
+        self.stop_event = threading.Event()
+        self.sampler_thread = None
+
+    def start(self):
+        """Take a first sample and start the background sampler"""
+        self.running = True
+        self.stop_event.clear()
+
+        # Prime the CPU counters, later samples measure usage since the previous call
+        psutil.cpu_percent(interval=None)
+        self.sample()
+
+        self.sampler_thread = threading.Thread(target=self.sample_loop, name="hardware-sampler")
+        self.sampler_thread.daemon = True
+        self.sampler_thread.start()
+
+        logging.info(f"Hardware sampler started ({self.sample_interval}s samples, "
+                     f"{self.partition_interval}s partition refresh)")
+
+    def stop(self):
+        """Stop the background sampler"""
+        self.running = False
+        self.stop_event.set()
+
+    def sample_loop(self):
+        """Sample until stopped"""
+        while not self.stop_event.wait(self.sample_interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logging.error(f"Error sampling hardware: {e}")
+
+    def sample(self):
+        """Take one sample and publish it as the latest snapshot"""
+        now = time.time()
+
+        # Enumerating partitions is slow, refresh the list on its own schedule
+        if now - self.last_partition_refresh >= self.partition_interval:
+            try:
+                self.mountpoints = get_partition_mountpoints()
+            except Exception as e:
+                logging.warning(f"Could not refresh disk partitions: {e}")
+            self.last_partition_refresh = now
+
+        snapshot = get_hardware_info(cpu_interval=None, mountpoints=self.mountpoints)
+
+        self.seq += 1
+        self.timestamp = now
+        self.current = (self.seq, snapshot)
+
+        if self.history is not None:
+            self.history.append(snapshot, now)
+
+    def latest(self):
+        """Get the latest hardware snapshot"""
+        return self.latest_with_seq()[1]
+
+    def latest_with_seq(self):
+        """Get the sequence number and latest hardware snapshot"""
+        seq, snapshot = self.current
+        if snapshot is None:
+            # Sampler not started, probe inline
+            return 0, get_hardware_info()
+        return seq, snapshot
\ No newline at end of file
@@ -0,0 +1,267 @@
+"""
+Screen capture sources for the NC Server RDP stream.
+Every source grabs the screen as a BGR frame, optionally into a buffer the caller
+reuses, so steady-state capture doesn't allocate a full-size image per frame.
+"""
+
+import logging
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import ImageGrab
+
+try:
+    import mss
+except ImportError:
+    # Optional faster backend
+    mss = None
+
+
+def arrow_cursor():
+    """Standard arrow pointer as (RGBA image, hotspot), for platforms where the shape can't be read"""
+    outline = np.array([[0, 0], [0, 16], [4, 12], [7, 18], [9, 17], [6, 11], [11, 11]], dtype=np.int32)
+    image = np.zeros((19, 12, 4), dtype=np.uint8)
+    cv2.fillPoly(image, [outline], (255, 255, 255, 255))
+    cv2.polylines(image, [outline], True, (0, 0, 0, 255), 1)
+    return image, (0, 0)
+
+
+def output_buffer(out, shape):
+    """Reuse the caller's buffer when it fits the frame, otherwise allocate one"""
+    if out is not None and out.shape == shape and out.dtype == np.uint8:
+        return out
+    return np.empty(shape, dtype=np.uint8)
+
+
+class CaptureSource:
+    """Grabs the screen as a BGR frame"""
+
+    name = None
+
+    def grab(self, out=None):
+        """Capture one frame, into out when it has the right shape"""
+        raise NotImplementedError
+
+    def cursor_position(self):
+        """Pointer position on the captured screen, None to ask the input backend"""
+        return None
+
+    def cursor_shape(self):
+        """Pointer image as (RGBA image, hotspot)"""
+        return arrow_cursor()
+
+    def close(self):
+        """Release grabber resources held by the calling thread"""
+
+
+class ImageGrabSource(CaptureSource):
+    """PIL ImageGrab, available everywhere the agent runs but allocates a new image per grab"""
+
+    name = 'imagegrab'
+
+    def grab(self, out=None):
+        image = np.asarray(ImageGrab.grab())
+        return cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=output_buffer(out, image.shape))
+
+
+class MSSSource(CaptureSource):
+    """mss grabber, copies the screen through shared memory (XShm, a reused DIB on Windows)"""
+
+    name = 'mss'
+
+    def __init__(self, monitor=1):
+        if mss is None:
+            raise RuntimeError("mss is not installed")
+
+        self.monitor = monitor
+
+        # mss handles are bound to the thread that created them
+        self.local = threading.local()
+
+    def grab(self, out=None):
+        grabber = getattr(self.local, 'grabber', None)
+        if grabber is None:
+            grabber = self.local.grabber = mss.mss()
+
+        shot = grabber.grab(grabber.monitors[self.monitor])
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        return cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=output_buffer(out, (shot.height, shot.width, 3)))
+
+    def close(self):
+        grabber = getattr(self.local, 'grabber', None)
+        if grabber is not None:
+            grabber.close()
+            self.local.grabber = None
+
+
+# Scripted activities each synthetic scenario replays
+SYNTHETIC_SCENARIOS = {
+    'idle': (),
+    'pointer': ('cursor',),
+    'typing': ('typing', 'cursor'),
+    'scrolling': ('scrolling', 'cursor'),
+    'video': ('video', 'cursor'),
+    'mixed': ('typing', 'video', 'cursor', 'switch')
+}
+
+# Frames between window switches in the mixed scenario
+SWITCH_INTERVAL = 300
+
+
+class SyntheticSource(CaptureSource):
+    """Deterministic desktop that replays scripted activity, for headless runs and benchmarks"""
+
+    name = 'synthetic'
+
+    def __init__(self, width=1920, height=1080, scenario='mixed', draw_cursor=True):
+        if scenario not in SYNTHETIC_SCENARIOS:
+            raise ValueError(f"Unknown synthetic scenario: {scenario}")
+
+        # Real grabbers leave the pointer out of the image, with a cursor channel this one does too
+        self.draw_cursor = draw_cursor
+
+        self.width = width
+        self.height = height
+        self.activities = SYNTHETIC_SCENARIOS[scenario]
+
+        self.frame_index = 0
+        self.typed = 0
+        self.lock = threading.Lock()
+
+        # Editor and player windows the activities draw into
+        self.editor = (width // 10, height // 8, width // 2, height * 3 // 4)
+        self.player = (width * 5 // 8, height // 8, width // 3, width * 3 // 16)
+
+        self.canvas = self.draw_desktop(0)
+
+    def draw_desktop(self, theme):
+        """Draw the wallpaper and windows for a theme"""
+        shade = 40 + (theme * 50) % 120
+        gradient = np.linspace(shade, shade + 100, self.width, dtype=np.uint8)
+        canvas = np.ascontiguousarray(np.dstack([np.tile(gradient, (self.height, 1))] * 3))
+
+        for index, (x, y, w, h) in enumerate((self.editor, self.player)):
+            cv2.rectangle(canvas, (x, y), (x + w, y + h), (235, 235, 235), -1)
+            cv2.rectangle(canvas, (x, y), (x + w, y + 28), (120, 80, 40), -1)
+            cv2.putText(canvas, f"window {index}", (x + 8, y + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+
+        # Pre-filled lines give scrolling something to move
+        x, y, w, h = self.editor
+        for line in range((h - 40) // 22):
+            cv2.putText(canvas, f"{line:04d} synthetic text for the scrolling editor", (x + 10, y + 50 + line * 22),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (30, 30, 30), 1)
+        return canvas
+
+    def step(self):
+        """Advance the scripted activity by one frame"""
+        self.frame_index += 1
+        index = self.frame_index
+
+        if 'switch' in self.activities and index % SWITCH_INTERVAL == 0:
+            self.canvas = self.draw_desktop(index // SWITCH_INTERVAL)
+            self.typed = 0
+
+        if 'typing' in self.activities:
+            self.step_typing()
+
+        if 'scrolling' in self.activities:
+            x, y, w, h = self.editor
+            body = self.canvas[y + 30:y + h, x:x + w]
+            body[:-8] = body[8:].copy()
+            body[-8:] = 235
+            cv2.putText(body, f"{index:06d} scrolled line", (10, h - 34),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (30, 30, 30), 1)
+
+        if 'video' in self.activities:
+            x, y, w, h = self.player
+            phase = (index * 7) % 256
+            ramp = (np.arange(w, dtype=np.uint16) + phase) % 256
+            self.canvas[y + 30:y + h, x:x + w] = ramp.astype(np.uint8)[None, :, None]
+
+    def step_typing(self):
+        """Type one character into the editor, clearing it once full"""
+        x, y, w, h = self.editor
+        chars_per_line = (w - 20) // 11
+        lines = (h - 40) // 22
+
+        line, column = divmod(self.typed, chars_per_line)
+        if line >= lines:
+            self.canvas[y + 30:y + h, x:x + w] = 235
+            self.typed = line = column = 0
+
+        character = "the quick brown fox jumps over the lazy dog "[self.typed % 44]
+        cv2.putText(self.canvas, character, (x + 10 + column * 11, y + 50 + line * 22),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 160), 1)
+        self.typed += 1
+
+    def grab(self, out=None):
+        with self.lock:
+            self.step()
+            frame = output_buffer(out, self.canvas.shape)
+            np.copyto(frame, self.canvas)
+
+            if self.draw_cursor and 'cursor' in self.activities:
+                cx, cy = self.scripted_cursor()
+                cursor = np.array([[cx, cy], [cx, cy + 18], [cx + 12, cy + 13]], dtype=np.int32)
+                cv2.fillPoly(frame, [cursor], (255, 255, 255))
+            return frame
+
+    def scripted_cursor(self):
+        """Where the scripted pointer is on the current frame"""
+        angle = self.frame_index / 20.0
+        cx = int(self.width / 2 + self.width / 3 * np.sin(angle))
+        cy = int(self.height / 2 + self.height / 3 * np.sin(angle * 1.3))
+        return cx, cy
+
+    def cursor_position(self):
+        with self.lock:
+            if 'cursor' not in self.activities:
+                return self.width // 2, self.height // 2
+            return self.scripted_cursor()
+
+
+# Backends by name, auto selection probes the real ones in this order
+CAPTURE_BACKENDS = {
+    'mss': MSSSource,
+    'imagegrab': ImageGrabSource,
+    'synthetic': SyntheticSource
+}
+SCREEN_BACKENDS = ('mss', 'imagegrab')
+
+
+def select_fastest_source(candidates=SCREEN_BACKENDS, probes=3):
+    """Time a few grabs from each available backend and keep the fastest"""
+    best, best_time = None, None
+    for name in candidates:
+        try:
+            source = CAPTURE_BACKENDS[name]()
+            frame = source.grab()
+            start = time.perf_counter()
+            for _ in range(probes):
+                frame = source.grab(frame)
+            elapsed = (time.perf_counter() - start) / probes
+        except Exception as e:
+            logging.info(f"Capture backend {name} unavailable: {e}")
+            continue
+
+        logging.info(f"Capture backend {name}: {elapsed * 1000:.1f} ms per grab")
+        source.close()
+        if best is None or elapsed < best_time:
+            best, best_time = source, elapsed
+
+    if best is None:
+        raise RuntimeError("No screen capture backend available")
+
+    logging.info(f"Using {best.name} screen capture")
+    return best
+
+
+def create_capture_source(backend='auto', **options):
+    """Create a capture source by name, or pick the fastest working one"""
+    if backend == 'auto':
+        return select_fastest_source()
+    if backend not in CAPTURE_BACKENDS:
+        raise ValueError(f"Unknown capture backend: {backend}")
+    return CAPTURE_BACKENDS[backend](**options)
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+Frame pipeline stages for the NC Server RDP stream.
+Capture and encode run on their own threads joined by a bounded queue, and each viewer's
+sender is the last stage. OpenCV and socket writes release the GIL, so while one frame is
+being encoded the next is already being captured and the one before is being sent.
+"""
+
+import logging
+import queue
+import threading
+
+# Frames that may wait between two stages, a full queue holds the stage before it back
+PIPELINE_DEPTH = 2
+
+# How often a waiting stage checks whether it should stop
+POLL_INTERVAL = 0.1
+
+
+class CapturedFrame:
+    """A captured screen on its way to the encoder"""
+
+    __slots__ = ('screen', 'screen_size', 'is_cursor_only_change', 'captured_at')
+
+    def __init__(self, screen, screen_size, is_cursor_only_change, captured_at):
+        self.screen = screen
+        self.screen_size = screen_size
+        self.is_cursor_only_change = is_cursor_only_change
+        self.captured_at = captured_at
+
+
+class PipelineStage:
+    """Runs one pipeline step on its own thread, or inline in the caller when not threaded"""
+
+    def __init__(self, name, process, depth=PIPELINE_DEPTH, threaded=True):
+        self.name = name
+        self.process = process
+        self.threaded = threaded
+        self.items = queue.Queue(maxsize=depth)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Start the stage thread"""
+        self.running = True
+        if self.threaded:
+            self.thread = threading.Thread(target=self.run, name=self.name)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        """Stop the stage once the item it is working on is done"""
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+        self.thread = None
+
+    def submit(self, item):
+        """Hand an item to the stage, waiting while its queue is full. Returns False if it stopped."""
+        if not self.threaded:
+            self.process(item)
+            return True
+
+        while self.running:
+            try:
+                self.items.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self):
+        """Process queued items until stopped"""
+        while self.running:
+            try:
+                item = self.items.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+
+            try:
+                self.process(item)
+            except Exception as e:
+                logging.error(f"RDP {self.name} stage error: {e}")
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Adaptive rate control for the NC Server RDP stream.
+Watches how long sends take, how many bytes sit unsent in the socket, how late
+viewers acknowledge frames and whether they drop updates, then trades JPEG quality,
+resolution scale and frame rate to keep the session interactive.
+"""
+
+import threading
+import time
+
+# Default bounds
+DEFAULT_QUALITY = (40, 95)
+DEFAULT_SCALE = (0.5, 1.0)
+DEFAULT_FRAME_RATE = (2, 15)
+
+# Frame acknowledged later than this means frames are queueing somewhere
+TARGET_LATENCY = 0.15
+
+# How often settings may change and by how much
+ADJUST_INTERVAL = 0.5
+QUALITY_STEP = 10
+SCALE_STEP = 0.125
+
+# Weight of the newest sample in the moving averages
+SMOOTHING = 0.3
+
+
+class RateController:
+    """Adapts JPEG quality, resolution scale and frame rate to how well viewers keep up"""
+
+    def __init__(self, quality=DEFAULT_QUALITY, scale=DEFAULT_SCALE, frame_rate=DEFAULT_FRAME_RATE,
+                 target_latency=TARGET_LATENCY):
+        self.min_quality, self.max_quality = quality
+        self.min_scale, self.max_scale = scale
+        self.min_frame_rate, self.max_frame_rate = frame_rate
+        self.target_latency = target_latency
+
+        # Start at full quality, back off only when the link pushes back
+        self.quality = self.max_quality
+        self.scale = self.max_scale
+        self.frame_rate = self.max_frame_rate
+
+        # Smoothed signals
+        self.send_time = 0.0
+        self.frame_bytes = 0.0
+        self.latency = 0.0
+        self.backlog = 0
+        self.drops = 0
+        self.total_drops = 0
+        self.samples = 0
+
+        self.last_adjust = time.time()
+        self.adjustments = 0
+        self.lock = threading.Lock()
+
+    @property
+    def frame_interval(self):
+        """Seconds between frames at the current frame rate"""
+        return 1.0 / self.frame_rate
+
+    def record_send(self, size, seconds, backlog=None):
+        """Record one update written to a viewer's socket"""
+        with self.lock:
+            self.samples += 1
+            self.send_time += SMOOTHING * (seconds - self.send_time)
+            self.frame_bytes += SMOOTHING * (size - self.frame_bytes)
+            if backlog is not None:
+                self.backlog = backlog
+
+    def record_ack(self, latency):
+        """Record the time from sending a frame to the viewer acknowledging it"""
+        with self.lock:
+            self.samples += 1
+            self.latency += SMOOTHING * (latency - self.latency)
+
+    def record_drop(self):
+        """Record an update a viewer was too far behind to take"""
+        with self.lock:
+            self.drops += 1
+            self.total_drops += 1
+
+    def update(self):
+        """Adjust the settings if the adjustment interval has passed, returns True if they changed"""
+        now = time.time()
+        with self.lock:
+            if now - self.last_adjust < ADJUST_INTERVAL:
+                return False
+            self.last_adjust = now
+
+            # Nothing was sent or acknowledged, old averages say nothing about the link now
+            samples, self.samples = self.samples, 0
+            if not samples and not self.drops:
+                return False
+
+            backlog_frames = self.backlog / self.frame_bytes if self.frame_bytes else 0.0
+            busy = self.send_time / self.frame_interval
+            drops, self.drops = self.drops, 0
+
+            before = (self.quality, self.scale, self.frame_rate)
+            if drops or self.latency > self.target_latency or backlog_frames > 2 or busy > 0.8:
+                severe = self.latency > 4 * self.target_latency or backlog_frames > 8
+                self.decrease(3 if severe else 1)
+
+                # Frames already queued still carry the old settings, let them drain before judging again
+                self.last_adjust = now + ADJUST_INTERVAL
+            elif self.latency < self.target_latency / 2 and backlog_frames < 0.5 and busy < 0.5:
+                self.increase()
+
+            changed = before != (self.quality, self.scale, self.frame_rate)
+            if changed:
+                self.adjustments += 1
+            return changed
+
+    def decrease(self, steps):
+        """Back off: quality first, then resolution, then frame rate"""
+        for _ in range(steps):
+            if self.quality > self.min_quality:
+                self.quality = max(self.min_quality, self.quality - QUALITY_STEP)
+            elif self.scale > self.min_scale:
+                self.scale = max(self.min_scale, self.scale - SCALE_STEP)
+            elif self.frame_rate > self.min_frame_rate:
+                self.frame_rate = max(self.min_frame_rate, self.frame_rate * 0.75)
+
+    def increase(self):
+        """Recover one step: frame rate first, then resolution, then quality"""
+        if self.frame_rate < self.max_frame_rate:
+            self.frame_rate = min(self.max_frame_rate, self.frame_rate + max(1.0, self.frame_rate / 4))
+        elif self.scale < self.max_scale:
+            self.scale = min(self.max_scale, self.scale + SCALE_STEP)
+        elif self.quality < self.max_quality:
+            self.quality = min(self.max_quality, self.quality + QUALITY_STEP // 2)
+
+    def stats(self):
+        """Current settings and the signals behind them"""
+        with self.lock:
+            return {
+                'quality': self.quality,
+                'scale': self.scale,
+                'frame_rate': round(self.frame_rate, 2),
+                'latency_ms': round(self.latency * 1000, 1),
+                'send_ms': round(self.send_time * 1000, 2),
+                'frame_kb': round(self.frame_bytes / 1024, 1),
+                'backlog_kb': round(self.backlog / 1024, 1),
+                'drops': self.total_drops,
+                'adjustments': self.adjustments
+            }
\ No newline at end of file
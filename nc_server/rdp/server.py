@@ -1,23 +1,48 @@
+import queue
 import socket
 import threading
 import logging
 import time
+from collections import deque
 import numpy as np
 import cv2
-from PIL import ImageGrab
-import struct
-import pyautogui as ag
-import mouse
+
+try:
+    import pyautogui as ag
+    import mouse
+except Exception as e:
+    # No display to inject input into (headless agent or benchmark), the stream still works
+    logging.warning(f"RDP input injection unavailable: {e}")
+    ag = mouse = None
+
+from nc_server.rdp.transport import (RDPChannel, MSG_FRAME, MSG_TILES, MSG_MIXED_TILES, MSG_ACK, MSG_VIEWPORT,
+                                     MSG_INPUT, MSG_FRAME_ACK, FRAME_INFO)
+from nc_server.rdp.tiles import TileEncoder
+from nc_server.rdp.viewers import ViewerQueue, EncodedUpdate
+from nc_server.rdp.capture import create_capture_source
+from nc_server.rdp.rate_control import RateController
+from nc_server.rdp.pipeline import PipelineStage, CapturedFrame
+from nc_server.rdp.telemetry import FrameTelemetry
 
 
 class RDPServer:
-    def __init__(self, host='0.0.0.0', port=80):
+    def __init__(self, host='0.0.0.0', port=80, session_key=None, cipher_name=None, encodings=None,
+                 capture_backend='auto', capture_options=None, frame_rate=15, rate_bounds=None, pipelined=True,
+                 coalesce_input=True):
         # Configuration
+        self.FRAME_RATE = frame_rate
         self.REFRESH_RATE = 0.05
         self.SCROLL_SENSITIVITY = 5
         self.IMAGE_QUALITY = 95
         self.BUFFER_SIZE = 1024
 
+        # Bytes a viewer's socket may hold unsent before its next frame waits, anything more
+        # hides congestion behind seconds of queued frames instead of dropping them here
+        self.MAX_UNSENT = 128 * 1024
+
+        # Pick the screen grabber before listening so a headless agent fails start_rdp cleanly
+        self.capture_source = create_capture_source(capture_backend, **(capture_options or {}))
+
         # Server setup
         self.host = (host, port)
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -28,9 +53,58 @@ class RDPServer:
         # Set a timeout to make the server stoppable
         self.socket.settimeout(1.0)
 
-        # Image state
-        self.last_image = None
+        # Stream encryption, each console that started RDP views it keyed from its own agent session.
+        # A key given here belongs to no console and stays until the server stops.
+        self.cipher_name = cipher_name
+        self.consoles = {None: session_key} if session_key else {}
+
+        # Consoles that understand tiles only get the regions that changed
+        # and those that take mixed tiles get text and flat areas losslessly
+        self.tile_encoder = None
+        if 'tiles' in (encodings or ()):
+            self.tile_encoder = TileEncoder(lossless='lossless' in encodings)
+
+        # Quality, resolution and frame rate follow how well the viewers keep up,
+        # frames are only downscaled for consoles that stretch them back to the screen size
+        self.scaling = 'scaling' in (encodings or ())
+        rate_bounds = dict(rate_bounds or {})
+        rate_bounds.setdefault('quality', (40, self.IMAGE_QUALITY))
+        rate_bounds.setdefault('frame_rate', (min(2, frame_rate), frame_rate))
+        if not self.scaling:
+            rate_bounds['scale'] = (1.0, 1.0)
+        self.rate_controller = RateController(**rate_bounds)
+
+        # Consoles with a cursor channel draw the pointer themselves, so it is left out of the
+        # captured frames and pointer motion costs a few bytes instead of a re-encoded screen
+        self.cursor_channel = 'cursor' in (encodings or ())
+        self.CURSOR_INTERVAL = 1 / 60
+        if self.cursor_channel and hasattr(self.capture_source, 'draw_cursor'):
+            self.capture_source.draw_cursor = False
+
+        # Capture and encode overlap on their own threads, unless the serial loop is asked for
+        self.pipelined = pipelined
+        self.free_buffers = queue.Queue()
+        self.last_encoded = self.previous_capture = None
+
+        # Pointer moves that a later move in the same read makes pointless are dropped
+        # instead of replayed one by one, so input lag can't build up behind a slow link
+        self.coalesce_input = coalesce_input
+        self.input_events = 0
+        self.moves_coalesced = 0
+
+        # Seconds from capture until each frame was written to a viewer
+        self.frame_latencies = deque(maxlen=1000)
+
+        # Consoles that take telemetry get numbered, timestamped frames and report when each is on
+        # screen, the histograms are what rdp_stats returns
+        self.telemetry = 'telemetry' in (encodings or ())
+        self.frame_telemetry = FrameTelemetry()
+        self.frame_sequence = 0
+
+        # Viewers the producer fans encoded frames out to, guarded by the lock
         self.lock = threading.Lock()
+        self.viewers = []
+        self.producer_thread = None
         self.shift_pressed = False
 
         # Control flags
@@ -62,19 +136,25 @@ class RDPServer:
 
     def start(self):
         """Start the RDP server and listen for connections with improved error handling"""
-        logging.info(f"RDP server started on {self.host[0]}:{self.host[1]}")
+        mode = f"encrypted with {self.cipher_name}" if self.cipher_name else "unencrypted"
+        logging.info(f"RDP server started on {self.host[0]}:{self.host[1]} ({mode})")
 
         while self.running:
             try:
                 conn, addr = self.socket.accept()
                 logging.info(f"New RDP connection from {addr}")
 
+                channel = self.open_channel(conn, addr)
+                if channel is None:
+                    continue
+
                 # Store connection reference
                 self.active_connections.append(conn)
 
-                # Start display and input threads for the client
-                display_thread = threading.Thread(target=self.handle_display, args=(conn,))
-                input_thread = threading.Thread(target=self.handle_input, args=(conn,))
+                # Start display and input threads for the client, acks arrive on the input stream
+                viewer = ViewerQueue()
+                display_thread = threading.Thread(target=self.handle_display, args=(conn, channel, viewer))
+                input_thread = threading.Thread(target=self.handle_input, args=(conn, channel, viewer))
 
                 display_thread.daemon = True
                 input_thread.daemon = True
@@ -93,6 +173,31 @@ class RDPServer:
                     logging.error(f"RDP server connection error: {e}")
                 break
 
+    def open_channel(self, conn, addr):
+        """Set up the stream for a new connection, nothing is streamed until the console proves its key"""
+        try:
+            conn.settimeout(5.0)
+            if self.cipher_name:
+                with self.lock:
+                    session_keys = [key for key in self.consoles.values() if key]
+                channel = RDPChannel.accept(conn, session_keys, self.cipher_name)
+            else:
+                channel = RDPChannel(conn)
+
+            # Get client platform info
+            platform = channel.receive_platform()
+            logging.info(f"Client platform: {platform}")
+
+            conn.settimeout(None)
+            return channel
+        except Exception as e:
+            logging.warning(f"Rejected RDP connection from {addr}: {e}")
+            try:
+                conn.close()
+            except:
+                pass
+            return None
+
     def stop(self):
         """Stop the RDP server and clean up connections"""
         logging.info("Stopping RDP server...")
@@ -114,32 +219,145 @@ class RDPServer:
         except:
             pass
 
+        self.capture_source.close()
+
         logging.info("RDP server stopped")
 
-    def handle_display(self, conn):
-        """Handle screen capture and transmission with improved handling for cursor movement"""
+    def add_console(self, console, session_key):
+        """Let a console view the stream, keyed from its session key when the stream is encrypted"""
+        with self.lock:
+            self.consoles[console] = session_key
+
+    def remove_console(self, console):
+        """Forget a console's key, returns how many consoles are left"""
+        with self.lock:
+            self.consoles.pop(console, None)
+            return len(self.consoles)
+
+    def add_viewer(self, viewer):
+        """Register a viewer, starting the producer if it isn't running"""
+        with self.lock:
+            self.viewers.append(viewer)
+            if self.producer_thread is None:
+                self.producer_thread = threading.Thread(target=self.produce_frames, name="rdp-producer")
+                self.producer_thread.daemon = True
+                self.producer_thread.start()
+
+    def remove_viewer(self, viewer):
+        """Unregister a viewer, the producer stops once nobody is watching"""
+        with self.lock:
+            if viewer in self.viewers:
+                self.viewers.remove(viewer)
+
+    def has_viewers(self):
+        """Check whether the producer should keep running, releasing it if not"""
+        with self.lock:
+            if self.running and self.viewers:
+                return True
+            self.producer_thread = None
+            return False
+
+    def get_stats(self):
+        """Current stream settings and the link measurements behind them"""
+        stats = self.rate_controller.stats()
+        with self.lock:
+            stats['viewers'] = len(self.viewers)
+            stats['viewer_drops'] = sum(viewer.dropped for viewer in self.viewers)
+
+        latencies = sorted(self.frame_latencies)
+        if latencies:
+            stats['frame_latency_ms'] = round(latencies[len(latencies) // 2] * 1000, 1)
+            stats['frame_latency_p95_ms'] = round(latencies[int(len(latencies) * 0.95)] * 1000, 1)
+        stats['pipelined'] = self.pipelined
+        stats['input_events'] = self.input_events
+        stats['moves_coalesced'] = self.moves_coalesced
+        with self.lock:
+            stats['frames_behind'] = max((viewer.sequence_sent - viewer.sequence_displayed
+                                          for viewer in self.viewers if viewer.sequence_displayed), default=0)
+        stats['telemetry'] = self.frame_telemetry.stats()
+        return stats
+
+    def apply_rate_changes(self):
+        """Let the rate controller react to the latest measurements"""
+        if self.rate_controller.update():
+            controller = self.rate_controller
+            logging.info(f"RDP stream adjusted: quality {controller.quality}, scale {controller.scale:.3f}, "
+                         f"{controller.frame_rate:.1f} fps")
+
+    def viewport_scale(self, width, height):
+        """Scale that fits the screen into the largest viewer canvas, 1.0 if any viewer wants full size"""
+        if not self.scaling:
+            return 1.0
+
+        with self.lock:
+            viewports = [viewer.viewport for viewer in self.viewers]
+        if not viewports or None in viewports:
+            return 1.0
+
+        # Same fit the console does, so frames arrive at exactly the size it draws them
+        return min(1.0, max(min(view_width / width, view_height / height) for view_width, view_height in viewports))
+
+    def scale_frame(self, screen):
+        """Downscale a captured frame to the viewers' canvas and the controller's resolution scale"""
+        height, width = screen.shape[:2]
+        scale = self.viewport_scale(width, height) * self.rate_controller.scale
+        if scale >= 1.0:
+            return screen
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+
+        # Area averaging is only cheap for exact halvings, halve while that fits and finish
+        # the last step, less than 2x, with linear filtering
+        frame = screen
+        while frame.shape[1] >= 2 * size[0] and frame.shape[0] >= 2 * size[1]:
+            frame = cv2.resize(frame, (frame.shape[1] // 2, frame.shape[0] // 2), interpolation=cv2.INTER_AREA)
+        if (frame.shape[1], frame.shape[0]) != size:
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)
+        return frame
+
+    def cursor_position(self):
+        """Where the pointer is on the captured screen, None if it can't be read"""
+        position = self.capture_source.cursor_position()
+        if position is None and mouse is not None:
+            try:
+                position = mouse.get_position()
+            except Exception:
+                return None
+        return position
+
+    def publish_cursor(self):
+        """Hand the current pointer position to every viewer"""
+        position = self.cursor_position()
+        if position is None:
+            return
+
+        # Pointers on a monitor left of or above the primary one have negative coordinates
+        position = (max(0, int(position[0])), max(0, int(position[1])))
+        with self.lock:
+            viewers = list(self.viewers)
+        for viewer in viewers:
+            viewer.set_cursor(position)
+
+    def produce_frames(self):
+        """Capture the screen once per tick and hand changed frames to the encode stage,
+        which encodes each one once and fans it out to every viewer"""
+        encode_stage = PipelineStage("rdp-encoder", self.encode_captured, threaded=self.pipelined)
         try:
-            # Initial screen capture
-            initial_image = np.array(ImageGrab.grab())
-            initial_image = cv2.cvtColor(initial_image, cv2.COLOR_RGB2BGR)
+            # Capture buffers the encoder is done with, reused for the next captures
+            self.free_buffers = queue.Queue()
+            self.last_encoded = self.previous_capture = None
+            encode_stage.start()
 
-            # Get screen resolution and send it to client
+            # Initial screen capture
+            initial_image = self.capture_source.grab()
             screen_width, screen_height = initial_image.shape[1], initial_image.shape[0]
-            resolution_header = struct.pack(">BII", 0, screen_width, screen_height)
-            conn.sendall(resolution_header)
-
-            # Send initial frame
-            _, image_bytes = cv2.imencode('.jpg', initial_image,
-                                          [cv2.IMWRITE_JPEG_QUALITY, self.IMAGE_QUALITY])
-
-            header = struct.pack(">BI", 1, len(image_bytes))
-            conn.sendall(header)
-            conn.sendall(image_bytes)
+            screen_size = (screen_width, screen_height)
+            encode_stage.submit(CapturedFrame(initial_image, screen_size, False, time.perf_counter()))
 
-            self.last_image = initial_image
+            # The last frame handed to the encoder and a spare the next capture is written into
+            last_image = initial_image
+            spare_image = None
 
             # Frame rate control with separate handling for mouse movement frames
-            standard_frame_interval = 1.0 / 15.0
             last_frame_time = time.time()
             last_significant_frame_time = time.time()
 
@@ -150,50 +368,193 @@ class RDPServer:
             min_pixel_change = int(screen_width * screen_height * 0.001)
             content_change_threshold = 8  # Lower threshold for actual content changes
 
-            while self.running and conn in self.active_connections:
+            # Between frames wake up often enough to keep the pointer smooth
+            poll_interval = self.CURSOR_INTERVAL if self.cursor_channel else 0.05
+
+            while self.has_viewers():
+                self.apply_rate_changes()
+                standard_frame_interval = self.rate_controller.frame_interval
+                if self.cursor_channel:
+                    self.publish_cursor()
+
                 current_time = time.time()
                 elapsed = current_time - last_frame_time
                 elapsed_since_significant = current_time - last_significant_frame_time
 
                 # Control frame rate, but allow through at least one frame every 200ms
-                # regardless of content change (to ensure cursor movement is reflected)
-                force_update = elapsed_since_significant > 0.2
+                # regardless of content change (to ensure cursor movement is reflected),
+                # less often when the link has pushed the frame rate down
+                force_update = elapsed_since_significant > max(0.2, 2 * standard_frame_interval)
 
                 if elapsed < standard_frame_interval and not force_update:
-                    time.sleep(max(0.005, min(standard_frame_interval - elapsed, 0.05)))
+                    time.sleep(max(0.005, min(standard_frame_interval - elapsed, poll_interval)))
                     continue
 
                 # Update frame timestamp
                 last_frame_time = time.time()
 
                 try:
+                    if spare_image is None:
+                        spare_image = self.take_free_buffer()
+
                     # Capture and analyze frame
                     screen, send_update, is_cursor_only_change = self._capture_and_analyze_frame(
-                        self.last_image,
+                        last_image,
                         min_pixel_change,
                         content_change_threshold,
                         cursor_region_size,
-                        force_update
+                        force_update,
+                        out=spare_image
                     )
 
                     if send_update:
-                        # Update last significant frame time if not just cursor
-                        if not is_cursor_only_change:
+                        # Update last significant frame time if not just cursor, or if this was the
+                        # forced frame, otherwise every capture after it would be forced too
+                        if not is_cursor_only_change or force_update:
                             last_significant_frame_time = current_time
 
-                        # Send the frame
-                        self._send_frame(conn, screen, is_cursor_only_change)
-
-                        # Update last image
-                        self.last_image = screen
+                        # The encoder owns the frame now and returns its buffers once done with them
+                        screen_size = (screen.shape[1], screen.shape[0])
+                        encode_stage.submit(CapturedFrame(screen, screen_size, is_cursor_only_change,
+                                                          time.perf_counter()))
+                        last_image, spare_image = screen, None
+                    else:
+                        # Nothing sent, but a viewer that just joined still needs a frame
+                        encode_stage.submit(CapturedFrame(None, screen_size, False, None))
+                        spare_image = screen
 
                 except Exception as frame_error:
                     logging.error(f"Frame capture error: {frame_error}")
                     continue
 
+        except Exception as e:
+            logging.error(f"Frame producer error: {e}")
+            with self.lock:
+                if self.producer_thread is threading.current_thread():
+                    self.producer_thread = None
+        finally:
+            encode_stage.stop()
+
+            # Grabber handles belong to the thread that captured, this one is done with its own
+            self.capture_source.close()
+
+    def take_free_buffer(self):
+        """A capture buffer the encoder has released, None to let the grab allocate one"""
+        try:
+            return self.free_buffers.get_nowait()
+        except queue.Empty:
+            return None
+
+    def encode_captured(self, captured):
+        """Encode stage: encode a captured frame once for every viewer, at the resolution the link can take"""
+        if captured.screen is None:
+            self.publish(None, self.last_encoded, captured.screen_size)
+            return
+
+        frame = self.scale_frame(captured.screen)
+        encode_start = time.perf_counter()
+        update = self._encode_frame(frame, captured.screen_size, captured.is_cursor_only_change,
+                                    self.last_encoded, captured.captured_at)
+        if update is not None:
+            self.record_encode(update, time.perf_counter() - encode_start)
+        self.publish(update, frame, captured.screen_size)
+        self.last_encoded = frame
+
+        # The capture stage diffs against the newest frame, the one before it is free again
+        if self.previous_capture is not None:
+            self.free_buffers.put(self.previous_capture)
+        self.previous_capture = captured.screen
+
+    def publish(self, update, baseline, screen_size):
+        """Hand the tick's update to every viewer, encoding a keyframe only if one can take it"""
+        with self.lock:
+            viewers = list(self.viewers)
+
+        keyframe = update if update is not None and update.keyframe else None
+        if keyframe is None and any(viewer.wants_keyframe() for viewer in viewers):
+            encode_start = time.perf_counter()
+            keyframe = self._encode_frame(baseline, screen_size, False,
+                                          captured_at=update.captured_at if update is not None else None)
+            self.record_encode(keyframe, time.perf_counter() - encode_start)
+
+        # The update may be the keyframe too, it is numbered once
+        for item in (update, keyframe):
+            if item is not None and not item.sequence:
+                self.frame_sequence += 1
+                item.sequence = self.frame_sequence
+
+        for viewer in viewers:
+            if not viewer.offer(update, keyframe):
+                self.rate_controller.record_drop()
+
+    def record_encode(self, update, seconds):
+        """Count one encoded update in the encode time and frame size histograms"""
+        self.frame_telemetry.record('encode_ms', seconds * 1000)
+        self.frame_telemetry.record('frame_kb', update.size / 1024)
+
+    def record_frame_ack(self, viewer, sequence, captured_at, decode_time, display_delay):
+        """Count a frame the console reports on screen, the capture time it echoes is on our clock"""
+        viewer.sequence_displayed = max(viewer.sequence_displayed, sequence)
+        self.frame_telemetry.record('decode_ms', decode_time / 1000)
+        if captured_at:
+            # Includes the ack's way back, the clocks at both ends aren't comparable
+            self.frame_telemetry.record('capture_to_display_ms', time.perf_counter() * 1000 - captured_at / 1000)
+
+    def handle_display(self, conn, channel, viewer):
+        """Send the producer's encoded frames to one viewer"""
+        self.add_viewer(viewer)
+        resolution = None
+
+        # Pointer moves go out between frames, so don't wait longer than one cursor tick
+        timeout = self.CURSOR_INTERVAL if self.cursor_channel else 0.5
+
+        try:
+            while self.running and conn in self.active_connections:
+                update = viewer.get(timeout=timeout)
+                if resolution is not None and self.cursor_channel:
+                    position = viewer.take_cursor()
+                    if position is not None:
+                        channel.send_cursor(*position)
+                if update is None:
+                    continue
+
+                # Get screen resolution and send it to client ahead of the first frame,
+                # followed by the pointer shape the console draws
+                if resolution is None:
+                    resolution = (update.width, update.height)
+                    channel.send_resolution(*resolution)
+                    if self.cursor_channel:
+                        channel.send_cursor_shape(*self.capture_source.cursor_shape())
+
+                # See what earlier frames left queued in the socket and time the write,
+                # a slow link shows up in both
+                send_start = time.perf_counter()
+                backlog = unsent = channel.unsent_bytes()
+                while unsent is not None and unsent > self.MAX_UNSENT and self.running:
+                    time.sleep(0.005)
+                    unsent = channel.unsent_bytes()
+
+                payload = update.payload
+                if self.telemetry:
+                    parts = payload if isinstance(payload, list) else [payload]
+                    captured_at = int(update.captured_at * 1e6) if update.captured_at is not None else 0
+                    payload = [FRAME_INFO.pack(update.sequence, captured_at)] + parts
+
+                channel.send(update.msg_type, payload)
+                viewer.mark_sent()
+                viewer.sequence_sent = update.sequence
+                sent_at = time.perf_counter()
+                self.rate_controller.record_send(update.size, sent_at - send_start, backlog)
+                if update.captured_at is not None:
+                    self.frame_latencies.append(sent_at - update.captured_at)
+
         except Exception as e:
             logging.error(f"Display handling error: {e}")
         finally:
+            self.remove_viewer(viewer)
+            if viewer.dropped:
+                logging.info(f"RDP viewer dropped {viewer.dropped} updates while behind")
+
             if conn in self.active_connections:
                 try:
                     conn.close()
@@ -202,11 +563,10 @@ class RDPServer:
                     pass
 
     def _capture_and_analyze_frame(self, last_image, min_pixel_change, content_change_threshold, cursor_region_size,
-                                   force_update):
+                                   force_update, out=None):
         """Capture screen and analyze if it should be sent"""
         # Capture screen
-        screen = np.array(ImageGrab.grab())
-        screen = cv2.cvtColor(screen, cv2.COLOR_RGB2BGR)
+        screen = self.capture_source.grab(out)
 
         send_update = False
         is_cursor_only_change = False
@@ -231,7 +591,10 @@ class RDPServer:
                 area = w * h
                 change_count = np.count_nonzero(threshold_diff)
 
-                if area < cursor_region_size * cursor_region_size * 4 and change_count < min_pixel_change * 2:
+                if self.cursor_channel:
+                    # The pointer isn't in the frame, so even a small change is content
+                    send_update = True
+                elif area < cursor_region_size * cursor_region_size * 4 and change_count < min_pixel_change * 2:
                     # Likely just cursor movement - update but mark as cursor-only
                     is_cursor_only_change = True
                     send_update = True
@@ -248,35 +611,55 @@ class RDPServer:
 
         return screen, send_update, is_cursor_only_change
 
-    def _send_frame(self, conn, screen, is_cursor_only_change):
-        """Encode and send a frame to the client"""
+    def _encode_frame(self, screen, screen_size, is_cursor_only_change, previous=None, captured_at=None):
+        """Encode a frame as its changed tiles or a keyframe, None if no tile changed"""
         # For cursor-only changes, use a higher compression rate to reduce bandwidth
-        quality = self.IMAGE_QUALITY - 10 if is_cursor_only_change else self.IMAGE_QUALITY
-
-        # Encode and send frame
+        quality = self.rate_controller.quality
+        if is_cursor_only_change:
+            quality -= 10
+        width, height = screen_size
+
+        # Send just the changed tiles unless most of the screen changed
+        if self.tile_encoder and previous is not None:
+            tile_parts = self.tile_encoder.encode(screen, previous, quality)
+            if tile_parts is not None:
+                if not tile_parts:
+                    return None
+                msg_type = MSG_MIXED_TILES if self.tile_encoder.lossless else MSG_TILES
+                return EncodedUpdate(msg_type, tile_parts, width, height, captured_at)
+
+        # Keyframe of mixed tiles, so text stays crisp until it next changes
+        if self.tile_encoder and self.tile_encoder.lossless:
+            tile_parts = self.tile_encoder.encode_keyframe(screen, quality)
+            return EncodedUpdate(MSG_MIXED_TILES, tile_parts, width, height, captured_at, keyframe=True)
+
+        # Encode full frame
         _, frame_data = cv2.imencode('.jpg', screen, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return EncodedUpdate(MSG_FRAME, frame_data, width, height, captured_at, keyframe=True)
 
-        # Send frame data
-        header = struct.pack(">BI", 1, len(frame_data))
-        conn.sendall(header)
-        conn.sendall(frame_data)
-
-    def handle_input(self, conn):
-        """Handle input events from client with improved error handling"""
+    def handle_input(self, conn, channel, viewer):
+        """Handle input events and frame acks from client with improved error handling"""
         try:
-            # Get client platform info
-            platform = conn.recv(3)
-            logging.info(f"Client platform: {platform.decode()}")
-
             # Input event loop
             while self.running and conn in self.active_connections:
                 try:
-                    event_data = conn.recv(6)
-                    if not event_data or len(event_data) != 6:
-                        break
-
-                    key, action, x, y = struct.unpack('>BBHH', event_data)
-                    self.process_input(key, action, x, y)
+                    events = channel.receive_events() if self.coalesce_input else [channel.receive_event()]
+                    for msg_type, fields in self.coalesce_moves(events):
+                        if msg_type == MSG_ACK:
+                            latency = viewer.acknowledge(fields[0])
+                            if latency is not None:
+                                self.rate_controller.record_ack(latency)
+                        elif msg_type == MSG_FRAME_ACK:
+                            self.record_frame_ack(viewer, *fields)
+                        elif msg_type == MSG_VIEWPORT:
+                            if viewer.viewport != fields:
+                                logging.info(f"RDP viewer canvas is {fields[0]}x{fields[1]}")
+                            viewer.viewport = fields
+                        else:
+                            self.input_events += 1
+                            self.process_input(*fields)
+                except ConnectionError:
+                    break
                 except socket.timeout:
                     continue
                 except Exception as e:
@@ -294,6 +677,24 @@ class RDPServer:
                 except:
                     pass
 
+    def coalesce_moves(self, events):
+        """Drop pointer moves followed by another move before any click or key,
+        the last move ahead of a click still puts the pointer where the click lands"""
+        kept = []
+        last_move = None
+        for event in events:
+            msg_type, fields = event
+            if msg_type == MSG_INPUT:
+                if fields[0] == self.MOUSE_MOVE:
+                    if last_move is not None:
+                        kept[last_move] = None
+                        self.moves_coalesced += 1
+                    last_move = len(kept)
+                else:
+                    last_move = None
+            kept.append(event)
+        return [event for event in kept if event is not None]
+
     def process_input(self, key, action, x, y):
         """Process individual input events"""
         try:
@@ -302,6 +703,10 @@ class RDPServer:
                 self.shift_pressed = (action == 100)  # 100 for keydown, 117 for keyup
                 return
 
+            # Headless agent, nothing to inject into
+            if ag is None:
+                return
+
             # Handle keyboard input
             if key < 200:  # Not a mouse event
                 self._handle_keyboard_input(key, action)
@@ -0,0 +1,194 @@
+"""
+Dirty tile encoder for the NC Server RDP stream.
+Splits the screen into fixed tiles and encodes only the ones that changed since
+the previous frame, so small updates cost kilobytes instead of a full-screen JPEG.
+Consoles that accept mixed tiles get flat and text-like tiles losslessly and only
+photographic ones as JPEG, which keeps terminals and dialogs crisp.
+"""
+
+import struct
+import zlib
+
+import cv2
+import numpy as np
+
+# Tile edge in pixels
+TILE_SIZE = 64
+
+# Above this share of dirty tiles a single full frame is cheaper to encode and send
+FULL_FRAME_RATIO = 0.5
+
+# Tiles message: tile count, then per tile its rectangle and encoded length followed by the data
+TILE_COUNT = struct.Struct('>H')
+TILE_HEADER = struct.Struct('>HHHHI')
+
+# Mixed tiles message: frame size and keyframe flag, tile count, then per tile its rectangle,
+# codec and encoded length followed by the data. A keyframe covers the whole frame.
+MIXED_HEADER = struct.Struct('>HHB')
+MIXED_TILE_HEADER = struct.Struct('>HHHHBI')
+
+# Per-tile codecs: JPEG for photographic content, deflated raw pixels for text and UI,
+# a single colour for flat areas
+TILE_JPEG = 0
+TILE_LOSSLESS = 1
+TILE_FILL = 2
+
+# Tiles where at least this share of pixels repeat their left neighbour are text or UI
+TEXT_RATIO = 0.5
+
+# zlib level for lossless tiles, higher levels cost far more time than they save bytes
+LOSSLESS_LEVEL = 1
+
+
+def dirty_tile_map(screen, previous, tile_size=TILE_SIZE):
+    """Boolean grid of tiles whose pixels differ between two frames"""
+    height, width = screen.shape[:2]
+    rows, cols = -(-height // tile_size), -(-width // tile_size)
+
+    # Keep the colour channels interleaved in each row, reducing over them separately is far slower
+    diff = np.zeros((rows * tile_size, cols * tile_size * 3), dtype=np.uint8)
+    diff[:height, :width * 3] = cv2.absdiff(screen, previous).reshape(height, width * 3)
+
+    band_max = diff.reshape(rows, tile_size, -1).max(axis=1)
+    return band_max.reshape(rows, cols, tile_size * 3).max(axis=2) > 0
+
+
+def dirty_rectangles(tile_map, width, height, tile_size=TILE_SIZE):
+    """Merge each row's runs of dirty tiles into (x, y, w, h) rectangles"""
+    rectangles = []
+    for row, cols in enumerate(tile_map):
+        col = 0
+        while col < len(cols):
+            if not cols[col]:
+                col += 1
+                continue
+
+            start = col
+            while col < len(cols) and cols[col]:
+                col += 1
+
+            x, y = start * tile_size, row * tile_size
+            rectangles.append((x, y, min(col * tile_size, width) - x, min(tile_size, height - y)))
+    return rectangles
+
+
+def classify_tiles(screen, tile_map, tile_size=TILE_SIZE):
+    """Pick a codec for every dirty tile, returns a grid of codecs with -1 for clean tiles"""
+    width = screen.shape[1]
+    codecs = np.full(tile_map.shape, -1, dtype=np.int8)
+
+    for row in np.flatnonzero(tile_map.any(axis=1)):
+        cols = np.flatnonzero(tile_map[row])
+        first, last = cols[0], cols[-1] + 1
+        y, x0, x1 = row * tile_size, first * tile_size, min(last * tile_size, width)
+
+        # Band across the dirty tiles, the last tile padded out by repeating its edge
+        band = screen[y:y + tile_size, x0:x1]
+        rows_in_band, span = band.shape[0], (last - first) * tile_size
+        if span != x1 - x0:
+            padded = np.empty((rows_in_band, span, 3), dtype=np.uint8)
+            padded[:, :x1 - x0] = band
+            padded[:, x1 - x0:] = band[:, -1:]
+            band = padded
+
+        # Pixels equal to their left neighbour, most of them for text and UI, few for photos
+        # (combining the channels by hand, reducing over them is several times slower)
+        same = band[:, 1:] == band[:, :-1]
+        repeats = np.ones((rows_in_band, span), dtype=bool)
+        np.logical_and(same[..., 0], same[..., 1], out=repeats[:, 1:])
+        repeats[:, 1:] &= same[..., 2]
+        repeats = repeats.reshape(rows_in_band, last - first, tile_size)
+        ratio = repeats.sum(axis=(0, 2)) / (rows_in_band * tile_size)
+
+        # Flat: every row repeats its first pixel, and the first column is a single colour
+        tiles = band.reshape(rows_in_band, last - first, tile_size, 3)
+        flat = repeats[:, :, 1:].all(axis=(0, 2)) & (tiles[:, :, 0] == tiles[:1, :, 0]).all(axis=(0, 2))
+
+        row_codecs = np.where(ratio < TEXT_RATIO, TILE_JPEG, np.where(flat, TILE_FILL, TILE_LOSSLESS))
+        codecs[row, cols] = row_codecs[cols - first]
+    return codecs
+
+
+def mixed_rectangles(screen, codecs, tile_size=TILE_SIZE):
+    """Merge each row's runs of tiles with the same codec, and fill colour, into
+    (x, y, w, h, codec) rectangles"""
+    height, width = screen.shape[:2]
+    rectangles = []
+    for row, cols in enumerate(codecs):
+        y = row * tile_size
+        col = 0
+        while col < len(cols):
+            codec = cols[col]
+            if codec < 0:
+                col += 1
+                continue
+
+            start = col
+            colour = screen[y, col * tile_size] if codec == TILE_FILL else None
+            col += 1
+            while col < len(cols) and cols[col] == codec and (
+                    colour is None or (screen[y, col * tile_size] == colour).all()):
+                col += 1
+
+            x = start * tile_size
+            rectangles.append((x, y, min(col * tile_size, width) - x, min(tile_size, height - y), int(codec)))
+    return rectangles
+
+
+class TileEncoder:
+    """Encodes the changed regions of a frame as JPEG tiles, or as mixed tiles when lossless"""
+
+    def __init__(self, tile_size=TILE_SIZE, full_frame_ratio=FULL_FRAME_RATIO, lossless=False):
+        self.tile_size = tile_size
+        self.full_frame_ratio = full_frame_ratio
+        self.lossless = lossless
+
+    def encode(self, screen, previous, quality):
+        """Return the tiles message parts for the changed regions, [] if nothing changed,
+        or None when a full frame should be sent instead"""
+        if previous is None or previous.shape != screen.shape:
+            return None
+
+        tile_map = dirty_tile_map(screen, previous, self.tile_size)
+        dirty = np.count_nonzero(tile_map)
+        if dirty == 0:
+            return []
+        if dirty > tile_map.size * self.full_frame_ratio:
+            return None
+
+        if self.lossless:
+            return self.encode_mixed(screen, tile_map, quality, keyframe=False)
+
+        height, width = screen.shape[:2]
+        rectangles = dirty_rectangles(tile_map, width, height, self.tile_size)
+
+        parts = [TILE_COUNT.pack(len(rectangles))]
+        for x, y, w, h in rectangles:
+            _, tile_data = cv2.imencode('.jpg', screen[y:y + h, x:x + w], [cv2.IMWRITE_JPEG_QUALITY, quality])
+            parts.append(TILE_HEADER.pack(x, y, w, h, len(tile_data)))
+            parts.append(tile_data)
+        return parts
+
+    def encode_keyframe(self, screen, quality):
+        """Return the mixed tiles message parts for a keyframe covering the whole screen"""
+        height, width = screen.shape[:2]
+        tile_map = np.ones((-(-height // self.tile_size), -(-width // self.tile_size)), dtype=bool)
+        return self.encode_mixed(screen, tile_map, quality, keyframe=True)
+
+    def encode_mixed(self, screen, tile_map, quality, keyframe):
+        """Encode the dirty tiles each with the codec that suits its content"""
+        height, width = screen.shape[:2]
+        rectangles = mixed_rectangles(screen, classify_tiles(screen, tile_map, self.tile_size), self.tile_size)
+
+        parts = [MIXED_HEADER.pack(width, height, keyframe), TILE_COUNT.pack(len(rectangles))]
+        for x, y, w, h, codec in rectangles:
+            region = screen[y:y + h, x:x + w]
+            if codec == TILE_FILL:
+                tile_data = region[0, 0].tobytes()
+            elif codec == TILE_LOSSLESS:
+                tile_data = zlib.compress(np.ascontiguousarray(region), LOSSLESS_LEVEL)
+            else:
+                _, tile_data = cv2.imencode('.jpg', region, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            parts.append(MIXED_TILE_HEADER.pack(x, y, w, h, codec, len(tile_data)))
+            parts.append(tile_data)
+        return parts
\ No newline at end of file
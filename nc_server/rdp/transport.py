@@ -0,0 +1,316 @@
+"""
+RDP stream transport for the NC Server.
+Frames the remote desktop stream and, when the console asks for it, seals every
+message with an AEAD cipher keyed from the agent session key.
+"""
+
+import os
+import socket
+import struct
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+    import termios
+except ImportError:
+    # Windows can't report unsent bytes, send times and acks still drive rate control
+    fcntl = termios = None
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# Supported stream ciphers in order of preference
+RDP_CIPHERS = {
+    'aes-256-gcm': AESGCM,
+    'chacha20-poly1305': ChaCha20Poly1305
+}
+
+# Message types
+MSG_RESOLUTION = 0
+MSG_FRAME = 1
+MSG_PLATFORM = 2
+MSG_INPUT = 3
+MSG_TILES = 4
+MSG_ACK = 5
+MSG_VIEWPORT = 6
+MSG_MIXED_TILES = 7
+MSG_CURSOR = 8
+MSG_CURSOR_SHAPE = 9
+MSG_FRAME_ACK = 10
+
+# Message header: type and body length, authenticated as associated data
+MSG_HEADER = struct.Struct('>BI')
+RESOLUTION_BODY = struct.Struct('>II')
+INPUT_BODY = struct.Struct('>BBHH')
+ACK_BODY = struct.Struct('>I')
+CURSOR_BODY = struct.Struct('>HH')
+
+# Cursor shape: size and hotspot followed by the deflated RGBA pixels
+CURSOR_SHAPE_HEADER = struct.Struct('>HHHH')
+
+# With telemetry every frame body starts with its sequence number and the agent's capture time
+# in microseconds, the console echoes both back once the frame is on screen along with its
+# decode time and the time from receiving the frame to displaying it, also in microseconds
+FRAME_INFO = struct.Struct('>IQ')
+FRAME_ACK_BODY = struct.Struct('>IQII')
+
+# Legacy resolution message: type, width, height
+LEGACY_RESOLUTION = struct.Struct('>BII')
+
+# Upper bound on a message from the console, which only sends input, acks, its platform and
+# viewport. Checked before the body is read, the length arrives before anything is authenticated.
+MAX_MESSAGE_SIZE = 64 * 1024
+
+# Seconds a started message may go without receiving a byte before the connection is dropped
+MAX_STALL = 30.0
+
+# Random bytes each side contributes to the per-connection keys
+HANDSHAKE_NONCE_SIZE = 16
+TAG_SIZE = 16
+
+
+def derive_rdp_keys(session_key, server_nonce, client_nonce):
+    """Derive the per-connection client-to-server and server-to-client keys"""
+    keys = []
+    for direction in (b'client to server', b'server to client'):
+        hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=server_nonce + client_nonce,
+                    info=b'nc rdp stream ' + direction)
+        keys.append(hkdf.derive(session_key))
+    return keys
+
+
+def send_buffers(sock, buffers):
+    """Send several buffers in one syscall where the platform allows it, without joining them"""
+    if not hasattr(sock, 'sendmsg'):
+        # Windows has no sendmsg
+        for buffer in buffers:
+            sock.sendall(buffer)
+        return
+
+    views = [memoryview(buffer).cast('B') for buffer in buffers]
+    while views:
+        sent = sock.sendmsg(views)
+
+        # Drop what went out and retry the rest after a partial write
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if views and sent:
+            views[0] = views[0][sent:]
+
+
+class RDPChannel:
+    """One remote desktop connection, plaintext for older consoles or AEAD sealed"""
+
+    def __init__(self, sock, cipher_name=None, send_key=None, receive_key=None):
+        self.sock = sock
+        self.secure = cipher_name is not None
+
+        if self.secure:
+            self.send_cipher = RDP_CIPHERS[cipher_name](send_key)
+            self.receive_cipher = RDP_CIPHERS[cipher_name](receive_key)
+
+        # Each direction has one sender, so sequence numbers stay implicit
+        self.send_seq = 0
+        self.receive_seq = 0
+        self.send_lock = threading.Lock()
+
+        # Reused for every incoming message, each read takes whatever else has arrived too,
+        # so a burst of input events costs one recv instead of two per event
+        self.receive_buffer = bytearray(64 * 1024)
+        self.buffered_start = self.buffered_end = 0
+
+    @classmethod
+    def accept(cls, sock, session_keys, cipher_name):
+        """Agree on per-connection keys with a console that connected to us. Each console that
+        started RDP has its own session key, the one its first sealed message opens with is used."""
+        server_nonce = os.urandom(HANDSHAKE_NONCE_SIZE)
+        sock.sendall(server_nonce)
+
+        # The console's nonce arrives in the clear, its first sealed message proves it holds the key
+        plain = cls(sock)
+        client_nonce = bytes(plain.receive_exact(HANDSHAKE_NONCE_SIZE))
+
+        # Peek at the first sealed message, the channel reads it again once it knows the key
+        header = bytes(plain.receive_exact(MSG_HEADER.size))
+        plain.buffered_start -= MSG_HEADER.size
+        length = MSG_HEADER.unpack(header)[1]
+        if length > MAX_MESSAGE_SIZE:
+            raise ConnectionError(f"RDP message of {length} bytes exceeds limit of {MAX_MESSAGE_SIZE} bytes")
+        body = bytes(plain.receive_exact(MSG_HEADER.size + length)[MSG_HEADER.size:])
+        plain.buffered_start -= MSG_HEADER.size + length
+
+        for session_key in session_keys:
+            client_key, server_key = derive_rdp_keys(session_key, server_nonce, client_nonce)
+            channel = cls(sock, cipher_name, send_key=server_key, receive_key=client_key)
+            try:
+                channel.receive_cipher.decrypt(channel.nonce(0), body, header)
+            except Exception:
+                continue
+
+            # Whatever was read along with the nonce belongs to the sealed stream
+            channel.receive_buffer = plain.receive_buffer
+            channel.buffered_start, channel.buffered_end = plain.buffered_start, plain.buffered_end
+            return channel
+
+        raise ConnectionError("RDP console holds none of the session keys that started the stream")
+
+    @staticmethod
+    def nonce(seq):
+        """96-bit nonce from a sequence number, keys are never shared between directions"""
+        return b'\x00\x00\x00\x00' + struct.pack('>Q', seq)
+
+    def send(self, msg_type, payload):
+        """Send one message, the header and body leave in a single write.
+        The payload may be a list of buffers, sent back to back as one body."""
+        parts = payload if isinstance(payload, list) else [payload]
+
+        with self.send_lock:
+            if not self.secure:
+                length = sum(memoryview(part).nbytes for part in parts)
+                send_buffers(self.sock, [MSG_HEADER.pack(msg_type, length)] + parts)
+                return
+
+            # The cipher needs one contiguous plaintext
+            plaintext = parts[0] if len(parts) == 1 else b''.join(parts)
+            header = MSG_HEADER.pack(msg_type, memoryview(plaintext).nbytes + TAG_SIZE)
+            sealed = self.send_cipher.encrypt(self.nonce(self.send_seq), plaintext, header)
+            self.send_seq += 1
+            send_buffers(self.sock, [header, sealed])
+
+    def receive(self):
+        """Receive one message, returns (type, body) with the body valid until the next receive"""
+        header = bytes(self.receive_exact(MSG_HEADER.size))
+        msg_type, length = MSG_HEADER.unpack(header)
+        if length > MAX_MESSAGE_SIZE:
+            raise ConnectionError(f"RDP message of {length} bytes exceeds limit of {MAX_MESSAGE_SIZE} bytes")
+        body = self.receive_exact(length)
+
+        if not self.secure:
+            return msg_type, body
+
+        try:
+            plaintext = self.receive_cipher.decrypt(self.nonce(self.receive_seq), body, header)
+        except Exception:
+            raise ConnectionError("RDP message failed authentication")
+        self.receive_seq += 1
+        return msg_type, plaintext
+
+    def receive_exact(self, size):
+        """Return a view of the next size bytes in the reusable buffer, reading more when needed"""
+        if self.buffered_end - self.buffered_start < size:
+            self.fill(size)
+
+        start = self.buffered_start
+        self.buffered_start += size
+        return memoryview(self.receive_buffer)[start:start + size]
+
+    def fill(self, size):
+        """Read until at least size bytes are buffered, keeping any that arrived with them"""
+        pending = self.buffered_end - self.buffered_start
+        if len(self.receive_buffer) < size:
+            buffer = bytearray(max(size, 2 * len(self.receive_buffer)))
+            buffer[:pending] = self.receive_buffer[self.buffered_start:self.buffered_end]
+            self.receive_buffer = buffer
+        elif self.buffered_start:
+            self.receive_buffer[:pending] = self.receive_buffer[self.buffered_start:self.buffered_end]
+        self.buffered_start, self.buffered_end = 0, pending
+
+        view = memoryview(self.receive_buffer)
+        stalled_since = None
+        while self.buffered_end < size:
+            try:
+                count = self.sock.recv_into(view[self.buffered_end:])
+            except socket.timeout:
+                # Only give up between messages, a half-read message would desync the stream,
+                # unless the peer has stopped sending altogether
+                if self.buffered_end == 0:
+                    raise
+                now = time.monotonic()
+                if stalled_since is None:
+                    stalled_since = now
+                elif now - stalled_since > MAX_STALL:
+                    raise ConnectionError(f"Console stalled for over {MAX_STALL:.0f} seconds mid-message")
+                continue
+            if not count:
+                raise ConnectionError("Connection lost")
+            self.buffered_end += count
+            stalled_since = None
+
+    def has_buffered_message(self):
+        """Whether a whole message is already buffered and can be read without waiting"""
+        available = self.buffered_end - self.buffered_start
+        if not self.secure:
+            return available >= INPUT_BODY.size
+        if available < MSG_HEADER.size:
+            return False
+        _, length = MSG_HEADER.unpack_from(self.receive_buffer, self.buffered_start)
+        return available >= MSG_HEADER.size + length
+
+    def send_resolution(self, width, height):
+        """Send the screen resolution"""
+        if self.secure:
+            self.send(MSG_RESOLUTION, RESOLUTION_BODY.pack(width, height))
+        else:
+            self.sock.sendall(LEGACY_RESOLUTION.pack(MSG_RESOLUTION, width, height))
+
+    def send_cursor(self, x, y):
+        """Send the pointer position, a few bytes instead of a re-encoded screen"""
+        self.send(MSG_CURSOR, CURSOR_BODY.pack(x, y))
+
+    def send_cursor_shape(self, image, hotspot):
+        """Send the pointer image (RGBA) and its hotspot"""
+        height, width = image.shape[:2]
+        header = CURSOR_SHAPE_HEADER.pack(width, height, *hotspot)
+        self.send(MSG_CURSOR_SHAPE, [header, zlib.compress(image.tobytes())])
+
+    def send_frame(self, frame_data):
+        """Send an encoded frame"""
+        self.send(MSG_FRAME, frame_data)
+
+    def receive_platform(self):
+        """Receive the console's platform code, which also proves a secure console holds the key"""
+        if not self.secure:
+            return bytes(self.receive_exact(3)).decode()
+
+        msg_type, body = self.receive()
+        if msg_type != MSG_PLATFORM:
+            raise ConnectionError(f"Expected platform message, got type {msg_type}")
+        return bytes(body).decode()
+
+    def receive_event(self):
+        """Receive one message from the console as (type, fields): an input event, a frame ack
+        or the size of the canvas the console shows the desktop in"""
+        if not self.secure:
+            return MSG_INPUT, INPUT_BODY.unpack(self.receive_exact(INPUT_BODY.size))
+
+        msg_type, body = self.receive()
+        if msg_type == MSG_INPUT:
+            return msg_type, INPUT_BODY.unpack(body)
+        if msg_type == MSG_ACK:
+            return msg_type, ACK_BODY.unpack(body)
+        if msg_type == MSG_VIEWPORT:
+            return msg_type, RESOLUTION_BODY.unpack(body)
+        if msg_type == MSG_FRAME_ACK:
+            return msg_type, FRAME_ACK_BODY.unpack(body)
+        raise ConnectionError(f"Unexpected message type {msg_type} on the input stream")
+
+    def receive_events(self):
+        """Wait for the next message from the console, then return it with every whole message
+        that arrived alongside it, as a list of (type, fields)"""
+        events = [self.receive_event()]
+        while self.has_buffered_message():
+            events.append(self.receive_event())
+        return events
+
+    def unsent_bytes(self):
+        """Bytes written but not yet sent by the kernel, None where the platform can't tell"""
+        if fcntl is None or not hasattr(termios, 'TIOCOUTQ'):
+            return None
+        try:
+            return struct.unpack('I', fcntl.ioctl(self.sock.fileno(), termios.TIOCOUTQ, b'\0\0\0\0'))[0]
+        except (OSError, ValueError):
+            return None
\ No newline at end of file
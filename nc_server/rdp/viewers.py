@@ -0,0 +1,117 @@
+"""
+RDP viewer queues for the NC Server.
+One producer captures and encodes each frame once, every viewer gets it through its own
+short queue. A viewer that falls behind drops updates and resyncs from the next keyframe
+instead of holding up the producer or the other viewers.
+"""
+
+import queue
+import time
+from collections import deque
+
+# Updates a viewer may have waiting before it starts dropping
+VIEWER_QUEUE_DEPTH = 2
+
+# Sent updates remembered while waiting for the viewer to acknowledge them
+ACK_WINDOW = 64
+
+
+class EncodedUpdate:
+    """One encoded message ready to send, with the size of the frame it belongs to.
+    A keyframe stands on its own, anything else applies on top of the frame before it."""
+
+    __slots__ = ('msg_type', 'payload', 'width', 'height', 'size', 'captured_at', 'keyframe', 'sequence')
+
+    def __init__(self, msg_type, payload, width, height, captured_at=None, keyframe=False):
+        self.msg_type = msg_type
+        self.payload = payload
+        self.width = width
+        self.height = height
+        self.captured_at = captured_at
+        self.keyframe = keyframe
+
+        # Numbered when published, the console acknowledges frames by this number
+        self.sequence = 0
+
+        parts = payload if isinstance(payload, list) else [payload]
+        self.size = sum(memoryview(part).nbytes for part in parts)
+
+
+class ViewerQueue:
+    """Encoded updates waiting to be sent to one viewer"""
+
+    def __init__(self, depth=VIEWER_QUEUE_DEPTH):
+        self.updates = queue.Queue(maxsize=depth)
+
+        # Tile updates only apply on top of the frame before them, a new or lagging viewer
+        # has to start over from a full frame
+        self.needs_keyframe = True
+        self.dropped = 0
+
+        # Canvas size the viewer shows the desktop at, None for full resolution
+        self.viewport = None
+
+        # Latest pointer position, sent ahead of frames and never queued behind them
+        self.cursor = None
+        self.cursor_sent = None
+
+        # Send times of updates the viewer hasn't acknowledged yet, by update count
+        self.sent = 0
+        self.unacknowledged = deque(maxlen=ACK_WINDOW)
+
+        # Sequence numbers of the newest frame sent and the newest one the console has on screen
+        self.sequence_sent = 0
+        self.sequence_displayed = 0
+
+    def wants_keyframe(self):
+        """Whether a keyframe encoded now would be queued for this viewer"""
+        return self.needs_keyframe and not self.updates.full()
+
+    def offer(self, update, keyframe):
+        """Queue the tick's update, or the keyframe while resyncing, without ever blocking.
+        Returns False if the viewer was too far behind to take it."""
+        item = keyframe if self.needs_keyframe else update
+        if item is None:
+            return True
+
+        try:
+            self.updates.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            self.needs_keyframe = True
+            return False
+
+        if item is keyframe:
+            self.needs_keyframe = False
+        return True
+
+    def get(self, timeout):
+        """Wait for the next update, returns None on timeout"""
+        try:
+            return self.updates.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def set_cursor(self, position):
+        """Record where the pointer is now, older positions are simply replaced"""
+        self.cursor = position
+
+    def take_cursor(self):
+        """The pointer position if it moved since it was last taken, otherwise None"""
+        position = self.cursor
+        if position is None or position == self.cursor_sent:
+            return None
+        self.cursor_sent = position
+        return position
+
+    def mark_sent(self):
+        """Note that one more update went out to the viewer"""
+        self.sent += 1
+        self.unacknowledged.append((self.sent, time.perf_counter()))
+
+    def acknowledge(self, count):
+        """Viewer has shown count updates, returns how long the last of them took or None"""
+        sent_at = None
+        while self.unacknowledged and self.unacknowledged[0][0] <= count:
+            _, sent_at = self.unacknowledged.popleft()
+        return time.perf_counter() - sent_at if sent_at is not None else None
\ No newline at end of file